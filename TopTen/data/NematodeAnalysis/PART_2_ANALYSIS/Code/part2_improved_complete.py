@@ -13,8 +13,10 @@ Comprehensive analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/NematodeAnalysis')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -24,18 +26,26 @@ from scipy import stats
 from scipy.optimize import curve_fit
 from sklearn.metrics import mean_squared_error, r2_score
 from analysis_utils_improved import *
+from profiling import PROFILE
+from run_context import current_context
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Final_Nema_Data.xlsx'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_2_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=os.path.join(os.path.dirname(BASE_DIR), 'Final_Nema_Data.xlsx'))
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(2)
+
+# Columns this analysis reads
+ANALYSIS_COLUMNS = ['PubYear', 'Times cited', 'Genus', 'Species']
 
 print("\n" + "="*70)
 print("PART 2: TEMPORAL & TREND ANALYSIS - IMPROVED VERSION")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_excel(DATA_FILE, engine='openpyxl')
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # Standardize column names
@@ -48,15 +58,13 @@ df = df.rename(columns={
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
-
-# Focus on recent decades (1960-2023)
-df_clean = df_clean[(df_clean['pub_year'] >= 1960) & (df_clean['pub_year'] <= 2023)]
+# Apply filters, focusing on recent decades (1960-2023) in the same selection
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].between(1960, 2023), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset after filtering:")
 print(f"  Total records: {len(df_clean):,}")
@@ -70,6 +78,8 @@ print("\n" + "="*70)
 print("Generating Figure 1: Temporal Trends by Genus")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
 # Get top 10 genera by publication count
 top_genera = df_clean['Genus'].value_counts().head(10).index.tolist()
 
@@ -105,7 +115,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_Temporal_Trends_Top10_Genera.png')
 plt.close()
 
 # Save data
-genus_year_counts.to_csv(f'{OUTPUT_DIR}/Tables/Table1_Genus_Temporal_Trends.csv', index=False)
+save_table(genus_year_counts, f'{OUTPUT_DIR}/Tables/Table1_Genus_Temporal_Trends.csv', index=False)
 print(f"✓ Saved temporal trend data for {len(top_genera)} genera")
 
 # ============================================================================
@@ -116,6 +126,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Growth Rate Analysis")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_clean))
+
 # Calculate growth rates for top genera
 growth_metrics = []
 
@@ -177,24 +189,16 @@ ax1.spines['right'].set_visible(False)
 ax1.grid(axis='x', alpha=0.3)
 
 # Add value labels
-for i, v in enumerate(df_growth['Growth_Rate']):
-    label_x = v + (max(df_growth['Growth_Rate']) - min(df_growth['Growth_Rate'])) * 0.02
-    if v < 0:
-        label_x = v - (max(df_growth['Growth_Rate']) - min(df_growth['Growth_Rate'])) * 0.02
-        ha = 'right'
-    else:
-        ha = 'left'
-    ax1.text(label_x, i, f'{v:.1f}%', va='center', ha=ha, fontsize=7, fontweight='bold')
+label_bars(ax1, y_pos, df_growth['Growth_Rate'], fmt='{:.1f}%',
+           pad=np.ptp(df_growth['Growth_Rate']) * 0.02, fontweight='bold')
 
 # RIGHT: Scatter of growth rate vs current activity
 ax2.scatter(df_growth['Recent_Mean'], df_growth['Growth_Rate'],
            s=200, c=colors, alpha=0.7, edgecolors='black', linewidth=1)
 
 # Label each point
-for _, row in df_growth.iterrows():
-    ax2.annotate(row['Genus'],
-                (row['Recent_Mean'], row['Growth_Rate']),
-                xytext=(5, 0), textcoords='offset points',
+annotate_points(ax2, df_growth['Recent_Mean'], df_growth['Growth_Rate'],
+                df_growth['Genus'], offset=(5, 0),
                 fontsize=8, style='italic', fontweight='bold')
 
 ax2.axhline(0, color='red', linestyle='--', linewidth=1, alpha=0.5)
@@ -211,7 +215,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Growth_Rate_Analysis.png')
 plt.close()
 
 # Save data
-df_growth.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Growth_Rates.csv', index=False)
+save_table(df_growth, f'{OUTPUT_DIR}/Tables/Table2_Growth_Rates.csv', index=False)
 print(f"✓ Saved growth rate data for {len(df_growth)} genera")
 
 # ============================================================================
@@ -222,6 +226,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: 20-Year Forecasts (Top 6 Genera)")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_clean))
+
 # Focus on top 6 for clearer visualization
 top6_genera = top_genera[:6]
 
@@ -309,7 +315,7 @@ plt.close()
 
 # Save forecast data
 df_forecasts = pd.DataFrame(forecast_results)
-df_forecasts.to_csv(f'{OUTPUT_DIR}/Tables/Table3_20year_Forecasts.csv', index=False)
+save_table(df_forecasts, f'{OUTPUT_DIR}/Tables/Table3_20year_Forecasts.csv', index=False)
 print(f"✓ Saved forecast data for {len(top6_genera)} genera")
 
 # ============================================================================
@@ -320,6 +326,8 @@ print("\n" + "="*70)
 print("Generating Figure 4: Cumulative Research Output")
 print("="*70)
 
+PROFILE.stage('Fig4', rows_in=len(df_clean))
+
 # Calculate cumulative publications for top 5 genera
 top5_genera = top_genera[:5]
 
@@ -359,6 +367,8 @@ print("\n" + "="*70)
 print("Generating Figure 5: Publication Trends by Decade")
 print("="*70)
 
+PROFILE.stage('Fig5', rows_in=len(df_clean))
+
 # Assign decades
 df_clean['Decade'] = (df_clean['pub_year'] // 10) * 10
 
@@ -399,7 +409,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig5_Decade_Comparison.png')
 plt.close()
 
 # Save data
-decade_pivot.to_csv(f'{OUTPUT_DIR}/Tables/Table4_Decade_Trends.csv')
+save_table(decade_pivot, f'{OUTPUT_DIR}/Tables/Table4_Decade_Trends.csv')
 print("✓ Saved decade comparison data")
 
 # ============================================================================
@@ -410,6 +420,8 @@ print("\n" + "="*70)
 print("Generating Figure 6: Research Momentum Analysis")
 print("="*70)
 
+PROFILE.stage('Fig6', rows_in=len(df_clean))
+
 # Calculate 5-year moving average and acceleration
 momentum_data = []
 
@@ -468,14 +480,8 @@ ax.spines['right'].set_visible(False)
 ax.grid(axis='x', alpha=0.3)
 
 # Add value labels
-for i, v in enumerate(df_momentum['Momentum']):
-    if v >= 0:
-        label_x = v + abs(df_momentum['Momentum'].max() - df_momentum['Momentum'].min()) * 0.02
-        ha = 'left'
-    else:
-        label_x = v - abs(df_momentum['Momentum'].max() - df_momentum['Momentum'].min()) * 0.02
-        ha = 'right'
-    ax.text(label_x, i, f'{v:+.1f}%', va='center', ha=ha, fontsize=7, fontweight='bold')
+label_bars(ax, y_pos, df_momentum['Momentum'], fmt='{:+.1f}%',
+           pad=np.ptp(df_momentum['Momentum']) * 0.02, fontweight='bold')
 
 # Add legend
 from matplotlib.patches import Patch
@@ -490,9 +496,13 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig6_Research_Momentum.png')
 plt.close()
 
 # Save data
-df_momentum.to_csv(f'{OUTPUT_DIR}/Tables/Table5_Research_Momentum.csv', index=False)
+save_table(df_momentum, f'{OUTPUT_DIR}/Tables/Table5_Research_Momentum.csv', index=False)
 print("✓ Saved research momentum data")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -510,3 +520,6 @@ print("  ✓ Fig6: Research Momentum Analysis (horizontal bars)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("Consistent genus colors used throughout")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
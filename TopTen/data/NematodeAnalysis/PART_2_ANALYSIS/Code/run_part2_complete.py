@@ -4,6 +4,7 @@ PART 2 COMPLETE ANALYSIS RUNNER
 Runs all PART_2 analyses and generates all outputs
 """
 
+import os
 import subprocess
 import sys
 
@@ -21,7 +22,7 @@ scripts = [
 for script in scripts:
     print(f"\n>>> Executing: {script}")
     result = subprocess.run([sys.executable, script],
-                          cwd='/home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_2_ANALYSIS/Code',
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
                           capture_output=False)
     if result.returncode != 0:
         print(f"ERROR in {script}")
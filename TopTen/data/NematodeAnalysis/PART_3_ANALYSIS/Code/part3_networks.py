@@ -3,8 +3,11 @@ PART 3: Citation Networks and Journal Analysis
 ===============================================
 """
 
+import os
 import sys
-sys.path.insert(0, '/home/user/DataAnalyz/TopTen/data/NematodeAnalysis')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BASE_DIR)
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -12,10 +15,21 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import networkx as nx
 from analysis_utils import *
-
-DATA_PATH = '/home/user/DataAnalyz/TopTen/data/ALL_NEMATODES_EXTRACTED_Sampled.csv'
-CHARTS_PATH = '/home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_3_ANALYSIS/Charts'
-TABLES_PATH = '/home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_3_ANALYSIS/Tables'
+from network_layout import compute_layout
+from graph_analytics import adjacency_from_edges, network_metrics
+from mention_store import publication_ids
+from run_context import current_context
+
+# Dataset and output root come from the run context (run_context.py)
+CONTEXT = current_context(
+    track=BASE_DIR,
+    data_file=os.path.join(os.path.dirname(BASE_DIR), 'ALL_NEMATODES_EXTRACTED_Sampled.csv'))
+DATA_PATH = CONTEXT.data_file
+CHARTS_PATH = os.path.join(CONTEXT.part_dir(3), 'Charts')
+TABLES_PATH = os.path.join(CONTEXT.part_dir(3), 'Tables')
+LAYOUT_PATH = os.path.join(CONTEXT.part_dir(3), 'Layouts')
+os.makedirs(CHARTS_PATH, exist_ok=True)
+os.makedirs(TABLES_PATH, exist_ok=True)
 
 print("\n" + "="*70)
 print("PART 3: CITATION NETWORKS & JOURNAL ANALYSIS")
@@ -34,8 +48,10 @@ print("\n[3] Analyzing cross-genus citation patterns...")
 high_cite_threshold = df['citations'].quantile(0.75)
 high_cite_papers = df[df['citations'] >= high_cite_threshold]
 
-# Group by paper (using title as proxy)
-genus_cooccurrence = high_cite_papers.groupby('title')['Genus'].apply(list).reset_index()
+# Group by paper: canonical publication ids merge titles that differ only in
+# case, punctuation or truncation (rows keep their source positions)
+paper_ids = publication_ids(DATA_PATH)[high_cite_papers.index.to_numpy()]
+genus_cooccurrence = high_cite_papers.groupby(paper_ids)['Genus'].apply(list).reset_index()
 
 # Build co-occurrence matrix
 from collections import defaultdict
@@ -74,7 +90,8 @@ G = nx.Graph()
 for _, row in top_pairs.iterrows():
     G.add_edge(row['Genus1'], row['Genus2'], weight=row['Cooccurrences'])
 
-pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
+pos = compute_layout(G, k=2, iterations=50, seed=42,
+                     name='Fig3a_Cooccurrence_Network', cache_dir=LAYOUT_PATH)
 node_sizes = [genus_cite_stats[genus_cite_stats['Genus']==n]['N_Papers'].values[0]*10
              if n in genus_cite_stats['Genus'].values else 100 for n in G.nodes()]
 node_colors = [GENUS_COLORS.get(n, NEMATODE_COLORS['neutral1']) for n in G.nodes()]
@@ -106,6 +123,12 @@ plt.tight_layout()
 save_figure(fig, f'{CHARTS_PATH}/Fig3_Citation_Networks.png')
 plt.close()
 
+# Structural metrics on the full co-occurrence graph
+A_cooccur, cooccur_nodes = adjacency_from_edges(cooccur_df['Genus1'], cooccur_df['Genus2'],
+                                                cooccur_df['Cooccurrences'])
+cooccur_metrics = network_metrics(A_cooccur, cooccur_nodes).rename(columns={'Node': 'Genus'})
+cooccur_metrics.to_csv(f'{TABLES_PATH}/genus_cooccurrence_network_metrics.csv', index=False)
+
 # ============================================================================
 # ANALYSIS 4: JOURNAL IMPACT ANALYSIS
 # ============================================================================
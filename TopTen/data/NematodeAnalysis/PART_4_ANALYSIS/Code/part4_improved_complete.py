@@ -10,8 +10,10 @@ Focused analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/NematodeAnalysis')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -20,19 +22,27 @@ import seaborn as sns
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from wordcloud import WordCloud
 from analysis_utils_improved import *
+from profiling import PROFILE
+from run_context import current_context
 import re
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Final_Nema_Data.xlsx'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_4_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=os.path.join(os.path.dirname(BASE_DIR), 'Final_Nema_Data.xlsx'))
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(4)
+
+# Columns this analysis reads (abstracts are read at the text stage)
+ANALYSIS_COLUMNS = ['PubYear', 'Times cited', 'Genus', 'Species']
 
 print("\n" + "="*70)
 print("PART 4: RESEARCH CONTENT ANALYSIS - IMPROVED VERSION")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_excel(DATA_FILE, engine='openpyxl')
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # Standardize column names
@@ -45,14 +55,18 @@ df = df.rename(columns={
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 # Filter papers with abstracts
-df_with_abstract = df_clean[df_clean['abstract'].notna()].copy()
+abstracts = load_text_column(DATA_FILE, 'Abstract')
+# Keyword and theme statistics count each publication once, not once per
+# genus/species it mentions
+df_with_abstract = one_row_per_publication(rows_with_text(df_clean, abstracts), DATA_FILE)
 print(f"\nPapers with abstracts: {len(df_with_abstract):,}")
 
 # Clean abstracts
@@ -66,7 +80,8 @@ def clean_abstract(text):
     text = ' '.join(text.split())
     return text
 
-df_with_abstract['abstract_clean'] = df_with_abstract['abstract'].apply(clean_abstract)
+# Cleaned by worker processes reading straight from the memory-mapped text store
+df_with_abstract['abstract_clean'] = abstracts.map(clean_abstract, rows=df_with_abstract.index)
 
 # ============================================================================
 # FIGURE 1: Top Keywords Analysis (IMPROVED)
@@ -76,6 +91,8 @@ print("\n" + "="*70)
 print("Generating Figure 1: Top Research Keywords")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_with_abstract))
+
 # Extract keywords using TF-IDF
 tfidf = TfidfVectorizer(max_features=50, stop_words='english',
                         ngram_range=(1, 2), min_df=10, max_df=0.7)
@@ -123,7 +140,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_Top_Keywords.png')
 plt.close()
 
 # Save data
-keyword_df.to_csv(f'{OUTPUT_DIR}/Tables/Table1_Top_Keywords.csv', index=False)
+save_table(keyword_df, f'{OUTPUT_DIR}/Tables/Table1_Top_Keywords.csv', index=False)
 print(f"✓ Extracted and saved top {len(keyword_df)} keywords")
 
 # ============================================================================
@@ -134,6 +151,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Research Theme Evolution")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_with_abstract))
+
 # Define research themes based on keywords
 themes = {
     'Molecular/Genetics': ['gene', 'genetic', 'molecular', 'dna', 'rna', 'genome', 'sequence'],
@@ -200,7 +219,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Theme_Evolution.png')
 plt.close()
 
 # Save data
-df_themes.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Theme_Trends.csv', index=False)
+save_table(df_themes, f'{OUTPUT_DIR}/Tables/Table2_Theme_Trends.csv', index=False)
 print("✓ Analyzed theme evolution across 44 years")
 
 # ============================================================================
@@ -211,6 +230,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: Emerging vs Declining Topics")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_with_abstract))
+
 # Compare recent (2014-2023) vs older (2004-2013) periods
 recent_abstracts = df_with_abstract[
     (df_with_abstract['pub_year'] >= 2014) & (df_with_abstract['pub_year'] <= 2023)
@@ -293,9 +314,13 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig3_Emerging_Declining_Topics.png')
 plt.close()
 
 # Save data
-df_changes.to_csv(f'{OUTPUT_DIR}/Tables/Table3_Topic_Changes.csv', index=False)
+save_table(df_changes, f'{OUTPUT_DIR}/Tables/Table3_Topic_Changes.csv', index=False)
 print(f"✓ Identified emerging and declining topics")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -309,3 +334,6 @@ print("  ✓ Fig2: Research Theme Evolution (line plot)")
 print("  ✓ Fig3: Emerging vs Declining Topics (2-panel bars)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
@@ -1,499 +0,0 @@
-"""
-Improved Utility Functions for Nematode Research Analysis Project
-Nature-Quality Publication Standards
-Provides consistent styling, plotting, and data processing functions
-"""
-
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib import rcParams
-from matplotlib.patches import Rectangle
-import warnings
-warnings.filterwarnings('ignore')
-
-# ============================================================================
-# NATURE-QUALITY COLOR SCHEME
-# ============================================================================
-
-# Professional color palette based on ColorBrewer and Nature journals
-# Using muted, distinguishable colors suitable for scientific publications
-
-GENUS_COLORS = {
-    # Top 10 most studied genera - distinct professional colors
-    'Meloidogyne': '#d62728',     # Red (root-knot nematodes)
-    'Pratylenchus': '#2ca02c',    # Green (lesion nematodes)
-    'Heterodera': '#1f77b4',      # Blue (cyst nematodes)
-    'Globodera': '#9467bd',       # Purple (potato cyst nematodes)
-    'Bursaphelenchus': '#ff7f0e', # Orange (pine wilt nematodes)
-    'Xiphinema': '#8c564b',       # Brown (dagger nematodes)
-    'Radopholus': '#e377c2',      # Pink (burrowing nematodes)
-    'Longidorus': '#7f7f7f',      # Gray (needle nematodes)
-    'Aphelenchoides': '#bcbd22',  # Olive (foliar nematodes)
-    'Ditylenchus': '#17becf',     # Cyan (stem and bulb nematodes)
-
-    # Next 10 genera - complementary colors
-    'Tylenchulus': '#aec7e8',     # Light blue
-    'Rotylenchulus': '#ffbb78',   # Light orange
-    'Helicotylenchus': '#98df8a', # Light green
-    'Hoplolaimus': '#ff9896',     # Light red
-    'Belonolaimus': '#c5b0d5',    # Light purple
-    'Criconemella': '#c49c94',    # Light brown
-    'Nacobbus': '#f7b6d2',        # Light pink
-    'Paratrichodorus': '#c7c7c7', # Light gray
-    'Trichodorus': '#dbdb8d',     # Light olive
-    'Anguina': '#9edae5',         # Light cyan
-
-    # Additional genera - professional palette
-    'Rotylenchus': '#393b79',     # Dark blue
-    'Tylenchorhynchus': '#637939', # Dark olive
-    'Hemicycliophora': '#8c6d31', # Dark brown
-    'Scutellonema': '#843c39',    # Dark red
-    'Criconemoides': '#7b4173',   # Dark purple
-    'Mesocriconema': '#5254a3',   # Medium blue
-    'Paratylenchus': '#6b6ecf',   # Medium purple
-    'Hirschmanniella': '#b5cf6b', # Light green-yellow
-    'Hemicriconemoides': '#ce6dbd', # Medium pink
-    'Aphelenchus': '#9c9ede',     # Lavender
-    'Hemicaloosia': '#cedb9c',    # Pale green
-    'Merlinius': '#de9ed6',       # Pink-purple
-}
-
-# Color gradients for continuous data
-SEQUENTIAL_CMAP = 'viridis'      # For continuous positive data
-DIVERGING_CMAP = 'RdBu_r'        # For diverging data (e.g., bias)
-HEATMAP_CMAP = 'YlOrRd'          # For heatmaps
-
-# Base palette for general use
-BASE_PALETTE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
-                '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
-
-# ============================================================================
-# NATURE-QUALITY PLOTTING CONFIGURATION
-# ============================================================================
-
-def set_nature_style():
-    """
-    Set matplotlib parameters for Nature-quality figures
-    Following Nature journal figure guidelines
-    """
-    # High resolution for publication
-    rcParams['figure.dpi'] = 600
-    rcParams['savefig.dpi'] = 600
-
-    # Font settings - Nature prefers Arial or Helvetica
-    rcParams['font.family'] = 'sans-serif'
-    rcParams['font.sans-serif'] = ['Arial', 'Helvetica', 'DejaVu Sans']
-    rcParams['font.size'] = 8  # Nature: 6-8pt
-    rcParams['axes.labelsize'] = 9
-    rcParams['axes.titlesize'] = 10
-    rcParams['xtick.labelsize'] = 8
-    rcParams['ytick.labelsize'] = 8
-    rcParams['legend.fontsize'] = 8
-    rcParams['legend.title_fontsize'] = 9
-
-    # Line and border settings - cleaner look
-    rcParams['axes.linewidth'] = 0.8
-    rcParams['grid.linewidth'] = 0.5
-    rcParams['lines.linewidth'] = 1.5
-    rcParams['patch.linewidth'] = 0.8
-    rcParams['xtick.major.width'] = 0.8
-    rcParams['ytick.major.width'] = 0.8
-
-    # Grid settings - subtle
-    rcParams['grid.alpha'] = 0.3
-    rcParams['grid.linestyle'] = '--'
-
-    # Legend settings
-    rcParams['legend.frameon'] = False
-    rcParams['legend.numpoints'] = 1
-    rcParams['legend.scatterpoints'] = 1
-
-    # Clean seaborn style
-    sns.set_style("ticks", {
-        'axes.edgecolor': '0.15',
-        'axes.grid': True,
-        'grid.color': '0.9',
-        'grid.linestyle': '-',
-    })
-    sns.set_palette(BASE_PALETTE)
-
-def save_figure(fig, filepath, dpi=600, bbox_inches='tight', transparent=False):
-    """
-    Save figure in Nature publication quality
-    """
-    fig.savefig(filepath, dpi=dpi, bbox_inches=bbox_inches,
-                facecolor='white' if not transparent else 'none',
-                edgecolor='none')
-    print(f"✓ Saved: {filepath}")
-
-def get_genus_color(genus_name, default_color='#7f7f7f'):
-    """
-    Get consistent color for a genus across all analyses
-    """
-    return GENUS_COLORS.get(genus_name, default_color)
-
-def create_genus_colormap(genera_list):
-    """
-    Create a color mapping for a list of genera
-    Ensures consistency across all visualizations
-    """
-    return {genus: get_genus_color(genus) for genus in genera_list}
-
-# ============================================================================
-# IMPROVED DATA CLEANING FUNCTIONS
-# ============================================================================
-
-def clean_species_names(df, species_col='Species'):
-    """
-    Remove generic species names (sp, sp., spp, spp., species)
-    Returns cleaned dataframe
-    """
-    if species_col not in df.columns:
-        return df
-
-    exclude_patterns = ['^sp$', '^sp\.$', '^spp$', '^spp\.$', '^species$',
-                       '^spec$', '^spec\.$']
-
-    mask = df[species_col].astype(str).str.lower().str.match('|'.join(exclude_patterns))
-    df_clean = df[~mask].copy()
-
-    removed = len(df) - len(df_clean)
-    print(f"✓ Removed {removed:,} non-specific species names")
-
-    return df_clean
-
-def filter_excluded_genera(df, genus_col='Genus', exclude_list=None):
-    """
-    Remove excluded genera (Steinernema, Heterorhabditis by default)
-    These are entomopathogenic nematodes, not plant-parasitic
-    """
-    if exclude_list is None:
-        exclude_list = ['Steinernema', 'Heterorhabditis']
-
-    if genus_col not in df.columns:
-        return df
-
-    df_clean = df[~df[genus_col].str.capitalize().isin([g.capitalize() for g in exclude_list])].copy()
-
-    removed = len(df) - len(df_clean)
-    print(f"✓ Removed {removed:,} records from excluded genera: {', '.join(exclude_list)}")
-
-    return df_clean
-
-def apply_analysis_filters(df):
-    """Apply all standard filters for analysis"""
-    print("\nApplying analysis filters...")
-    df = filter_excluded_genera(df)
-    df = clean_species_names(df)
-    print(f"✓ Final dataset: {len(df):,} records\n")
-    return df
-
-# ============================================================================
-# IMPROVED HOST PLANT EXTRACTION
-# ============================================================================
-
-# Comprehensive list of crop and plant names
-CROP_PLANTS = {
-    # Vegetables
-    'tomato', 'potato', 'pepper', 'eggplant', 'carrot', 'onion', 'garlic',
-    'lettuce', 'cucumber', 'cabbage', 'cauliflower', 'broccoli', 'spinach',
-    'radish', 'turnip', 'beet', 'beetroot', 'celery', 'asparagus',
-
-    # Cereals and grains
-    'wheat', 'rice', 'maize', 'corn', 'barley', 'oat', 'rye', 'sorghum',
-    'millet', 'triticale',
-
-    # Legumes
-    'soybean', 'soya', 'bean', 'pea', 'chickpea', 'lentil', 'peanut',
-    'groundnut', 'cowpea', 'pigeon pea', 'mung bean', 'faba bean',
-
-    # Industrial crops
-    'cotton', 'tobacco', 'sugarcane', 'sugar beet', 'rapeseed', 'canola',
-    'sunflower', 'safflower', 'sesame', 'flax', 'hemp', 'jute',
-
-    # Fruits
-    'banana', 'plantain', 'apple', 'pear', 'peach', 'plum', 'cherry',
-    'apricot', 'citrus', 'orange', 'lemon', 'grapefruit', 'grape',
-    'strawberry', 'raspberry', 'blueberry', 'pineapple', 'mango',
-    'papaya', 'avocado', 'fig', 'kiwi',
-
-    # Root crops
-    'cassava', 'yam', 'sweet potato', 'taro', 'ginger', 'turmeric',
-
-    # Forages
-    'alfalfa', 'clover', 'grass', 'ryegrass', 'fescue', 'timothy',
-
-    # Tree crops
-    'coffee', 'cacao', 'cocoa', 'tea', 'coconut', 'palm', 'rubber',
-    'olive', 'walnut', 'almond', 'hazelnut', 'pecan', 'cashew',
-
-    # Ornamentals
-    'rose', 'chrysanthemum', 'tulip', 'lily', 'orchid', 'carnation',
-
-    # Trees
-    'pine', 'oak', 'poplar', 'eucalyptus', 'acacia', 'willow', 'maple',
-}
-
-def extract_host_plants_improved(abstract):
-    """
-    Extract host plant names from abstract text with improved accuracy
-    Only extracts known crop/plant names, not random phrases
-    """
-    if pd.isna(abstract):
-        return []
-
-    import re
-
-    abstract_lower = str(abstract).lower()
-    hosts = []
-
-    # Extract known crop plants
-    for plant in CROP_PLANTS:
-        # Match whole word boundaries
-        pattern = r'\b' + re.escape(plant) + r'(?:es|s)?\b'
-        if re.search(pattern, abstract_lower):
-            hosts.append(plant.title())
-
-    # Extract scientific binomial names (but validate they look like plants)
-    # Pattern: Capitalized genus + lowercase species
-    binomial_pattern = r'\b([A-Z][a-z]{3,})\s+([a-z]{3,})\b'
-    binomials = re.findall(binomial_pattern, str(abstract))
-
-    # Common plant genera
-    plant_genera = {
-        'Solanum', 'Lycopersicon', 'Triticum', 'Oryza', 'Zea', 'Glycine',
-        'Nicotiana', 'Gossypium', 'Brassica', 'Lactuca', 'Cucumis', 'Citrus',
-        'Malus', 'Prunus', 'Vitis', 'Fragaria', 'Saccharum', 'Beta',
-        'Allium', 'Daucus', 'Pisum', 'Phaseolus', 'Vigna', 'Arachis',
-        'Coffea', 'Theobroma', 'Musa', 'Hordeum', 'Avena', 'Medicago',
-        'Trifolium', 'Pinus', 'Quercus', 'Populus', 'Eucalyptus',
-    }
-
-    for genus, species in binomials:
-        if genus in plant_genera:
-            hosts.append(f"{genus} {species}")
-
-    # Remove duplicates and return
-    return list(set(hosts))
-
-# ============================================================================
-# ENHANCED STATISTICAL FUNCTIONS
-# ============================================================================
-
-def calculate_confidence_interval(data, confidence=0.95):
-    """
-    Calculate confidence interval for data
-    """
-    from scipy import stats
-
-    data_clean = data.dropna()
-    if len(data_clean) < 2:
-        return None, None
-
-    mean = data_clean.mean()
-    se = stats.sem(data_clean)
-    ci = se * stats.t.ppf((1 + confidence) / 2., len(data_clean)-1)
-
-    return mean - ci, mean + ci
-
-def add_significance_bar(ax, x1, x2, y, p_value, height=0.05):
-    """
-    Add significance bar to plot
-    """
-    # Determine significance level
-    if p_value < 0.001:
-        sig_text = '***'
-    elif p_value < 0.01:
-        sig_text = '**'
-    elif p_value < 0.05:
-        sig_text = '*'
-    else:
-        sig_text = 'ns'
-
-    # Draw bar
-    ax.plot([x1, x1, x2, x2], [y, y+height, y+height, y], 'k-', linewidth=1)
-    ax.text((x1+x2)/2, y+height, sig_text, ha='center', va='bottom', fontsize=8)
-
-def calculate_growth_rate(years, values):
-    """
-    Calculate compound annual growth rate (CAGR)
-    """
-    if len(years) < 2 or len(values) < 2:
-        return None
-
-    years = np.array(years)
-    values = np.array(values)
-
-    # Filter out zeros and negatives
-    mask = values > 0
-    if mask.sum() < 2:
-        return None
-
-    years_clean = years[mask]
-    values_clean = values[mask]
-
-    n_years = years_clean[-1] - years_clean[0]
-    if n_years == 0:
-        return None
-
-    cagr = (values_clean[-1] / values_clean[0]) ** (1/n_years) - 1
-    return cagr * 100  # Return as percentage
-
-def detect_trend_change_points(years, values, min_segment_length=5):
-    """
-    Detect change points in time series using Bayesian changepoint detection
-    """
-    from scipy import stats
-
-    if len(years) < min_segment_length * 2:
-        return []
-
-    # Simple implementation: look for significant slope changes
-    changepoints = []
-
-    for i in range(min_segment_length, len(years) - min_segment_length):
-        # Fit line to before and after segments
-        before_slope, _, _, _, _ = stats.linregress(years[:i], values[:i])
-        after_slope, _, _, _, _ = stats.linregress(years[i:], values[i:])
-
-        # If slopes differ significantly, mark as changepoint
-        if abs(before_slope - after_slope) > 0.5:
-            changepoints.append(i)
-
-    return changepoints
-
-# ============================================================================
-# DATA PROCESSING FUNCTIONS
-# ============================================================================
-
-def process_count_field(df, count_col='Count'):
-    """
-    Process Count field - convert to numeric where possible
-    """
-    df_copy = df.copy()
-
-    # Try to convert to numeric, set non-numeric to NaN
-    df_copy['count_numeric'] = pd.to_numeric(df_copy[count_col], errors='coerce')
-
-    # Fill NaN with 1 (assuming single mention if not specified)
-    df_copy['count_numeric'] = df_copy['count_numeric'].fillna(1).astype(int)
-
-    return df_copy
-
-def standardize_publication_dates(df):
-    """
-    Standardize publication_date column to datetime
-    """
-    df_copy = df.copy()
-
-    # Convert publication_date to datetime
-    df_copy['publication_date'] = pd.to_datetime(df_copy['publication_date'], errors='coerce')
-
-    # If publication_date is missing, use pub_year to create date
-    mask = df_copy['publication_date'].isna()
-    if mask.sum() > 0 and 'pub_year' in df_copy.columns:
-        df_copy.loc[mask, 'publication_date'] = pd.to_datetime(
-            df_copy.loc[mask, 'pub_year'].astype(str) + '-01-01',
-            errors='coerce'
-        )
-
-    return df_copy
-
-def extract_country_from_factorials(row):
-    """
-    Extract country information from factorials column if country column is empty
-    """
-    if pd.notna(row.get('country')) and row.get('country') != '':
-        return row['country']
-
-    if pd.notna(row.get('factorials')):
-        parts = str(row['factorials']).split('=')
-        if len(parts) >= 10:
-            country_part = parts[9].strip()
-            if country_part and country_part != 'NA':
-                # Take first country if multiple
-                return country_part.split(';')[0].strip()
-
-    return None
-
-def standardize_countries(df):
-    """
-    Standardize country names and extract from all available columns
-    """
-    df_copy = df.copy()
-
-    # Extract country from factorials if missing
-    if 'country' in df_copy.columns or 'factorials' in df_copy.columns:
-        df_copy['country_clean'] = df_copy.apply(extract_country_from_factorials, axis=1)
-
-    # Standardize common variations
-    country_mapping = {
-        'United States': 'USA',
-        'United Kingdom': 'UK',
-        'The Netherlands': 'Netherlands',
-    }
-
-    if 'country_clean' in df_copy.columns:
-        df_copy['country_clean'] = df_copy['country_clean'].replace(country_mapping)
-
-    return df_copy
-
-# ============================================================================
-# LOADING AND INITIALIZATION
-# ============================================================================
-
-def load_and_prepare_data(filepath):
-    """
-    Load CSV and apply initial preparation
-    """
-    print(f"\nLoading data from: {filepath}")
-    df = pd.read_csv(filepath, low_memory=False)
-
-    # Apply standard processing
-    df = standardize_publication_dates(df)
-    df = standardize_countries(df)
-    df = process_count_field(df)
-
-    print(f"✓ Loaded {len(df):,} records")
-    if 'pub_year' in df.columns:
-        print(f"✓ Date range: {df['pub_year'].min()} - {df['pub_year'].max()}")
-    if 'Genus' in df.columns:
-        print(f"✓ Unique genera: {df['Genus'].nunique()}")
-    if 'Species' in df.columns:
-        print(f"✓ Unique species: {df['Species'].nunique()}")
-
-    return df
-
-# ============================================================================
-# REPORT GENERATION HELPERS
-# ============================================================================
-
-def create_summary_table(df, title="Summary Statistics"):
-    """Create a formatted summary statistics table"""
-    summary = {
-        'Total Records': f"{len(df):,}",
-        'Unique Genera': df['Genus'].nunique() if 'Genus' in df.columns else 'N/A',
-        'Unique Species': df['Species'].nunique() if 'Species' in df.columns else 'N/A',
-        'Date Range': f"{df['pub_year'].min()}-{df['pub_year'].max()}" if 'pub_year' in df.columns else 'N/A',
-        'Total Citations': f"{df['citations'].sum():,.0f}" if 'citations' in df.columns else 'N/A',
-        'Mean Citations': f"{df['citations'].mean():.1f}" if 'citations' in df.columns else 'N/A',
-    }
-    return pd.DataFrame([summary]).T.rename(columns={0: 'Value'})
-
-# ============================================================================
-# INITIALIZE ON IMPORT
-# ============================================================================
-
-# Set Nature-quality style when module is imported
-set_nature_style()
-
-print("\n" + "="*70)
-print("✓ IMPROVED Nematode Analysis Utilities Loaded")
-print("="*70)
-print("✓ Nature-quality publication style configured (600 DPI)")
-print("✓ Professional color scheme initialized (32 genera)")
-print("✓ Enhanced statistical functions available")
-print("✓ Improved host plant extraction with validated plant list")
-print("="*70 + "\n")
@@ -1,35 +1,58 @@
 #!/bin/bash
 # Master script to run all improved analyses
+#
+# Usage: ./run_all_improvements.sh [CONTEXT_FILE]
+# CONTEXT_FILE is a run context (dataset, output root, cache directory,
+# worker count; see run_context.py). Logs go to <output root>/Logs, so runs
+# with different contexts can go side by side.
+
+HERE="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+SHARED="$(dirname "$HERE")/shared"
+if [ -n "$1" ]; then
+    export DATAANALYZ_CONTEXT="$(cd "$(dirname "$1")" && pwd)/$(basename "$1")"
+fi
+OUTPUT_ROOT="$(python "$SHARED/run_context.py" get output_root --track "$HERE")" || exit 2
+LOG_DIR="$(python "$SHARED/run_context.py" get log_dir --track "$HERE")" || exit 2
+mkdir -p "$LOG_DIR"
 
 echo "======================================================================="
 echo "Running All Improved Nematode Analyses"
 echo "======================================================================="
+echo "Output root: $OUTPUT_ROOT"
 echo ""
 
 # PART_1
 echo "Running PART_1 (Species & Taxonomic Analysis)..."
-cd /home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_1_ANALYSIS
-python Code/part1_improved_complete.py > /tmp/part1_improved.log 2>&1
+python "$HERE/PART_1_ANALYSIS/Code/part1_improved_complete.py" > "$LOG_DIR/part1_improved.log" 2>&1
 if [ $? -eq 0 ]; then
     echo "✓ PART_1 Complete"
 else
-    echo "✗ PART_1 Failed - check /tmp/part1_improved.log"
+    echo "✗ PART_1 Failed - check $LOG_DIR/part1_improved.log"
 fi
 echo ""
 
 # PART_2
 echo "Running PART_2 (Temporal & Trend Analysis)..."
-cd /home/user/DataAnalyz/TopTen/data/NematodeAnalysis/PART_2_ANALYSIS
-python Code/part2_improved_complete.py > /tmp/part2_improved.log 2>&1
+python "$HERE/PART_2_ANALYSIS/Code/part2_improved_complete.py" > "$LOG_DIR/part2_improved.log" 2>&1
 if [ $? -eq 0 ]; then
     echo "✓ PART_2 Complete"
 else
-    echo "✗ PART_2 Failed - check /tmp/part2_improved.log"
+    echo "✗ PART_2 Failed - check $LOG_DIR/part2_improved.log"
 fi
 echo ""
 
 # PART_3-7 will be created with simpler focused improvements
+
+# Run profile summary across parts
+python "$SHARED/profiling.py" "$OUTPUT_ROOT"
+echo ""
+
+# Report over all parts: figures as thumbnails, table excerpts, timings
+python "$SHARED/report.py" --track "$HERE"
+echo ""
+
 echo "======================================================================="
 echo "All analyses complete!"
-echo "Check /tmp/*_improved.log for detailed output"
+echo "Check $LOG_DIR/*_improved.log for detailed output"
+echo "Report: $OUTPUT_ROOT/Report/index.html"
 echo "======================================================================="
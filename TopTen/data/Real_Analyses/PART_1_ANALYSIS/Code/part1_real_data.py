@@ -13,40 +13,54 @@ Comprehensive analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
 import networkx as nx
 from analysis_utils_improved import *
-
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_1_ANALYSIS'
+from profiling import PROFILE
+from run_context import current_context
+from network_layout import compute_layout
+from graph_analytics import adjacency_from_edges, network_metrics
+from resampling import bootstrap_correlation
+from countries import explode_countries
+
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(1)
+
+# Columns this analysis reads (abstracts are read at the text stage)
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species', 'country', 'country_clean']
 
 print("\n" + "="*70)
 print("PART 1: SPECIES & TAXONOMIC ANALYSIS - REAL DATA")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset after filtering:")
 print(f"  Total records: {len(df_clean):,}")
@@ -62,6 +76,8 @@ print("\n" + "="*70)
 print("Generating Figure 1: Species Discovery Rate Analysis")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
 # Prepare species discovery data
 species_by_year = df_clean.groupby(['pub_year', 'Species']).size().reset_index()
 species_by_year = species_by_year.groupby('pub_year')['Species'].nunique().reset_index()
@@ -130,7 +146,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_Species_Discovery_Rate.png')
 plt.close()
 
 # Save data
-species_by_year.to_csv(f'{OUTPUT_DIR}/Tables/Table1_Species_Discovery_Rates.csv', index=False)
+save_table(species_by_year, f'{OUTPUT_DIR}/Tables/Table1_Species_Discovery_Rates.csv', index=False)
 print(f"✓ Saved species discovery data ({len(species_by_year)} years)")
 
 # ============================================================================
@@ -141,6 +157,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Taxonomic Completeness Analysis")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_clean))
+
 # Calculate genus-level metrics
 genus_stats = df_clean.groupby('Genus').agg({
     'Species': 'nunique',
@@ -166,9 +184,7 @@ y_pos = np.arange(len(genus_stats))
 bars = ax.barh(y_pos, genus_stats['N_Species'], color=colors, edgecolor='black', linewidth=0.5)
 
 # Add value labels
-for i, (idx, row) in enumerate(genus_stats.iterrows()):
-    ax.text(row['N_Species'] + 1, i, f"{int(row['N_Species'])}",
-           va='center', ha='left', fontsize=8)
+label_bars(ax, y_pos, genus_stats['N_Species'], pad=1, fontsize=8)
 
 ax.set_yticks(y_pos)
 ax.set_yticklabels(genus_stats['Genus'], style='italic')
@@ -183,7 +199,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Taxonomic_Completeness.png')
 plt.close()
 
 # Save data
-genus_stats.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Genus_Taxonomic_Stats.csv', index=False)
+save_table(genus_stats, f'{OUTPUT_DIR}/Tables/Table2_Genus_Taxonomic_Stats.csv', index=False)
 print(f"✓ Saved taxonomic completeness data ({len(genus_stats)} genera)")
 
 # ============================================================================
@@ -194,6 +210,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: Research Effort vs Species Diversity")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_clean))
+
 # Use all genera for this analysis
 genus_full_stats = df_clean.groupby('Genus').agg({
     'Species': 'nunique',
@@ -207,22 +225,20 @@ fig, ax = plt.subplots(figsize=(10, 7))
 
 # Get colors for top genera
 top_genera = genus_full_stats.nlargest(15, 'N_Publications')['Genus'].tolist()
-colors = [get_genus_color(g) if g in top_genera else '#cccccc' for g in genus_full_stats['Genus']]
-alphas = [0.7 if g in top_genera else 0.3 for g in genus_full_stats['Genus']]
-sizes = [80 if g in top_genera else 30 for g in genus_full_stats['Genus']]
+is_top = genus_full_stats['Genus'].isin(top_genera).to_numpy()
+colors = np.where(is_top, [get_genus_color(g) for g in genus_full_stats['Genus']], '#cccccc')
 
-# Scatter plot
-for i, row in genus_full_stats.iterrows():
-    ax.scatter(row['N_Publications'], row['N_Species'],
-              s=sizes[i], c=[colors[i]], alpha=alphas[i],
-              edgecolors='black', linewidth=0.5, zorder=3 if row['Genus'] in top_genera else 1)
+# Scatter plot (one collection per z-order rather than one per genus)
+scatter_batched(ax, genus_full_stats['N_Publications'], genus_full_stats['N_Species'],
+                sizes=np.where(is_top, 80, 30), colors=colors,
+                alphas=np.where(is_top, 0.7, 0.3), zorders=np.where(is_top, 3, 1),
+                edgecolors='black', linewidths=0.5)
 
 # Label top 10 genera
-for _, row in genus_full_stats.nlargest(10, 'N_Publications').iterrows():
-    ax.annotate(row['Genus'],
-               (row['N_Publications'], row['N_Species']),
-               xytext=(5, 5), textcoords='offset points',
-               fontsize=8, style='italic', fontweight='bold')
+annotate_points(ax, genus_full_stats['N_Publications'], genus_full_stats['N_Species'],
+                genus_full_stats['Genus'], max_labels=10,
+                priority=genus_full_stats['N_Publications'],
+                fontsize=8, style='italic', fontweight='bold')
 
 # Add trend line
 z = np.polyfit(genus_full_stats['N_Publications'], genus_full_stats['N_Species'], 1)
@@ -231,9 +247,11 @@ x_trend = np.linspace(genus_full_stats['N_Publications'].min(),
                      genus_full_stats['N_Publications'].max(), 100)
 ax.plot(x_trend, p(x_trend), "r--", alpha=0.5, linewidth=2, label='Linear trend', zorder=2)
 
-# Calculate correlation
-r, p_val = stats.pearsonr(genus_full_stats['N_Publications'], genus_full_stats['N_Species'])
-ax.text(0.05, 0.95, f'r = {r:.3f}\np < 0.001' if p_val < 0.001 else f'r = {r:.3f}\np = {p_val:.3f}',
+# Calculate correlation (bootstrap CI, permutation p-value)
+corr = bootstrap_correlation(genus_full_stats['N_Publications'], genus_full_stats['N_Species'])
+r, p_val = corr['r'], corr['p_value']
+p_text = 'p < 0.001' if p_val < 0.001 else f'p = {p_val:.3f}'
+ax.text(0.05, 0.95, f"r = {r:.3f} [95% CI {corr['ci_lower']:.2f}, {corr['ci_upper']:.2f}]\n{p_text}",
        transform=ax.transAxes, va='top', ha='left',
        bbox=dict(boxstyle='round', facecolor='white', edgecolor='black', alpha=0.8))
 
@@ -249,7 +267,8 @@ plt.tight_layout()
 save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig3_Research_Effort_vs_Diversity.png')
 plt.close()
 
-print(f"✓ Correlation: r={r:.3f}, p={p_val:.3e}")
+print(f"✓ Correlation: r={r:.3f} (95% CI {corr['ci_lower']:.3f} to {corr['ci_upper']:.3f}), "
+      f"permutation p={p_val:.3e}")
 
 # ============================================================================
 # FIGURE 4: Host-Parasite Networks (FIXED - REAL PLANTS ONLY)
@@ -259,23 +278,25 @@ print("\n" + "="*70)
 print("Generating Figure 4: Host-Parasite Network Analysis")
 print("="*70)
 
+PROFILE.stage('Fig4', rows_in=len(df_clean))
+
 # Extract host plants from abstracts (IMPROVED METHOD)
 print("Extracting host-parasite relationships...")
-df_with_abstract = df_clean[df_clean['abstract'].notna()].copy()
-
-# Use improved extraction function
-host_plant_records = []
-for idx, row in df_with_abstract.iterrows():
-    hosts = extract_host_plants_improved(row['abstract'])
-    for host in hosts:
-        host_plant_records.append({
-            'Genus': row['Genus'],
-            'Species': row['Species'],
-            'Host': host,
-            'Year': row['pub_year']
-        })
-
-df_hosts = pd.DataFrame(host_plant_records)
+abstracts = load_text_column(DATA_FILE, 'abstract')
+df_with_abstract = rows_with_text(df_clean, abstracts)
+
+# Use improved extraction function; worker processes read the abstracts
+# straight from the memory-mapped text store
+hosts = pd.Series(abstracts.map(extract_host_plants_improved, rows=df_with_abstract.index),
+                  index=df_with_abstract.index).explode().dropna()
+host_rows = df_with_abstract.loc[hosts.index]
+
+df_hosts = pd.DataFrame({
+    'Genus': host_rows['Genus'].to_numpy(),
+    'Species': host_rows['Species'].to_numpy(),
+    'Host': hosts.to_numpy(),
+    'Year': host_rows['pub_year'].to_numpy()
+})
 
 if len(df_hosts) > 0:
     print(f"✓ Extracted {len(df_hosts):,} host-parasite relationships")
@@ -311,9 +332,7 @@ if len(df_hosts) > 0:
     ax1.grid(axis='x', alpha=0.3)
 
     # Add value labels
-    for i, v in enumerate(host_counts.values):
-        ax1.text(v + max(host_counts.values)*0.01, i, str(int(v)),
-                va='center', ha='left', fontsize=7)
+    label_bars(ax1, y_pos, host_counts.values)
 
     # RIGHT: Network visualization
     G = nx.Graph()
@@ -329,7 +348,8 @@ if len(df_hosts) > 0:
         G.add_edge(row['Genus'], row['Host'], weight=row['Count'])
 
     # Layout
-    pos = nx.spring_layout(G, k=1.5, iterations=50, seed=42)
+    pos = compute_layout(G, k=1.5, iterations=50, seed=42,
+                         name='Fig4_Host_Parasite_Network', cache_dir=f'{OUTPUT_DIR}/Layouts')
 
     # Draw network
     # Nematode nodes
@@ -378,8 +398,15 @@ if len(df_hosts) > 0:
     plt.close()
 
     # Save host-parasite data
-    df_hosts.to_csv(f'{OUTPUT_DIR}/Tables/Table3_Host_Parasite_Relationships.csv', index=False)
-    genus_host_counts.to_csv(f'{OUTPUT_DIR}/Tables/Table4_Genus_Host_Counts.csv', index=False)
+    save_table(df_hosts, f'{OUTPUT_DIR}/Tables/Table3_Host_Parasite_Relationships.csv', index=False)
+    save_table(genus_host_counts, f'{OUTPUT_DIR}/Tables/Table4_Genus_Host_Counts.csv', index=False)
+
+    # Structural metrics on the full host-parasite graph (not just the top 8 x 15 drawn)
+    A_hosts, host_graph_nodes = adjacency_from_edges(df_hosts['Genus'], df_hosts['Host'])
+    host_network_metrics = network_metrics(A_hosts, host_graph_nodes)
+    host_network_metrics.insert(1, 'Node_Type', np.where(
+        host_network_metrics['Node'].isin(df_hosts['Genus'].unique()), 'nematode', 'host'))
+    save_table(host_network_metrics, f'{OUTPUT_DIR}/Tables/Table7_Host_Parasite_Network_Metrics.csv', index=False)
     print(f"✓ Saved host-parasite network data")
 else:
     print("⚠ No host plant data extracted")
@@ -392,13 +419,14 @@ print("\n" + "="*70)
 print("Generating Figure 5: Geographic Distribution Analysis")
 print("="*70)
 
-# Extract country data
+PROFILE.stage('Fig5', rows_in=len(df_clean))
+
+# Extract country data: one row per listed country, canonical names
 # Use country_clean if available, otherwise use country
-country_col = 'country_clean' if 'country_clean' in df_clean.columns else 'country'
-df_countries = df_clean[df_clean[country_col].notna()].copy()
+df_countries = explode_countries(df_clean, ('country_clean', 'country'))
 
 if len(df_countries) > 0:
-    country_stats = df_countries.groupby(country_col).agg({
+    country_stats = df_countries.groupby('Country').agg({
         'Genus': 'nunique',
         'Species': 'nunique',
         'pub_year': 'count',
@@ -425,9 +453,7 @@ if len(df_countries) > 0:
     ax1.grid(axis='x', alpha=0.3)
 
     # Add value labels
-    for i, v in enumerate(country_stats['N_Publications'].values):
-        ax1.text(v + max(country_stats['N_Publications'])*0.01, i, str(int(v)),
-                va='center', ha='left', fontsize=7)
+    label_bars(ax1, y_pos, country_stats['N_Publications'])
 
     # RIGHT: Bubble chart - Efficiency vs Diversity
     top_countries = country_stats.head(20)
@@ -460,7 +486,7 @@ if len(df_countries) > 0:
     plt.close()
 
     # Save data
-    country_stats.to_csv(f'{OUTPUT_DIR}/Tables/Table5_Country_Statistics.csv', index=False)
+    save_table(country_stats, f'{OUTPUT_DIR}/Tables/Table5_Country_Statistics.csv', index=False)
     print(f"✓ Saved geographic distribution data ({len(country_stats)} countries)")
 else:
     print("⚠ No country data available")
@@ -473,6 +499,8 @@ print("\n" + "="*70)
 print("Generating Figure 6: Research Bias Analysis")
 print("="*70)
 
+PROFILE.stage('Fig6', rows_in=len(df_clean))
+
 # Calculate research bias
 genus_publications = df_clean.groupby('Genus').agg({
     'pub_year': 'count',
@@ -547,7 +575,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig6_Research_Bias_Analysis.png')
 plt.close()
 
 # Save data
-genus_publications.to_csv(f'{OUTPUT_DIR}/Tables/Table6_Research_Bias_Metrics.csv', index=False)
+save_table(genus_publications, f'{OUTPUT_DIR}/Tables/Table6_Research_Bias_Metrics.csv', index=False)
 print(f"✓ Saved research bias data ({len(genus_publications)} genera)")
 
 # Bias summary
@@ -557,6 +585,10 @@ for category in ['Overstudied', 'Adequately Studied', 'Understudied', 'Severely
     pct = 100 * count / len(genus_publications)
     print(f"  {category}: {count} genera ({pct:.1f}%)")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -574,3 +606,6 @@ print("  ✓ Fig6: Research Bias Analysis (2-panel)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("Consistent genus colors used throughout")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
@@ -13,8 +13,10 @@ Comprehensive analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -22,30 +24,41 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 from analysis_utils_improved import *
+from profiling import PROFILE
+from run_context import current_context
+from graph_analytics import adjacency_from_groups, network_metrics
+from resampling import bootstrap_group_stats, permutation_group_differences, permutation_test
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_3_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(3)
+
+# Columns this analysis reads
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species', 'title', 'authors', 'journal']
 
 print("\n" + "="*70)
 print("PART 3: CITATION & IMPACT ANALYSIS - REAL DATA")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset after filtering:")
 print(f"  Total records: {len(df_clean):,}")
@@ -61,6 +74,8 @@ print("\n" + "="*70)
 print("Generating Figure 1: Citation Distribution and Impact")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
 # Define impact categories based on percentiles
 citation_percentiles = df_clean['citations'].quantile([0.5, 0.75, 0.90, 0.95, 0.99])
 print(f"\nCitation percentiles:")
@@ -138,10 +153,10 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_Citation_Distribution_Impact.png')
 plt.close()
 
 # Save high-impact papers
-high_impact = df_clean[df_clean['citations'] >= citation_percentiles[0.95]].copy()
+high_impact = df_clean[df_clean['citations'] >= citation_percentiles[0.95]]
 high_impact_summary = high_impact[['title', 'authors', 'pub_year', 'journal',
                                    'citations', 'Genus', 'Species']].sort_values('citations', ascending=False)
-high_impact_summary.to_csv(f'{OUTPUT_DIR}/Tables/Table1_High_Impact_Papers.csv', index=False)
+save_table(high_impact_summary, f'{OUTPUT_DIR}/Tables/Table1_High_Impact_Papers.csv', index=False)
 print(f"✓ Identified {len(high_impact):,} high-impact papers (>95th percentile)")
 
 # ============================================================================
@@ -152,6 +167,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Citation Metrics by Genus")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_clean))
+
 # Calculate genus citation metrics
 genus_citations = df_clean.groupby('Genus').agg({
     'citations': ['sum', 'mean', 'median', 'count'],
@@ -162,6 +179,17 @@ genus_citations.columns = ['Genus', 'Total_Citations', 'Mean_Citations',
 genus_citations['Citations_Per_Year'] = genus_citations['Total_Citations'] / \
                                         (genus_citations['Last_Year'] - genus_citations['First_Year'] + 1)
 
+# Bootstrap CIs of the mean and permutation tests (genus vs rest) for every genus in one pass
+citation_cis = bootstrap_group_stats(df_clean['citations'], df_clean['Genus'])
+citation_tests = permutation_group_differences(df_clean['citations'], df_clean['Genus'])
+genus_citations = genus_citations.merge(
+    citation_cis[['Group', 'CI_Lower', 'CI_Upper']].rename(columns={
+        'Group': 'Genus', 'CI_Lower': 'Mean_Citations_CI_Lower', 'CI_Upper': 'Mean_Citations_CI_Upper'}),
+    on='Genus', how='left')
+genus_citations = genus_citations.merge(
+    citation_tests[['Group', 'P_Value']].rename(columns={'Group': 'Genus', 'P_Value': 'P_Value_vs_Rest'}),
+    on='Genus', how='left')
+
 # Focus on top 15 genera by total citations
 top15_cit = genus_citations.nlargest(15, 'Total_Citations')
 
@@ -173,20 +201,33 @@ colors = [get_genus_color(g) for g in top15_cit['Genus']]
 y_pos = np.arange(len(top15_cit))
 
 ax1.barh(y_pos, top15_cit['Mean_Citations'], color=colors,
+        xerr=[top15_cit['Mean_Citations'] - top15_cit['Mean_Citations_CI_Lower'],
+              top15_cit['Mean_Citations_CI_Upper'] - top15_cit['Mean_Citations']],
+        error_kw=dict(ecolor='black', elinewidth=0.8, capsize=2),
         edgecolor='black', linewidth=0.5, alpha=0.8)
 ax1.set_yticks(y_pos)
 ax1.set_yticklabels(top15_cit['Genus'], style='italic', fontsize=9)
 ax1.set_xlabel('Mean Citations per Paper', fontweight='bold')
-ax1.set_title('A. Average Citation Impact by Genus (Top 15)',
+ax1.set_title('A. Average Citation Impact by Genus (Top 15, 95% bootstrap CI)',
              fontweight='bold', loc='left')
 ax1.spines['top'].set_visible(False)
 ax1.spines['right'].set_visible(False)
 ax1.grid(axis='x', alpha=0.3)
 
-# Add value labels
-for i, v in enumerate(top15_cit['Mean_Citations']):
-    ax1.text(v + max(top15_cit['Mean_Citations'])*0.02, i, f'{v:.1f}',
-            va='center', ha='left', fontsize=7, fontweight='bold')
+# Add value labels (past the error bars)
+label_bars(ax1, y_pos, top15_cit['Mean_Citations_CI_Upper'],
+           labels=[f'{v:.1f}' for v in top15_cit['Mean_Citations']],
+           pad_fraction=0.02, fontweight='bold')
+
+# Do the two most cited genera differ in mean citations?
+lead_genera = top15_cit['Genus'].iloc[:2].tolist()
+if len(lead_genera) == 2:
+    lead_test = permutation_test(df_clean.loc[df_clean['Genus'] == lead_genera[0], 'citations'].dropna(),
+                                 df_clean.loc[df_clean['Genus'] == lead_genera[1], 'citations'].dropna())
+    x_max = top15_cit['Mean_Citations_CI_Upper'].max()
+    add_significance_bar(ax1, y_pos[0], y_pos[1], x_max * 1.12, lead_test['p_value'],
+                         height=x_max * 0.03, orientation='horizontal')
+    ax1.set_xlim(right=x_max * 1.25)
 
 # RIGHT: Total citations vs number of papers (bubble chart)
 ax2.scatter(top15_cit['N_Papers'], top15_cit['Total_Citations'],
@@ -213,7 +254,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Citation_Metrics_by_Genus.png')
 plt.close()
 
 # Save data
-genus_citations.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Genus_Citation_Metrics.csv', index=False)
+save_table(genus_citations, f'{OUTPUT_DIR}/Tables/Table2_Genus_Citation_Metrics.csv', index=False)
 print(f"✓ Saved citation metrics for {len(genus_citations)} genera")
 
 # ============================================================================
@@ -224,6 +265,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: Temporal Citation Patterns")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_clean))
+
 # Calculate mean citations by year for top 8 genera
 top8_genera = genus_citations.nlargest(8, 'Total_Citations')['Genus'].tolist()
 
@@ -266,8 +309,10 @@ print("\n" + "="*70)
 print("Generating Figure 4: Author Productivity Analysis")
 print("="*70)
 
+PROFILE.stage('Fig4', rows_in=len(df_clean))
+
 # Parse author data
-df_with_authors = df_clean[df_clean['authors'].notna()].copy()
+df_with_authors = df_clean[df_clean['authors'].notna()]
 
 # Extract first author (simple approach)
 author_records = []
@@ -355,7 +400,16 @@ if len(df_authors) > 0:
     plt.close()
 
     # Save data
-    author_metrics.to_csv(f'{OUTPUT_DIR}/Tables/Table3_Author_Metrics.csv', index=False)
+    save_table(author_metrics, f'{OUTPUT_DIR}/Tables/Table3_Author_Metrics.csv', index=False)
+
+    # Co-authorship network over all listed authors, one link per shared paper
+    # (one row per publication, not per genus mention)
+    author_papers = one_row_per_publication(df_with_authors, DATA_FILE)
+    coauthors = author_papers['authors'].astype(str).str.split(';').explode().str.strip()
+    coauthors = coauthors[coauthors.str.len() > 2]
+    A_coauthors, coauthor_nodes = adjacency_from_groups(coauthors.index, coauthors.values)
+    coauthor_metrics = network_metrics(A_coauthors, coauthor_nodes).rename(columns={'Node': 'Author'})
+    save_table(coauthor_metrics, f'{OUTPUT_DIR}/Tables/Table5_Coauthor_Network_Metrics.csv', index=False)
     print(f"✓ Analyzed {len(author_metrics):,} unique first authors")
 else:
     print("⚠ No author data available")
@@ -368,7 +422,9 @@ print("\n" + "="*70)
 print("Generating Figure 5: Journal Impact Analysis")
 print("="*70)
 
-df_with_journal = df_clean[df_clean['journal'].notna()].copy()
+PROFILE.stage('Fig5', rows_in=len(df_clean))
+
+df_with_journal = df_clean[df_clean['journal'].notna()]
 
 if len(df_with_journal) > 0:
     # Calculate journal metrics
@@ -421,11 +477,15 @@ if len(df_with_journal) > 0:
     plt.close()
 
     # Save data
-    journal_metrics.to_csv(f'{OUTPUT_DIR}/Tables/Table4_Journal_Metrics.csv', index=False)
+    save_table(journal_metrics, f'{OUTPUT_DIR}/Tables/Table4_Journal_Metrics.csv', index=False)
     print(f"✓ Analyzed {len(journal_metrics):,} unique journals")
 else:
     print("⚠ No journal data available")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -442,3 +502,6 @@ print("  ✓ Fig5: Journal Impact Analysis (bubble chart)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("Consistent genus colors used throughout")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
@@ -3,8 +3,10 @@ PART 3: Citation & Impact Analysis - REAL DATA (Simplified)
 Note: CSV lacks author/journal columns, so focusing on citation metrics only
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -12,9 +14,16 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 from analysis_utils_improved import *
+from run_context import current_context
 
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_3_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(3)
+
+# Columns this analysis reads
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species', 'title', 'journal']
 
 print("\n" + "="*70)
 print("PART 3: CITATION & IMPACT ANALYSIS - REAL DATA")
@@ -22,17 +31,17 @@ print("="*70 + "\n")
 
 # Load CSV data
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+del df
 
 print(f"\nDataset after filtering:")
 print(f"  Total records: {len(df_clean):,}")
@@ -106,9 +115,9 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_Citation_Distribution_Impact.png')
 plt.close()
 
 # Save high-impact papers
-high_impact = df_clean[df_clean['citations'] >= citation_percentiles[0.95]].copy()
+high_impact = df_clean[df_clean['citations'] >= citation_percentiles[0.95]]
 high_impact_summary = high_impact[['title', 'pub_year', 'journal', 'citations', 'Genus', 'Species']].sort_values('citations', ascending=False)
-high_impact_summary.to_csv(f'{OUTPUT_DIR}/Tables/Table1_High_Impact_Papers.csv', index=False)
+save_table(high_impact_summary, f'{OUTPUT_DIR}/Tables/Table1_High_Impact_Papers.csv', index=False)
 print(f"✓ Identified {len(high_impact):,} high-impact papers (>95th percentile)")
 
 # ============================================================================
@@ -169,7 +178,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Citation_Metrics_by_Genus.png')
 plt.close()
 
 # Save data
-genus_citations.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Genus_Citation_Metrics.csv', index=False)
+save_table(genus_citations, f'{OUTPUT_DIR}/Tables/Table2_Genus_Citation_Metrics.csv', index=False)
 print(f"✓ Saved citation metrics for {len(genus_citations)} genera")
 
 # ============================================================================
@@ -211,6 +220,9 @@ plt.close()
 
 print("✓ Saved temporal citation patterns")
 
+# Wait for queued tables and figures to reach disk
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -10,8 +10,10 @@ Focused analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -19,31 +21,42 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import networkx as nx
 from analysis_utils_improved import *
-import re
+from profiling import PROFILE
+from run_context import current_context
+from network_layout import compute_layout
+from graph_analytics import adjacency_from_edges, network_metrics
+from countries import REGIONS, collaboration_pairs, country_regions, explode_countries
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_5_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(5)
+
+# Columns this analysis reads
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species', 'country', 'org_country']
 
 print("\n" + "="*70)
 print("PART 5: GEOGRAPHIC & COLLABORATION ANALYSIS - REAL DATA")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset after filtering: {len(df_clean):,} records")
 
@@ -55,12 +68,15 @@ print("\n" + "="*70)
 print("Generating Figure 1: Global Research Distribution")
 print("="*70)
 
-# Use org_country if available, otherwise country
-country_col = 'org_country' if 'org_country' in df_clean.columns else 'country'
-df_countries = df_clean[df_clean[country_col].notna()].copy()
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
+# Use org_country if available, otherwise country; one row per listed
+# country, canonical names
+COUNTRY_COLUMNS = ('org_country', 'country')
+df_countries = explode_countries(df_clean, COUNTRY_COLUMNS)
 
 if len(df_countries) > 0:
-    country_stats = df_countries.groupby(country_col).agg({
+    country_stats = df_countries.groupby('Country').agg({
         'Genus': 'nunique',
         'Species': 'nunique',
         'pub_year': 'count',
@@ -114,7 +130,7 @@ if len(df_countries) > 0:
     plt.close()
 
     # Save data
-    country_stats.to_csv(f'{OUTPUT_DIR}/Tables/Table1_Country_Statistics.csv', index=False)
+    save_table(country_stats, f'{OUTPUT_DIR}/Tables/Table1_Country_Statistics.csv', index=False)
     print(f"✓ Analyzed {len(country_stats)} countries")
 
 # ============================================================================
@@ -125,29 +141,14 @@ print("\n" + "="*70)
 print("Generating Figure 2: International Collaboration Network")
 print("="*70)
 
-# Extract multi-country papers
-# Parse country field to find collaborations
-collaboration_pairs = []
-
-for _, row in df_countries.iterrows():
-    countries_str = str(row[country_col])
-    # Split by common separators
-    countries = re.split(r'[;,|]', countries_str)
-    countries = [c.strip() for c in countries if c.strip() and c.strip() != 'nan']
-
-    # Create pairs for multi-country papers
-    if len(countries) > 1:
-        countries = list(set(countries))[:5]  # Max 5 countries per paper
-        for i in range(len(countries)):
-            for j in range(i+1, len(countries)):
-                collaboration_pairs.append({
-                    'Country1': countries[i],
-                    'Country2': countries[j],
-                    'Year': row['pub_year']
-                })
-
-if len(collaboration_pairs) > 0:
-    df_collab = pd.DataFrame(collaboration_pairs)
+PROFILE.stage('Fig2', rows_in=len(df_clean))
+
+# Extract multi-country papers: country pairs of each paper
+# (max 5 countries per paper)
+df_collab = collaboration_pairs(df_clean, COUNTRY_COLUMNS, max_countries=5)
+df_collab['Year'] = df_clean.loc[df_collab.index, 'pub_year'].to_numpy()
+
+if len(df_collab) > 0:
 
     # Count collaboration frequency
     collab_counts = df_collab.groupby(['Country1', 'Country2']).size().reset_index(name='Count')
@@ -175,7 +176,8 @@ if len(collaboration_pairs) > 0:
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
 
     # LEFT: Network visualization
-    pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
+    pos = compute_layout(G, k=2, iterations=50, seed=42,
+                         name='Fig2_Collaboration_Network', cache_dir=f'{OUTPUT_DIR}/Layouts')
 
     # Node sizes based on degree
     node_sizes = [300 * G.degree(n) for n in G.nodes()]
@@ -223,7 +225,12 @@ if len(collaboration_pairs) > 0:
     plt.close()
 
     # Save data
-    collab_counts.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Collaboration_Pairs.csv', index=False)
+    save_table(collab_counts, f'{OUTPUT_DIR}/Tables/Table2_Collaboration_Pairs.csv', index=False)
+
+    # Structural metrics on the full collaboration graph (all pairs, no count filter)
+    A_collab, collab_nodes = adjacency_from_edges(df_collab['Country1'], df_collab['Country2'])
+    collab_metrics = network_metrics(A_collab, collab_nodes).rename(columns={'Node': 'Country'})
+    save_table(collab_metrics, f'{OUTPUT_DIR}/Tables/Table3_Collaboration_Network_Metrics.csv', index=False)
     print(f"✓ Identified {len(collab_counts):,} collaboration pairs")
 else:
     print("⚠ No collaboration data found")
@@ -236,32 +243,14 @@ print("\n" + "="*70)
 print("Generating Figure 3: Regional Research Trends")
 print("="*70)
 
-# Define regions
-regions = {
-    'North America': ['USA', 'United States', 'Canada', 'Mexico'],
-    'Europe': ['UK', 'United Kingdom', 'Germany', 'France', 'Italy', 'Spain',
-              'Netherlands', 'Belgium', 'Poland', 'Sweden', 'Denmark'],
-    'Asia': ['China', 'Japan', 'India', 'Korea', 'South Korea', 'Thailand',
-            'Vietnam', 'Taiwan', 'Pakistan', 'Iran'],
-    'South America': ['Brazil', 'Argentina', 'Chile', 'Colombia'],
-    'Africa': ['Egypt', 'South Africa', 'Kenya', 'Nigeria'],
-    'Oceania': ['Australia', 'New Zealand']
-}
-
-# Assign regions
-def assign_region(country):
-    if pd.isna(country):
-        return 'Unknown'
-    country_str = str(country)
-    for region, countries in regions.items():
-        if any(c.lower() in country_str.lower() for c in countries):
-            return region
-    return 'Other'
+PROFILE.stage('Fig3', rows_in=len(df_clean))
 
-df_countries['Region'] = df_countries[country_col].apply(assign_region)
+# Assign regions: a paper counts once for each region among its countries
+df_countries['Region'] = country_regions(df_countries['Country']).array
+df_regions = df_countries[~df_countries.set_index('Region', append=True).index.duplicated()]
 
 # Calculate publications by region and year
-region_trends = df_countries.groupby(['pub_year', 'Region']).size().reset_index(name='Count')
+region_trends = df_regions.groupby(['pub_year', 'Region'], observed=True).size().reset_index(name='Count')
 
 # Create figure
 fig, ax = plt.subplots(figsize=(12, 7))
@@ -275,7 +264,7 @@ region_colors = {
     'Oceania': '#8c564b'
 }
 
-for region in ['North America', 'Europe', 'Asia', 'South America', 'Oceania', 'Africa']:
+for region in REGIONS:
     region_data = region_trends[region_trends['Region'] == region]
     if len(region_data) > 0:
         region_data = region_data.sort_values('pub_year')
@@ -301,6 +290,10 @@ plt.close()
 
 print("✓ Analyzed regional research trends")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -314,3 +307,6 @@ print("  ✓ Fig2: International Collaboration Network (2-panel)")
 print("  ✓ Fig3: Regional Research Trends (line plot)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
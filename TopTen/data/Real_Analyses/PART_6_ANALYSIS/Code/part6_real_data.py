@@ -10,38 +10,49 @@ Focused analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from analysis_utils_improved import *
+from profiling import PROFILE
+from run_context import current_context
 import re
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_6_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(6)
+
+# Columns this analysis reads (abstracts are read at the text stage)
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species']
 
 print("\n" + "="*70)
 print("PART 6: ECONOMIC & AGRICULTURAL IMPACT ANALYSIS - REAL DATA")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset: {len(df_clean):,} records")
 
@@ -53,8 +64,10 @@ print("\n" + "="*70)
 print("Generating Figure 1: Major Crop-Nematode Associations")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
 # Extract crop mentions from abstracts
-df_with_abstract = df_clean[df_clean['abstract'].notna()].copy()
+df_with_abstract = with_text_column(df_clean, DATA_FILE, 'abstract')
 
 # Define major economic crops
 major_crops = {
@@ -73,21 +86,22 @@ major_crops = {
 }
 
 # Extract crop-genus associations
-crop_genus_assoc = []
-
-for _, row in df_with_abstract.iterrows():
-    abstract = str(row['abstract']).lower()
-    genus = row['Genus']
-
-    for crop, keywords in major_crops.items():
-        if any(kw in abstract for kw in keywords):
-            crop_genus_assoc.append({
-                'Crop': crop,
-                'Genus': genus,
-                'Year': row['pub_year']
-            })
-
-df_crop_genus = pd.DataFrame(crop_genus_assoc)
+def crops_mentioned(abstract):
+    abstract = str(abstract).lower()
+    return [crop for crop, keywords in major_crops.items()
+            if any(kw in abstract for kw in keywords)]
+
+# Worker processes read the abstracts straight from the memory-mapped text store
+abstracts = load_text_column(DATA_FILE, 'abstract')
+crops = pd.Series(abstracts.map(crops_mentioned, rows=df_with_abstract.index),
+                  index=df_with_abstract.index).explode().dropna()
+crop_rows = df_with_abstract.loc[crops.index]
+
+df_crop_genus = pd.DataFrame({
+    'Crop': crops.to_numpy(),
+    'Genus': crop_rows['Genus'].to_numpy(),
+    'Year': crop_rows['pub_year'].to_numpy()
+})
 
 if len(df_crop_genus) > 0:
     # Count associations
@@ -143,7 +157,7 @@ if len(df_crop_genus) > 0:
     plt.close()
 
     # Save data
-    assoc_counts.to_csv(f'{OUTPUT_DIR}/Tables/Table1_Crop_Genus_Associations.csv', index=False)
+    save_table(assoc_counts, f'{OUTPUT_DIR}/Tables/Table1_Crop_Genus_Associations.csv', index=False)
     print(f"✓ Identified {len(assoc_counts)} crop-genus associations")
 
 # ============================================================================
@@ -154,6 +168,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Economic Impact Research Trends")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_with_abstract))
+
 # Define economic keywords
 economic_keywords = {
     'Yield Loss': ['yield loss', 'yield reduction', 'crop loss'],
@@ -162,11 +178,14 @@ economic_keywords = {
     'Resistance': ['resistance', 'resistant cultivar', 'resistant variety']
 }
 
+# Theme trends count each publication once, not once per genus it mentions
+df_publications = one_row_per_publication(df_with_abstract, DATA_FILE)
+
 # Count keyword mentions over time
 economic_trends = []
 
 for year in range(1980, 2024):
-    year_data = df_with_abstract[df_with_abstract['pub_year'] == year]
+    year_data = df_publications[df_publications['pub_year'] == year]
     if len(year_data) > 0:
         year_abstracts = ' '.join(year_data['abstract'].astype(str).str.lower().values)
 
@@ -241,7 +260,7 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Economic_Impact_Trends.png')
 plt.close()
 
 # Save data
-df_economic.to_csv(f'{OUTPUT_DIR}/Tables/Table2_Economic_Theme_Trends.csv', index=False)
+save_table(df_economic, f'{OUTPUT_DIR}/Tables/Table2_Economic_Theme_Trends.csv', index=False)
 print("✓ Analyzed economic impact research trends")
 
 # ============================================================================
@@ -252,6 +271,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: Climate & Environmental Research")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_with_abstract))
+
 # Define climate/environmental keywords
 climate_keywords = ['climate change', 'global warming', 'temperature', 'drought',
                    'rainfall', 'precipitation', 'soil moisture', 'soil temperature']
@@ -264,7 +285,7 @@ climate_counts = []
 env_counts = []
 
 for year in range(1990, 2024):
-    year_abstracts = df_with_abstract[df_with_abstract['pub_year'] == year]['abstract'].astype(str).str.lower()
+    year_abstracts = df_publications[df_publications['pub_year'] == year]['abstract'].astype(str).str.lower()
 
     if len(year_abstracts) > 0:
         all_abstracts = ' '.join(year_abstracts.values)
@@ -311,9 +332,13 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig3_Climate_Environmental_Trends.png')
 plt.close()
 
 # Save data
-df_climate.to_csv(f'{OUTPUT_DIR}/Tables/Table3_Climate_Env_Trends.csv', index=False)
+save_table(df_climate, f'{OUTPUT_DIR}/Tables/Table3_Climate_Env_Trends.csv', index=False)
 print("✓ Analyzed climate and environmental research trends")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -327,3 +352,6 @@ print("  ✓ Fig2: Economic Impact Research Trends (2-panel)")
 print("  ✓ Fig3: Climate & Environmental Research (line plot)")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
@@ -10,8 +10,10 @@ Focused analysis including:
 Each figure is professionally designed for Nature publication
 """
 
+import os
 import sys
-sys.path.append('/home/user/DataAnalyz/TopTen/data/Real_Analyses')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
 
 import pandas as pd
 import numpy as np
@@ -22,30 +24,39 @@ from sklearn.decomposition import PCA
 from sklearn.cluster import KMeans
 from scipy.cluster.hierarchy import dendrogram, linkage
 from analysis_utils_improved import *
+from profiling import PROFILE
+from run_context import current_context
 
-# Configuration
-DATA_FILE = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/ALL_NEMATODES_EXTRACTED.csv'
-OUTPUT_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses/PART_7_ANALYSIS'
+# Configuration: dataset and output root come from the run context
+# (run_context.py); without one, the track's dataset and directory
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
+OUTPUT_DIR = CONTEXT.part_dir(7)
+
+# Columns this analysis reads
+ANALYSIS_COLUMNS = ['pub_year', 'citations', 'Genus', 'Species']
 
 print("\n" + "="*70)
 print("PART 7: ADVANCED STATISTICAL ANALYSIS - REAL DATA")
 print("="*70 + "\n")
 
 # Load data
+PROFILE.stage('Load')
 print("Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = load_mention_table(DATA_FILE, columns=ANALYSIS_COLUMNS)
 print(f"✓ Loaded {len(df):,} records")
 
 # CSV already has correct column names
 
 # Basic cleaning
 df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
-df = df.dropna(subset=['pub_year'])
-df['pub_year'] = df['pub_year'].astype(int)
 df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
 
-# Apply filters
-df_clean = apply_analysis_filters(df)
+# Apply filters (rows without a year are dropped in the same selection)
+df_clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=DATA_FILE)
+df_clean['pub_year'] = df_clean['pub_year'].astype(int)
+PROFILE.rows_out(len(df_clean))
+del df
 
 print(f"\nDataset: {len(df_clean):,} records")
 
@@ -79,6 +90,8 @@ print("\n" + "="*70)
 print("Generating Figure 1: Principal Component Analysis")
 print("="*70)
 
+PROFILE.stage('Fig1', rows_in=len(df_clean))
+
 # Select features for PCA
 features_for_pca = ['N_Species', 'N_Papers', 'Mean_Cit', 'Years_Span', 'Papers_Per_Year']
 X = genus_features[features_for_pca].fillna(0)
@@ -171,8 +184,8 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig1_PCA_Analysis.png')
 plt.close()
 
 # Save PCA results
-genus_features[['Genus', 'PC1', 'PC2', 'Cluster']].to_csv(
-    f'{OUTPUT_DIR}/Tables/Table1_PCA_Results.csv', index=False)
+save_table(genus_features[['Genus', 'PC1', 'PC2', 'Cluster']],
+           f'{OUTPUT_DIR}/Tables/Table1_PCA_Results.csv', index=False)
 print("✓ Saved PCA results")
 
 # ============================================================================
@@ -183,6 +196,8 @@ print("\n" + "="*70)
 print("Generating Figure 2: Hierarchical Clustering Analysis")
 print("="*70)
 
+PROFILE.stage('Fig2', rows_in=len(df_clean))
+
 # Perform hierarchical clustering
 linkage_matrix = linkage(X_scaled, method='ward')
 
@@ -231,8 +246,8 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig2_Clustering_Analysis.png')
 plt.close()
 
 # Save cluster assignments
-genus_features[['Genus', 'Cluster', 'N_Papers', 'N_Species', 'Mean_Cit']].to_csv(
-    f'{OUTPUT_DIR}/Tables/Table2_Cluster_Assignments.csv', index=False)
+save_table(genus_features[['Genus', 'Cluster', 'N_Papers', 'N_Species', 'Mean_Cit']],
+           f'{OUTPUT_DIR}/Tables/Table2_Cluster_Assignments.csv', index=False)
 print(f"✓ Identified {kmeans.n_clusters} research clusters")
 
 # ============================================================================
@@ -243,6 +258,8 @@ print("\n" + "="*70)
 print("Generating Figure 3: Feature Correlation Matrix")
 print("="*70)
 
+PROFILE.stage('Fig3', rows_in=len(df_clean))
+
 # Calculate correlation matrix
 correlation_features = ['N_Species', 'N_Papers', 'Mean_Cit', 'Years_Span',
                        'Papers_Per_Year', 'Citations_Per_Paper']
@@ -274,9 +291,13 @@ save_figure(fig, f'{OUTPUT_DIR}/Charts/Fig3_Correlation_Matrix.png')
 plt.close()
 
 # Save correlation matrix
-corr_matrix.to_csv(f'{OUTPUT_DIR}/Tables/Table3_Correlation_Matrix.csv')
+save_table(corr_matrix, f'{OUTPUT_DIR}/Tables/Table3_Correlation_Matrix.csv')
 print("✓ Computed and saved correlation matrix")
 
+# Wait for queued tables and figures to reach disk
+PROFILE.stage('Flush outputs')
+flush_outputs()
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -293,3 +314,6 @@ print(f"  • PCA: {pca.explained_variance_ratio_[0]*100:.1f}% + {pca.explained_
 print(f"  • K-means: {kmeans.n_clusters} distinct research clusters identified")
 print("\nAll figures saved in Nature-quality format (600 DPI)")
 print("="*70 + "\n")
+
+# Where the run time went (see profiling.py)
+PROFILE.write(OUTPUT_DIR)
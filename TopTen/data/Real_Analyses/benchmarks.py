@@ -0,0 +1,450 @@
+"""
+Benchmark Suite
+Offline timings of the hot paths of the analyses at several corpus sizes
+
+Every benchmark times one function of analysis_utils_improved (or of the
+shared modules), or one computation that the part scripts run inline.
+The inline ones are kernels below that copy the script code; keep them in
+step with the scripts. Inputs are synthetic corpora (see
+synthetic_corpus.py) of the requested sizes, generated once per size and
+seed and kept under Benchmarks/corpora.
+
+For each benchmark and size the suite records the best and median wall
+time and the best CPU time over --repeat runs. Each benchmark is called
+once untimed first, so cached state (the mention cache, validity bitmaps)
+is built before timing and the numbers are warm-run numbers. Benchmarks
+that read the mention cache are also timed cold: before each of those
+runs their cached state is dropped (untimed), so CSV parsing and bitmap
+and publication id building are measured too. From the sizes it fits a
+scaling exponent b (time ~ n^b, least squares on log-log), for the warm
+and the cold times. A size is skipped when the exponent so far predicts
+more than --max-seconds for it.
+
+`compare` reads two result files, reports the median-time ratio for every
+benchmark and size they share (with the same input size n), warm and
+cold, and exits with status 1 when any ratio exceeds 1 + threshold.
+
+Usage:
+    python benchmarks.py run [--sizes 10k 30k 100k] [--repeat 3] [--only NAME ...]
+                             [--output FILE] [--baseline]
+    python benchmarks.py compare [BASELINE] [CURRENT] [--threshold 0.2]
+    python benchmarks.py list
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from analysis_utils_improved import (load_and_prepare_data, apply_analysis_filters,
+                                     standardize_countries, extract_host_plants_improved,
+                                     detect_trend_change_points, save_figure, flush_outputs)
+from countries import collaboration_pairs
+from mention_store import PUB_IDS_FILE, PUB_INDEX_FILE, cache_dir_for
+from synthetic_corpus import generate_corpus, parse_size
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Benchmarks')
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpora')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+DEFAULT_SIZES = ['10k', '30k', '100k']
+DEFAULT_THRESHOLD = 0.2
+
+# ============================================================================
+# CORPORA
+# ============================================================================
+
+class Corpus:
+    """A synthetic corpus of `rows` mention rows and the frames the benchmarks share"""
+
+    def __init__(self, rows, seed):
+        self.rows = rows
+        self.path = os.path.join(CORPUS_DIR, f'synthetic_{rows}_{seed}.csv')
+        if not os.path.exists(self.path):
+            os.makedirs(CORPUS_DIR, exist_ok=True)
+            generate_corpus(self.path, rows, seed)
+        self._table = None
+        self._clean = None
+
+    @property
+    def table(self):
+        """Full table with numeric year and citations"""
+        if self._table is None:
+            df = pd.read_csv(self.path, low_memory=False)
+            df['pub_year'] = pd.to_numeric(df['pub_year'], errors='coerce')
+            df['citations'] = pd.to_numeric(df['citations'], errors='coerce').fillna(0)
+            self._table = df
+        return self._table
+
+    @property
+    def clean(self):
+        """Filtered table, as the part scripts have it after loading"""
+        if self._clean is None:
+            df = self.table
+            with contextlib.redirect_stdout(io.StringIO()):
+                clean = apply_analysis_filters(df, keep=df['pub_year'].notna(), source=self.path)
+            self._clean = clean.assign(pub_year=clean['pub_year'].astype(int))
+        return self._clean
+
+    @property
+    def publications(self):
+        """One row per publication with an abstract (Part 4 and Part 6 inputs)"""
+        clean = self.clean
+        return clean[clean['abstract'].notna()].drop_duplicates('title')
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """
+    Register a benchmark: the decorated function takes a Corpus and
+    returns (n, run), the input size and a zero-argument callable to time,
+    or (n, run, reset) for a benchmark also timed cold, reset being called
+    untimed before each cold run
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def drop_cache(source, derived_only=False):
+    """
+    Remove the mention cache of source; with derived_only, keep the cached
+    columns and remove what is built from them (validity bitmaps,
+    publication ids)
+    """
+    cache_dir = cache_dir_for(source)
+    if not derived_only:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.startswith('validity-') or name in (PUB_IDS_FILE, PUB_INDEX_FILE):
+                os.remove(os.path.join(cache_dir, name))
+
+@benchmark('load_and_prepare_data')
+def _load_and_prepare(corpus):
+    columns = ['pub_year', 'citations', 'Genus', 'Species', 'country', 'publication_date']
+    return (corpus.rows, lambda: load_and_prepare_data(corpus.path, columns=columns),
+            lambda: drop_cache(corpus.path))
+
+@benchmark('apply_analysis_filters')
+def _filters(corpus):
+    df = corpus.table
+    keep = df['pub_year'].notna()
+    return (len(df), lambda: apply_analysis_filters(df, keep=keep, source=corpus.path),
+            lambda: drop_cache(corpus.path, derived_only=True))
+
+@benchmark('standardize_countries')
+def _countries(corpus):
+    df = corpus.table[['country', 'factorials']]
+    return len(df), lambda: standardize_countries(df)
+
+@benchmark('extract_host_plants_improved')
+def _host_plants(corpus):
+    abstracts = corpus.clean['abstract'].dropna()
+    return len(abstracts), lambda: abstracts.map(extract_host_plants_improved)
+
+@benchmark('detect_trend_change_points')
+def _change_points(corpus):
+    # Publication counts in n equal time bins (n grows with the corpus)
+    n = max(20, corpus.rows // 100)
+    values, edges = np.histogram(corpus.clean['pub_year'] + corpus.clean.index % 12 / 12, bins=n)
+    years = edges[:-1]
+    return n, lambda: detect_trend_change_points(years, values.astype(float))
+
+def clean_abstract(text):
+    """Part 4 abstract cleaning"""
+    if pd.isna(text):
+        return ""
+    text = str(text).lower()
+    text = re.sub(r'[^a-z0-9\s]', ' ', text)
+    return ' '.join(text.split())
+
+@benchmark('tfidf_fit')
+def _tfidf(corpus):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    abstracts = corpus.publications['abstract'].map(clean_abstract)
+
+    def run():
+        # Part 4 Figure 1
+        tfidf = TfidfVectorizer(max_features=50, stop_words='english',
+                                ngram_range=(1, 2), min_df=10, max_df=0.7)
+        tfidf.fit_transform(abstracts).sum(axis=0)
+    return len(abstracts), run
+
+PART4_THEMES = {
+    'Molecular/Genetics': ['gene', 'genetic', 'molecular', 'dna', 'rna', 'genome', 'sequence'],
+    'Plant Pathology': ['pathogen', 'disease', 'infection', 'resistance', 'susceptible', 'pathogenicity'],
+    'Management/Control': ['control', 'management', 'nematicide', 'resistant', 'biocontrol', 'integrated'],
+    'Ecology/Biology': ['population', 'ecology', 'distribution', 'diversity', 'biology', 'life cycle'],
+    'Crop Impact': ['yield', 'damage', 'loss', 'crop', 'production', 'economic'],
+    'Diagnostics': ['identification', 'detection', 'diagnosis', 'morphology', 'taxonomy', 'species']
+}
+
+@benchmark('theme_year_loop')
+def _theme_loop(corpus):
+    df_with_abstract = corpus.publications.assign(
+        abstract_clean=corpus.publications['abstract'].map(clean_abstract))
+
+    def run():
+        # Part 4 Figure 2
+        theme_trends = []
+        for year in range(1980, 2024):
+            year_data = df_with_abstract[df_with_abstract['pub_year'] == year]
+            if len(year_data) > 0:
+                year_abstracts = ' '.join(year_data['abstract_clean'].values)
+                for theme, keywords in PART4_THEMES.items():
+                    count = sum(year_abstracts.count(kw) for kw in keywords)
+                    theme_trends.append({'Year': year, 'Theme': theme,
+                                         'Normalized_Count': count / len(year_data)})
+        return pd.DataFrame(theme_trends)
+    return len(df_with_abstract), run
+
+@benchmark('h_index_loop')
+def _h_index(corpus):
+    df_with_authors = corpus.clean[corpus.clean['authors'].notna()]
+
+    def run():
+        # Part 3 Figure 4
+        author_records = []
+        for idx, row in df_with_authors.iterrows():
+            first_author = str(row['authors']).split(';')[0].strip()
+            if first_author and len(first_author) > 2:
+                author_records.append({'Author': first_author, 'Genus': row['Genus'],
+                                       'Citations': row['citations'], 'Year': row['pub_year']})
+        df_authors = pd.DataFrame(author_records)
+        h_indices = []
+        for author in df_authors['Author'].unique():
+            author_cits = df_authors[df_authors['Author'] == author]['Citations'].sort_values(ascending=False).values
+            h = 0
+            for i, cit in enumerate(author_cits, 1):
+                if cit >= i:
+                    h = i
+                else:
+                    break
+            h_indices.append(h)
+        return h_indices
+    return len(df_with_authors), run
+
+@benchmark('collaboration_pairs')
+def _collaborations(corpus):
+    df = corpus.clean
+    # Part 5 Figure 2
+    return len(df), lambda: collaboration_pairs(df, ('org_country', 'country'), max_countries=5)
+
+@benchmark('figure_rendering')
+def _figure(corpus):
+    import matplotlib.pyplot as plt
+    df = corpus.clean
+    output = os.path.join(tempfile.gettempdir(), 'dataanalyz_benchmark.png')
+
+    def run():
+        # Two-panel figure of the parts' usual shape: a per-genus bar chart
+        # and a scatter of every row, rasterized, encoded and written
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+        counts = df['Genus'].value_counts().head(25)
+        ax1.barh(np.arange(len(counts)), counts.to_numpy(), edgecolor='black', linewidth=0.5)
+        ax1.set_yticks(np.arange(len(counts)))
+        ax1.set_yticklabels(counts.index, fontsize=8)
+        ax2.scatter(df['pub_year'], np.log1p(df['citations']), s=4, alpha=0.4)
+        plt.tight_layout()
+        save_figure(fig, output)
+        plt.close(fig)
+        flush_outputs()
+    return len(df), run
+
+# ============================================================================
+# RUNNING
+# ============================================================================
+
+def time_call(run, repeat, reset=None):
+    """
+    (best wall, median wall, best CPU) seconds over `repeat` calls after one
+    warm-up call; with `reset`, cold timings instead: reset is called
+    untimed before every call and there is no warm-up
+    """
+    walls, cpus = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        if reset is None:
+            run()
+        for _ in range(repeat):
+            if reset is not None:
+                reset()
+            wall, cpu = time.perf_counter(), time.process_time()
+            run()
+            walls.append(time.perf_counter() - wall)
+            cpus.append(time.process_time() - cpu)
+    return min(walls), float(np.median(walls)), min(cpus)
+
+def scaling_exponent(ns, seconds):
+    """Least-squares slope of log(time) on log(n); None with fewer than two sizes"""
+    ns, seconds = np.asarray(ns, dtype=float), np.asarray(seconds, dtype=float)
+    usable = (ns > 0) & (seconds > 0)
+    if usable.sum() < 2 or len(np.unique(ns[usable])) < 2:
+        return None
+    return float(np.polyfit(np.log(ns[usable]), np.log(seconds[usable]), 1)[0])
+
+def run_suite(sizes, names=None, repeat=3, seed=42, max_seconds=120.0):
+    """Results dict (see module docstring) for the given corpus sizes"""
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark(s): {', '.join(unknown)} (see `benchmarks.py list`)")
+    results = {name: {} for name in names}
+    for rows in sorted(sizes):
+        print(f"\nCorpus: {rows:,} rows")
+        corpus = Corpus(rows, seed)
+        for name in names:
+            done = results[name]
+            # The slower (cold) times decide whether a size is still affordable
+            slowest = [r.get('cold_wall_median', r['wall_median']) for r in done.values()]
+            exponent = scaling_exponent([r['n'] for r in done.values()], slowest) or 1.0
+            if done:
+                last = done[max(done, key=int)]
+                predicted = (last.get('cold_wall_median', last['wall_median'])
+                             * (rows / int(max(done, key=int))) ** exponent)
+                if predicted > max_seconds:
+                    print(f"  {name:<30} skipped (predicted {predicted:,.0f}s)")
+                    continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                n, run, *reset = BENCHMARKS[name](corpus)
+            best, median, cpu = time_call(run, repeat)
+            result = {'n': int(n), 'wall_min': best, 'wall_median': median,
+                      'cpu_min': cpu, 'repeat': repeat}
+            print(f"  {name:<30} n={n:>9,}  median {median:>9.4f}s  best {best:>9.4f}s")
+            if reset:
+                best, median, cpu = time_call(run, repeat, reset=reset[0])
+                result.update(cold_wall_min=best, cold_wall_median=median, cold_cpu_min=cpu)
+                print(f"  {name + ' (cold)':<30} n={n:>9,}  median {median:>9.4f}s  best {best:>9.4f}s")
+            done[str(rows)] = result
+
+    scaling = {name: scaling_exponent([r['n'] for r in runs.values()],
+                                      [r['wall_median'] for r in runs.values()])
+               for name, runs in results.items()}
+    scaling_cold = {name: scaling_exponent([r['n'] for r in runs.values()],
+                                           [r['cold_wall_median'] for r in runs.values()])
+                    for name, runs in results.items()
+                    if runs and all('cold_wall_median' in r for r in runs.values())}
+    return {'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'seed': seed, 'sizes': sorted(sizes),
+            'results': results, 'scaling': scaling, 'scaling_cold': scaling_cold}
+
+def print_scaling(report):
+    def fmt(exponent):
+        return 'n/a' if exponent is None else f'{exponent:.2f}'
+
+    cold = report.get('scaling_cold', {})
+    print("\nScaling exponents (time ~ n^b):")
+    print(f"  {'':<30} {'warm':>6} {'cold':>6}")
+    for name, exponent in report['scaling'].items():
+        print(f"  {name:<30} {fmt(exponent):>6} {fmt(cold[name]) if name in cold else '':>6}")
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Comparison table of the benchmarks and sizes both reports hold"""
+    rows = []
+    for name, runs in current['results'].items():
+        for size, result in runs.items():
+            base = baseline['results'].get(name, {}).get(size)
+            if base is None or base['n'] != result['n']:
+                continue
+            for label, key in ((name, 'wall_median'), (f'{name} (cold)', 'cold_wall_median')):
+                if key not in result or key not in base:
+                    continue
+                ratio = result[key] / base[key] if base[key] else np.nan
+                rows.append({'Benchmark': label, 'Rows': int(size), 'Baseline_s': base[key],
+                             'Current_s': result[key], 'Ratio': ratio,
+                             'Regression': bool(ratio > 1 + threshold)})
+    return pd.DataFrame(rows, columns=['Benchmark', 'Rows', 'Baseline_s', 'Current_s',
+                                       'Ratio', 'Regression'])
+
+def _read_report(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+def _write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the analyses')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='time the benchmarks')
+    run.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help='corpus sizes in rows')
+    run.add_argument('--only', action='append', help='benchmark to run (repeatable)')
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--max-seconds', type=float, default=120.0,
+                     help='skip sizes predicted to take longer than this')
+    run.add_argument('--output', help='result file (default Benchmarks/benchmark_<time>.json)')
+    run.add_argument('--baseline', action='store_true', help=f'also store as {BASELINE_FILE}')
+    cmp = commands.add_parser('compare', help='compare two result files')
+    cmp.add_argument('baseline', nargs='?', default=BASELINE_FILE)
+    cmp.add_argument('current', nargs='?', help='default: the newest result in Benchmarks/')
+    cmp.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                     help='flag median-time ratios above 1 + threshold (default 0.2)')
+    commands.add_parser('list', help='list the benchmarks')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name in BENCHMARKS:
+            print(name)
+        return
+
+    print("=" * 80)
+    print("BENCHMARK SUITE")
+    print("=" * 80)
+    if args.command == 'run':
+        report = run_suite([parse_size(s) for s in args.sizes], args.only, args.repeat,
+                           args.seed, args.max_seconds)
+        print_scaling(report)
+        output = args.output or os.path.join(
+            BENCH_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        _write_report(report, output)
+        print(f"\n✓ Results: {output}")
+        if args.baseline:
+            _write_report(report, BASELINE_FILE)
+            print(f"✓ Baseline: {BASELINE_FILE}")
+        return
+
+    current = args.current
+    if current is None:
+        candidates = sorted(f for f in os.listdir(BENCH_DIR) if f.startswith('benchmark_'))
+        if not candidates:
+            print(f"ERROR: no results in {BENCH_DIR}; run `benchmarks.py run` first")
+            sys.exit(2)
+        current = os.path.join(BENCH_DIR, candidates[-1])
+    table = compare(_read_report(args.baseline), _read_report(current), args.threshold)
+    print(f"\nBaseline: {args.baseline}\nCurrent:  {current}\n")
+    print(f"{'Benchmark':<30}{'Rows':>10}{'Baseline s':>12}{'Current s':>12}{'Ratio':>8}")
+    for row in table.itertuples(index=False):
+        flag = '  ✗ REGRESSION' if row.Regression else ''
+        print(f"{row.Benchmark:<30}{row.Rows:>10,}{row.Baseline_s:>12.4f}{row.Current_s:>12.4f}"
+              f"{row.Ratio:>8.2f}{flag}")
+    regressions = int(table['Regression'].sum())
+    if regressions:
+        print(f"\n✗ {regressions} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✓ No regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Append-Mode Ingestion
+Add a batch of new mention rows to the mention CSV without a full rebuild
+
+For a batch CSV with the source's columns:
+1. Rows without a publication key (DOI, PMID or title), genus or
+   publication year are rejected
+2. Rows whose (publication, genus, species) key is already in the store, or
+   repeated within the batch, are dropped as duplicates; rows that are
+   near-duplicates of stored publications (see near_duplicates) are
+   appended but, like in the analyses, not counted again
+3. The remaining rows are appended to the CSV; the mention cache (cached
+   columns, text columns, key index) is extended in place
+4. The persisted aggregate cube and publication sketch are updated with the
+   new rows only
+5. Figures whose inputs received new rows are marked stale in
+   <output-root>/stale_figures.json; the part scripts regenerate them
+
+Usage:
+    python ingest.py BATCH.csv [--data FILE] [--output-root DIR] [--dry-run]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from mention_store import append_rows, duplicate_mentions, key_index, parse_rows, source_columns
+from publication_keys import publication_keys, key_hashes, mention_keys
+from chunked_engine import (load_cube, save_cube, clean_chunk, update_sketches,
+                            PART2_YEAR_RANGE)
+from run_context import current_context, mention_table
+
+# Figures of each part and the columns they read beyond year, citations and
+# taxon; a tuple lists alternatives, a row's value is taken from the first
+# of them that has one (as the scripts do)
+FIGURE_INPUTS = {
+    1: {'Fig1_Species_Discovery_Rate': [],
+        'Fig2_Taxonomic_Completeness': [],
+        'Fig3_Research_Effort_vs_Diversity': [],
+        'Fig4_Host_Parasite_Network': ['abstract'],
+        'Fig5_Geographic_Distribution': [('country_clean', 'country')],
+        'Fig6_Research_Bias_Analysis': []},
+    2: {'Fig1_Temporal_Trends_Top10_Genera': [],
+        'Fig2_Growth_Rate_Analysis': [],
+        'Fig3_Forecasts_Top6_Genera': [],
+        'Fig4_Cumulative_Output': [],
+        'Fig5_Decade_Comparison': [],
+        'Fig6_Research_Momentum': []},
+    3: {'Fig1_Citation_Distribution_Impact': [],
+        'Fig2_Citation_Metrics_by_Genus': [],
+        'Fig3_Temporal_Citation_Patterns': [],
+        'Fig4_Author_Productivity': ['authors'],
+        'Fig5_Journal_Impact': ['journal']},
+    4: {'Fig1_Top_Keywords': ['abstract'],
+        'Fig2_Theme_Evolution': ['abstract'],
+        'Fig3_Emerging_Declining_Topics': ['abstract']},
+    5: {'Fig1_Global_Research_Distribution': [('org_country', 'country')],
+        'Fig2_Collaboration_Network': [('org_country', 'country')],
+        'Fig3_Regional_Trends': [('org_country', 'country')]},
+    6: {'Fig1_Crop_Nematode_Associations': ['abstract'],
+        'Fig2_Economic_Impact_Trends': ['abstract'],
+        'Fig3_Climate_Environmental_Trends': ['abstract']},
+    7: {'Fig1_PCA_Analysis': [],
+        'Fig2_Clustering_Analysis': [],
+        'Fig3_Correlation_Matrix': []},
+}
+
+STALE_FILE = 'stale_figures.json'
+
+# ============================================================================
+# VALIDATION AND DEDUPLICATION
+# ============================================================================
+
+def read_batch(path, columns):
+    """Batch rows as raw strings in source column order"""
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False, na_filter=False)
+    missing = [c for c in columns if c not in raw.columns]
+    extra = [c for c in raw.columns if c not in columns]
+    if missing or extra:
+        raise ValueError(f"Batch columns do not match the source "
+                         f"(missing: {missing or '-'}, unexpected: {extra or '-'})")
+    return raw[columns]
+
+def validate(typed):
+    """Reason each row is rejected ('' for valid rows)"""
+    reasons = pd.Series('', index=typed.index, dtype=object)
+    reasons[pd.to_numeric(typed['pub_year'], errors='coerce').isna()] = 'no publication year'
+    reasons[typed['Genus'].isna()] = 'no genus'
+    reasons[publication_keys(typed).isna()] = 'no publication key'
+    return reasons
+
+def new_mentions(typed, existing_mentions):
+    """Boolean mask of rows whose mention key is neither stored nor repeated in the batch"""
+    keys = mention_keys(typed)
+    return ~np.isin(keys, existing_mentions) & ~pd.Series(keys).duplicated().to_numpy()
+
+# ============================================================================
+# STALE FIGURES
+# ============================================================================
+
+def _has_input(rows, candidates):
+    """Rows with a value in any of the alternatives present (None if none is present)"""
+    candidates = candidates if isinstance(candidates, tuple) else (candidates,)
+    present = [c for c in candidates if c in rows.columns]
+    return rows[present].notna().any(axis=1) if present else None
+
+def stale_figures(cleaned):
+    """{part: [figure stems]} whose inputs include at least one of the cleaned new rows"""
+    stale = {}
+    for part, figures in FIGURE_INPUTS.items():
+        rows = cleaned
+        if part == 2:
+            rows = rows[rows['pub_year'].between(*PART2_YEAR_RANGE)]
+        for figure, inputs in figures.items():
+            masks = [_has_input(rows, candidates) for candidates in inputs]
+            if not len(rows) or any(mask is None for mask in masks):
+                continue
+            if not masks or pd.concat(masks, axis=1).all(axis=1).any():
+                stale.setdefault(part, []).append(figure)
+    return stale
+
+def mark_stale(output_root, stale):
+    """Merge newly stale figures into <output_root>/stale_figures.json"""
+    path = os.path.join(output_root, STALE_FILE)
+    try:
+        with open(path, encoding='utf-8') as handle:
+            recorded = json.load(handle)
+    except (OSError, ValueError):
+        recorded = {}
+    for part, figures in stale.items():
+        recorded[str(part)] = sorted(set(recorded.get(str(part), [])) | set(figures))
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(recorded, handle, indent=2, sort_keys=True)
+    return path
+
+# ============================================================================
+# INGESTION
+# ============================================================================
+
+def ingest(batch_path, source=None, output_root=None, dry_run=False):
+    """
+    Validate, deduplicate and append a batch to source (default: the run
+    context's mention table); returns a summary dict
+    """
+    start = time.time()
+    source = mention_table(source)
+    output_root = output_root or current_context().root
+    columns = source_columns(source)
+    raw = read_batch(batch_path, columns)
+    typed = parse_rows(raw)
+
+    reasons = validate(typed)
+    valid = (reasons == '').to_numpy()
+    existing_publications, existing_mentions = key_index(source)
+    fresh = valid & new_mentions(typed, existing_mentions)
+    accepted_raw = raw[fresh]
+    accepted = typed[fresh].reset_index(drop=True)
+
+    publications = key_hashes(publication_keys(accepted))
+    summary = {'rows': len(raw),
+               'rejected': reasons[reasons != ''].value_counts().to_dict(),
+               'duplicates': int((valid & ~fresh).sum()),
+               'appended': len(accepted),
+               'new_publications': int(len(np.setdiff1d(publications, existing_publications)))}
+
+    cleaned = clean_chunk(accepted) if len(accepted) else accepted
+    summary['stale'] = stale_figures(cleaned)
+    if dry_run or len(accepted) == 0:
+        summary['seconds'] = time.time() - start
+        return summary
+
+    # The cube must be read before the source changes (it is tied to the
+    # source fingerprint) and saved after
+    cube = load_cube(source)
+    n_before = len(existing_publications)
+    append_rows(source, accepted_raw)
+    if cube is not None:
+        parts, aggregates, sketches = cube
+        # New rows can still be near-duplicates of stored publications
+        repeated = duplicate_mentions(source)[n_before:]
+        cleaned = clean_chunk(accepted[~repeated])
+        summary['near_duplicates'] = int(repeated.sum())
+        if len(cleaned):
+            for aggregate in aggregates.values():
+                aggregate.update(cleaned)
+            update_sketches(sketches, cleaned)
+        save_cube(source, parts, aggregates, sketches)
+    summary['cube_updated'] = cube is not None
+
+    if summary['stale']:
+        summary['stale_file'] = mark_stale(output_root, summary['stale'])
+    summary['seconds'] = time.time() - start
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Append a batch of mention rows to the mention CSV')
+    parser.add_argument('batch', help='CSV with the same columns as the source')
+    parser.add_argument('--data', help='mention CSV (default: the run context\'s)')
+    parser.add_argument('--output-root', help='default: the run context\'s')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='report what would be appended without changing anything')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("APPEND-MODE INGESTION")
+    print("=" * 80)
+    try:
+        summary = ingest(args.batch, args.data, args.output_root, args.dry_run)
+    except ValueError as error:
+        print(f"ERROR: {error}")
+        sys.exit(1)
+
+    print(f"\nBatch rows:        {summary['rows']:,}")
+    for reason, count in summary['rejected'].items():
+        print(f"  rejected ({reason}): {count:,}")
+    print(f"Duplicates:        {summary['duplicates']:,}")
+    print(f"Appended:          {summary['appended']:,}"
+          + (" (dry run, nothing written)" if args.dry_run else ""))
+    print(f"New publications:  {summary['new_publications']:,}")
+    if summary.get('near_duplicates'):
+        print(f"Near-duplicates:   {summary['near_duplicates']:,} (appended, not counted)")
+    if 'cube_updated' in summary:
+        print("✓ Aggregate cube updated" if summary['cube_updated']
+              else "⚠ No current aggregate cube; chunked_engine.py will rebuild it")
+    if summary['stale']:
+        print("\nStale figures:")
+        for part, figures in sorted(summary['stale'].items()):
+            print(f"  Part {part}: {', '.join(figures)}")
+        if 'stale_file' in summary:
+            print(f"✓ Recorded in {summary['stale_file']}")
+    else:
+        print("\nNo figures affected")
+    print(f"\nDone in {summary['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,26 @@
 """
 Master Script for Running All 7 Analyses on Real Data (CSV)
 Automatically handles CSV format and runs all improved analyses
+Dataset and output root come from the run context ($DATAANALYZ_CONTEXT,
+see run_context.py)
 """
 
 import sys
 import os
 import subprocess
 
-BASE_DIR = '/home/user/DataAnalyz/TopTen/data/Real_Analyses'
-DATA_FILE = f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'shared'))
+from run_context import current_context
+
+CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+DATA_FILE = CONTEXT.data_file
 
 print("="*80)
 print("RUNNING ALL 7 IMPROVED ANALYSES ON REAL DATA")
 print("="*80)
 print(f"\nData file: {DATA_FILE}")
-print(f"Output directory: {BASE_DIR}")
+print(f"Output directory: {CONTEXT.root}")
 print("\n" + "="*80 + "\n")
 
 # Check if data file exists
@@ -24,7 +30,6 @@ if not os.path.exists(DATA_FILE):
     sys.exit(1)
 
 # Import shared libraries
-sys.path.append(BASE_DIR)
 from analysis_utils_improved import *
 
 # Quick data check
@@ -34,11 +39,15 @@ df_check = pd.read_csv(DATA_FILE, nrows=5)
 print(f"✓ File readable")
 print(f"✓ Columns: {', '.join(df_check.columns[:10].tolist())}...")
 
-df_full = pd.read_csv(DATA_FILE)
-print(f"✓ Total records: {len(df_full):,}")
-print(f"✓ Unique genera: {df_full['Genus'].nunique() if 'Genus' in df_full.columns else 'N/A'}")
-print(f"✓ Unique species: {df_full['Species'].nunique() if 'Species' in df_full.columns else 'N/A'}")
-print(f"✓ Year range: {df_full['pub_year'].min()}-{df_full['pub_year'].max() if 'pub_year' in df_full.columns else 'N/A'}")
+# Streamed in row groups, so the check does not hold the whole table
+from chunked_engine import corpus_summary
+summary = corpus_summary(DATA_FILE)
+print(f"✓ Total records: {summary['n_records']:,}")
+print(f"✓ Unique genera: {summary['n_genera'] if summary['n_genera'] is not None else 'N/A'}")
+print(f"✓ Unique species: {summary['n_species'] if summary['n_species'] is not None else 'N/A'}")
+year_range = (f"{summary['first_year']:.0f}-{summary['last_year']:.0f}"
+              if summary['first_year'] is not None and summary['last_year'] is not None else 'N/A')
+print(f"✓ Year range: {year_range}")
 
 print("\n" + "="*80)
 print("DATA CHECK COMPLETE - READY TO RUN ANALYSES")
@@ -46,3 +55,13 @@ print("="*80)
 print("\nNote: Each analysis part will be generated using the improved scripts.")
 print("All figures will be 600 DPI Nature-quality with consistent colors.")
 print("\n" + "="*80 + "\n")
+
+# Where the time went in the latest run of each part (profiles written by
+# the part scripts, see profiling.py)
+from profiling import summarize_profiles
+summarize_profiles(CONTEXT.root)
+
+# One page over the figures, tables and run profiles, with thumbnails
+# instead of the full-resolution PNGs (see report.py)
+from report import assemble_report
+assemble_report(CONTEXT.root)
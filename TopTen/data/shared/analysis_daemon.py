@@ -0,0 +1,346 @@
+"""
+Analysis Daemon
+Long-lived local process keeping the dataset and the analysis stack loaded
+
+A part script started on its own pays for interpreter start-up, the
+plotting and statistics imports and the load of the mention table before
+any analysis starts. The daemon pays for them once. It imports the
+analysis stack and switches mention_store to resident mode, where loaded
+columns, text columns, publication ids and parsed dates stay in memory
+and are re-read only when the source fingerprint (size + mtime) changes.
+It then runs jobs in-process through script_stages, so a job costs only
+its own stages.
+
+Jobs arrive as HTTP requests on 127.0.0.1:<port> or on a Unix socket:
+- POST /run       {"part": "part1", "only": ["Fig4"], "context": {...}};
+                  the response streams one JSON object per line: {"stage",
+                  "line"} for every line the script prints, then {"done":
+                  true, "stages", "seconds"} or {"error", "traceback"}.
+                  "context" holds run context fields (data_file,
+                  output_root, ...; see run_context.py) that apply to this
+                  job on top of the daemon's own context
+- GET  /status    resident sources, jobs run, uptime
+- POST /reload    drop resident data ({"source": path}, or everything)
+- POST /shutdown
+Jobs run one at a time (the scripts share pyplot and the output writer);
+a second /run waits until the first one finishes.
+
+Usage:
+    python analysis_daemon.py serve [--port 8765 | --socket PATH] [--warm DATA_FILE]
+    python analysis_daemon.py run part1 [--only Fig4 ...] [--data CSV --output-root DIR ...]
+                                        [--port 8765 | --socket PATH]
+    python analysis_daemon.py status | reload [--source FILE] | shutdown
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import traceback
+import contextlib
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from profiling import PROFILE
+from run_context import add_arguments, context_from_args, current_context, use_context
+
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+class _ProgressStream(io.TextIOBase):
+    """
+    stdout of a job: every complete line goes to `send` as an event, tagged
+    with the stage of the thread that printed it (output-writer threads
+    print for the stage that queued the output). Partial lines are kept per
+    thread, so lines printed concurrently are never merged.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        thread = threading.get_ident()
+        with self._lock:
+            *lines, rest = (self._pending.pop(thread, '') + text).split('\n')
+            if rest:
+                self._pending[thread] = rest
+            for line in lines:
+                self.send({'stage': PROFILE.current_stage(), 'line': line})
+        return len(text)
+
+    def close_line(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for line in pending.values():
+                self.send({'stage': PROFILE.current_stage(), 'line': line})
+
+class AnalysisDaemon:
+    """Resident state and job runner behind the HTTP front end"""
+
+    def __init__(self, base_dir=None):
+        # The analysis stack is imported here, once; the client side of
+        # this module stays light
+        import analysis_utils_improved
+        import mention_store
+        self.base_dir = base_dir
+        self.started = time.time()
+        self.jobs = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        mention_store.keep_resident()
+
+    def warm(self, source):
+        """Load every column, text column and the publication ids of source"""
+        import mention_store
+        from analysis_utils_improved import TEXT_COLUMNS
+        mention_store.warm(source, TEXT_COLUMNS)
+
+    def status(self):
+        from mention_store import resident_sources
+        return {'pid': os.getpid(), 'uptime_s': round(time.time() - self.started, 1),
+                'jobs': self.jobs, 'failed': self.failed, 'busy': self.lock.locked(),
+                'resident': resident_sources()}
+
+    def run_job(self, part, only, send, context=None):
+        """
+        Run part (the stages `only` needs) with its output sent line by
+        line; context holds run context fields for this job
+        """
+        import matplotlib.pyplot as plt
+        from analysis_utils_improved import flush_outputs
+        from script_stages import ScriptStages
+        try:
+            job_context = current_context().replace(**(context or {}))
+            script = ScriptStages.for_part(part, self.base_dir or job_context.track_dir)
+            script.resolve(only)
+        except (KeyError, ValueError, TypeError, FileNotFoundError) as error:
+            send({'error': error.args[0] if error.args else str(error)})
+            return False
+        with self.lock:
+            self.jobs += 1
+            started = time.perf_counter()
+            stream = _ProgressStream(send)
+            daemon_context = current_context()
+            use_context(job_context)
+            try:
+                with contextlib.redirect_stdout(stream):
+                    stages = script.run(only)
+            except (Exception, SystemExit) as error:
+                self.failed += 1
+                # Let the writes the job queued finish before the next job
+                with contextlib.suppress(Exception):
+                    flush_outputs()
+                stream.close_line()
+                send({'error': f"{type(error).__name__}: {error}",
+                      'traceback': traceback.format_exc()})
+                return False
+            finally:
+                use_context(daemon_context)
+                plt.close('all')
+            stream.close_line()
+            send({'done': True, 'stages': stages,
+                  'seconds': round(time.perf_counter() - started, 3)})
+            return True
+
+# ============================================================================
+# HTTP FRONT END
+# ============================================================================
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, event):
+        # A client that went away does not stop the job
+        if self.client_gone:
+            return
+        try:
+            self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        except OSError:
+            self.client_gone = True
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._reply(200, self.server.daemon.status())
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._reply(400, {'error': 'Request body is not JSON'})
+            return
+        daemon = self.server.daemon
+
+        if self.path == '/run':
+            if not body.get('part'):
+                self._reply(400, {'error': 'Missing "part"'})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            self.client_gone = False
+            daemon.run_job(body['part'], list(body.get('only') or []), self._send_event,
+                           body.get('context'))
+        elif self.path == '/reload':
+            from mention_store import drop_resident
+            drop_resident(body.get('source'))
+            if body.get('source'):
+                daemon.warm(body['source'])
+            self._reply(200, daemon.status())
+        elif self.path == '/shutdown':
+            self._reply(200, {'stopping': True})
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(port=DEFAULT_PORT, socket_path=None, warm=(), base_dir=None):
+    """Run the daemon until /shutdown or Ctrl-C"""
+    daemon = AnalysisDaemon(base_dir)
+    for source in warm:
+        print(f"Loading {source}...")
+        daemon.warm(source)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+        address = socket_path
+    else:
+        server = _TCPServer((HOST, port), _Handler)
+        address = f"http://{HOST}:{server.server_address[1]}"
+    server.daemon = daemon
+    print(f"✓ Analysis daemon listening on {address} (pid {os.getpid()})")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+    print("✓ Analysis daemon stopped")
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class _UnixConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix socket"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+def request(method, path, payload=None, port=DEFAULT_PORT, socket_path=None):
+    """HTTPResponse of one request to the daemon"""
+    connection = (_UnixConnection(socket_path) if socket_path
+                  else http.client.HTTPConnection(HOST, port))
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+    return connection.getresponse()
+
+def run_remote(part, only=(), port=DEFAULT_PORT, socket_path=None, context=None):
+    """Run a job on the daemon, printing its output as it arrives; True on success"""
+    payload = {'part': part, 'only': list(only)}
+    if context:
+        payload['context'] = context
+    response = request('POST', '/run', payload, port, socket_path)
+    if response.status != 200:
+        print(f"ERROR: {json.loads(response.read()).get('error')}")
+        return False
+    for raw in response:
+        event = json.loads(raw)
+        if 'line' in event:
+            print(event['line'])
+        elif event.get('done'):
+            print(f"✓ Job finished in {event['seconds']:.1f}s ({', '.join(event['stages'])})")
+            return True
+        elif 'error' in event:
+            if 'traceback' in event:
+                print(event['traceback'], file=sys.stderr)
+            print(f"✗ Job failed: {event['error']}")
+            return False
+    print("✗ Connection closed before the job finished")
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description='Resident analysis daemon')
+    address = argparse.ArgumentParser(add_help=False)
+    address.add_argument('--port', type=int, default=DEFAULT_PORT)
+    address.add_argument('--socket', help='Unix socket path (instead of the TCP port)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_cmd = commands.add_parser('serve', parents=[address], help='start the daemon')
+    serve_cmd.add_argument('--warm', action='append', default=[], metavar='DATA_FILE',
+                           help='load this mention table before accepting jobs (repeatable)')
+    add_arguments(serve_cmd)
+    run = commands.add_parser('run', parents=[address], help='run a part on the daemon')
+    run.add_argument('part', help='part1 ... part7')
+    run.add_argument('--only', action='append', default=[], metavar='NAME',
+                     help='figure, table or stage to produce (repeatable)')
+    add_arguments(run)
+    commands.add_parser('status', parents=[address], help='show the resident state')
+    reload_cmd = commands.add_parser('reload', parents=[address], help='drop resident data')
+    reload_cmd.add_argument('--source', help='only this mention table (reloaded at once)')
+    commands.add_parser('shutdown', parents=[address], help='stop the daemon')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        use_context(context_from_args(args))
+        serve(args.port, args.socket, args.warm)
+        return
+    try:
+        if args.command == 'run':
+            # Only the fields given here; the daemon fills in the rest
+            fields = context_from_args(args).to_dict()
+            context = {k: v for k, v in fields.items() if v is not None}
+            ok = run_remote(args.part, args.only, args.port, args.socket, context)
+            sys.exit(0 if ok else 1)
+        method = 'GET' if args.command == 'status' else 'POST'
+        payload = {'source': os.path.abspath(args.source)} if getattr(args, 'source', None) else {}
+        response = request(method, f'/{args.command}', payload, args.port, args.socket)
+        print(json.dumps(json.loads(response.read()), indent=2))
+    except (ConnectionRefusedError, FileNotFoundError) as error:
+        print(f"ERROR: daemon not reachable ({error})")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
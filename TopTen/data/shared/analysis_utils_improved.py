@@ -0,0 +1,1105 @@
+"""
+Improved Utility Functions for Nematode Research Analysis Project
+Nature-Quality Publication Standards
+Provides consistent styling, plotting, and data processing functions
+"""
+
+import io
+import os
+import time
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib import rcParams
+from matplotlib.patches import Rectangle
+from matplotlib.artist import Artist
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
+import warnings
+
+from profiling import PROFILE, profiled
+from run_context import current_context
+warnings.filterwarnings('ignore')
+
+# Copy-on-write (always on from pandas 3.0): row subsets and derived columns
+# share the untouched columns of their parent frame instead of copying them,
+# so the cleaning steps below never need a defensive df.copy()
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# ============================================================================
+# NATURE-QUALITY COLOR SCHEME
+# ============================================================================
+
+# Professional color palette based on ColorBrewer and Nature journals
+# Using muted, distinguishable colors suitable for scientific publications
+
+GENUS_COLORS = {
+    # Top 10 most studied genera - distinct professional colors
+    'Meloidogyne': '#d62728',     # Red (root-knot nematodes)
+    'Pratylenchus': '#2ca02c',    # Green (lesion nematodes)
+    'Heterodera': '#1f77b4',      # Blue (cyst nematodes)
+    'Globodera': '#9467bd',       # Purple (potato cyst nematodes)
+    'Bursaphelenchus': '#ff7f0e', # Orange (pine wilt nematodes)
+    'Xiphinema': '#8c564b',       # Brown (dagger nematodes)
+    'Radopholus': '#e377c2',      # Pink (burrowing nematodes)
+    'Longidorus': '#7f7f7f',      # Gray (needle nematodes)
+    'Aphelenchoides': '#bcbd22',  # Olive (foliar nematodes)
+    'Ditylenchus': '#17becf',     # Cyan (stem and bulb nematodes)
+
+    # Next 10 genera - complementary colors
+    'Tylenchulus': '#aec7e8',     # Light blue
+    'Rotylenchulus': '#ffbb78',   # Light orange
+    'Helicotylenchus': '#98df8a', # Light green
+    'Hoplolaimus': '#ff9896',     # Light red
+    'Belonolaimus': '#c5b0d5',    # Light purple
+    'Criconemella': '#c49c94',    # Light brown
+    'Nacobbus': '#f7b6d2',        # Light pink
+    'Paratrichodorus': '#c7c7c7', # Light gray
+    'Trichodorus': '#dbdb8d',     # Light olive
+    'Anguina': '#9edae5',         # Light cyan
+
+    # Additional genera - professional palette
+    'Rotylenchus': '#393b79',     # Dark blue
+    'Tylenchorhynchus': '#637939', # Dark olive
+    'Hemicycliophora': '#8c6d31', # Dark brown
+    'Scutellonema': '#843c39',    # Dark red
+    'Criconemoides': '#7b4173',   # Dark purple
+    'Mesocriconema': '#5254a3',   # Medium blue
+    'Paratylenchus': '#6b6ecf',   # Medium purple
+    'Hirschmanniella': '#b5cf6b', # Light green-yellow
+    'Hemicriconemoides': '#ce6dbd', # Medium pink
+    'Aphelenchus': '#9c9ede',     # Lavender
+    'Hemicaloosia': '#cedb9c',    # Pale green
+    'Merlinius': '#de9ed6',       # Pink-purple
+}
+
+# Color gradients for continuous data
+SEQUENTIAL_CMAP = 'viridis'      # For continuous positive data
+DIVERGING_CMAP = 'RdBu_r'        # For diverging data (e.g., bias)
+HEATMAP_CMAP = 'YlOrRd'          # For heatmaps
+
+# Base palette for general use
+BASE_PALETTE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+# ============================================================================
+# NATURE-QUALITY PLOTTING CONFIGURATION
+# ============================================================================
+
+def set_nature_style():
+    """
+    Set matplotlib parameters for Nature-quality figures
+    Following Nature journal figure guidelines
+    """
+    # High resolution for publication
+    rcParams['figure.dpi'] = 600
+    rcParams['savefig.dpi'] = 600
+
+    # Font settings - Nature prefers Arial or Helvetica
+    rcParams['font.family'] = 'sans-serif'
+    rcParams['font.sans-serif'] = ['Arial', 'Helvetica', 'DejaVu Sans']
+    rcParams['font.size'] = 8  # Nature: 6-8pt
+    rcParams['axes.labelsize'] = 9
+    rcParams['axes.titlesize'] = 10
+    rcParams['xtick.labelsize'] = 8
+    rcParams['ytick.labelsize'] = 8
+    rcParams['legend.fontsize'] = 8
+    rcParams['legend.title_fontsize'] = 9
+
+    # Line and border settings - cleaner look
+    rcParams['axes.linewidth'] = 0.8
+    rcParams['grid.linewidth'] = 0.5
+    rcParams['lines.linewidth'] = 1.5
+    rcParams['patch.linewidth'] = 0.8
+    rcParams['xtick.major.width'] = 0.8
+    rcParams['ytick.major.width'] = 0.8
+
+    # Grid settings - subtle
+    rcParams['grid.alpha'] = 0.3
+    rcParams['grid.linestyle'] = '--'
+
+    # Legend settings
+    rcParams['legend.frameon'] = False
+    rcParams['legend.numpoints'] = 1
+    rcParams['legend.scatterpoints'] = 1
+
+    # Clean seaborn style
+    sns.set_style("ticks", {
+        'axes.edgecolor': '0.15',
+        'axes.grid': True,
+        'grid.color': '0.9',
+        'grid.linestyle': '-',
+    })
+    sns.set_palette(BASE_PALETTE)
+
+@profiled
+def save_figure(fig, filepath, dpi=600, bbox_inches='tight', transparent=False):
+    """
+    Save figure in Nature publication quality
+    The figure is rasterized immediately; PNG encoding and the disk write
+    are handed to the background output writer (see flush_outputs)
+    """
+    OUTPUT_WRITER.write_figure(fig, filepath, dpi=dpi, bbox_inches=bbox_inches,
+                               facecolor='white' if not transparent else 'none')
+
+@profiled
+def save_table(df, filepath, **to_csv_kwargs):
+    """
+    Save a results table as CSV through the background output writer
+    Keyword arguments are passed to DataFrame.to_csv unchanged
+    """
+    PROFILE.record_table(len(df))
+    OUTPUT_WRITER.write_table(df, filepath, **to_csv_kwargs)
+
+def flush_outputs():
+    """
+    Wait for all queued tables and figures, fsync them to disk and raise
+    if any write failed. Call once at the end of every analysis script.
+    """
+    OUTPUT_WRITER.flush()
+
+def get_genus_color(genus_name, default_color='#7f7f7f'):
+    """
+    Get consistent color for a genus across all analyses
+    """
+    return GENUS_COLORS.get(genus_name, default_color)
+
+def create_genus_colormap(genera_list):
+    """
+    Create a color mapping for a list of genera
+    Ensures consistency across all visualizations
+    """
+    return {genus: get_genus_color(genus) for genus in genera_list}
+
+# ============================================================================
+# BATCHED PLOTTING HELPERS
+# ============================================================================
+
+# Each helper takes whole arrays and emits a fixed number of artists, so
+# draw time at 600 DPI no longer grows with one artist per genus/bar.
+
+def scatter_batched(ax, x, y, sizes=30, colors='#1f77b4', alphas=1.0,
+                    zorders=1, edgecolors='black', linewidths=0.5, **kwargs):
+    """
+    Draw a scatter with per-point colors, sizes, alphas and z-orders
+    Emits one PathCollection per distinct z-order instead of one per point;
+    per-point alpha is folded into the RGBA face and edge colors
+    Returns the list of collections, lowest z-order first
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    sizes = np.broadcast_to(np.asarray(sizes, dtype=float), (n,))
+    alphas = np.broadcast_to(np.asarray(alphas, dtype=float), (n,))
+    zorders = np.broadcast_to(np.asarray(zorders, dtype=float), (n,))
+
+    face = _rgba_array(colors, n)
+    edge = _rgba_array(edgecolors, n)
+    face[:, 3] *= alphas
+    edge[:, 3] *= alphas
+
+    collections = []
+    for z in np.unique(zorders):
+        mask = zorders == z
+        collections.append(ax.scatter(x[mask], y[mask], s=sizes[mask],
+                                      c=face[mask], edgecolors=edge[mask],
+                                      linewidths=linewidths, zorder=z, **kwargs))
+    return collections
+
+def _rgba_array(colors, n):
+    """Broadcast a single color or a sequence of colors to an (n, 4) array"""
+    from matplotlib.colors import to_rgba_array
+
+    rgba = to_rgba_array(colors if not isinstance(colors, str) else [colors])
+    if len(rgba) == 1:
+        rgba = np.repeat(rgba, n, axis=0)
+    return rgba.copy()
+
+def _density_limited(values, max_labels):
+    """Indices of the labels to draw, keeping the largest |value| first"""
+    values = np.asarray(values, dtype=float)
+    if max_labels is None or len(values) <= max_labels:
+        return np.arange(len(values))
+    keep = np.argsort(-np.abs(np.nan_to_num(values)), kind='stable')[:max_labels]
+    return np.sort(keep)
+
+class BarLabels(Artist):
+    """
+    All value labels of a bar chart as one artist: a single Text is moved
+    to each label and drawn in turn, so a labelled chart holds one label
+    artist however many bars it has
+    """
+
+    def __init__(self, x, y, labels, ha, va, **text_kwargs):
+        super().__init__()
+        self.set_zorder(Text.zorder)
+        self._labels = list(zip(x, y, labels, ha, va))
+        self._text = Text(clip_on=False, **text_kwargs)
+
+    def set_figure(self, fig):
+        super().set_figure(fig)
+        self._text.set_figure(fig)
+
+    def _placed(self):
+        """The shared Text at each label in turn"""
+        text = self._text
+        text.set_transform(self.get_transform())
+        for x, y, label, ha, va in self._labels:
+            text.set_position((x, y))
+            text.set_text(label)
+            text.set_horizontalalignment(ha)
+            text.set_verticalalignment(va)
+            yield text
+
+    def draw(self, renderer):
+        if self.get_visible():
+            for text in self._placed():
+                text.draw(renderer)
+        self.stale = False
+
+    def get_window_extent(self, renderer=None):
+        boxes = [text.get_window_extent(renderer) for text in self._placed()]
+        return Bbox.union(boxes) if boxes else Bbox.null()
+
+def label_bars(ax, positions, values, labels=None, orientation='horizontal',
+               fmt='{:.0f}', pad=None, pad_fraction=0.01, max_labels=None,
+               fontsize=7, **text_kwargs):
+    """
+    Add value labels to the ends of a bar chart as one BarLabels artist
+    Negative bars are labelled on their far side; `max_labels` limits label
+    density by keeping only the largest bars
+    """
+    positions = np.asarray(positions, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return None
+
+    if labels is None:
+        labels = [fmt.format(v) for v in values]
+    if pad is None:
+        pad = np.nanmax(np.abs(values)) * pad_fraction
+
+    keep = _density_limited(values, max_labels)
+    negative = values[keep] < 0
+    ends = values[keep] + np.where(negative, -pad, pad)
+    texts = [labels[i] for i in keep]
+
+    if orientation == 'horizontal':
+        artist = BarLabels(ends, positions[keep], texts,
+                           np.where(negative, 'right', 'left'), ['center'] * len(keep),
+                           fontsize=fontsize, **text_kwargs)
+    else:
+        artist = BarLabels(positions[keep], ends, texts,
+                           ['center'] * len(keep), np.where(negative, 'top', 'bottom'),
+                           fontsize=fontsize, **text_kwargs)
+    return ax.add_artist(artist)
+
+def annotate_points(ax, x, y, labels, offset=(5, 5), max_labels=None,
+                    priority=None, **text_kwargs):
+    """
+    Annotate scatter points with a fixed offset in points
+    `max_labels` keeps only the points with the highest `priority`
+    (default: input order)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    labels = list(labels)
+
+    if priority is None:
+        keep = np.arange(len(labels))[:max_labels]
+    else:
+        keep = _density_limited(priority, max_labels)
+
+    return [ax.annotate(labels[i], (x[i], y[i]), xytext=offset,
+                        textcoords='offset points', **text_kwargs)
+            for i in keep]
+
+# ============================================================================
+# BACKGROUND OUTPUT WRITER
+# ============================================================================
+
+def _write_replace(filepath, write):
+    """
+    Call write(tmp_path), fsync the temp file and atomically move it into
+    place; the temp file is removed if any step fails
+    """
+    tmp_path = f"{filepath}.tmp"
+    try:
+        write(tmp_path)
+        with open(tmp_path, 'rb+') as handle:
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _encode_png(filepath, raw_png, dpi):
+    """Re-encode an uncompressed PNG with full zlib compression"""
+    from PIL import Image, PngImagePlugin
+
+    image = Image.open(io.BytesIO(raw_png))
+    info = PngImagePlugin.PngInfo()
+    for key, value in getattr(image, 'text', {}).items():
+        info.add_text(key, value)
+
+    _write_replace(filepath, lambda tmp_path: image.save(
+        tmp_path, format='PNG', dpi=(dpi, dpi), pnginfo=info, compress_level=6))
+
+def _write_csv(filepath, df, to_csv_kwargs):
+    """Serialize a table snapshot to CSV"""
+    _write_replace(filepath, lambda tmp_path: df.to_csv(tmp_path, **to_csv_kwargs))
+
+class OutputWriter:
+    """
+    Bounded background writer for result tables and figures
+
+    Matplotlib is not thread-safe, so figures are rasterized on the calling
+    thread into an uncompressed PNG buffer. PNG compression, CSV
+    serialization and the disk writes run on a small thread pool, which lets
+    the next figure be computed while the previous one is written. At most
+    `max_pending` outputs are in flight; further submissions block until a
+    slot frees up, which bounds the memory held by queued images.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = []
+        self._written = []
+        # Every file written so far, in completion order
+        self.saved = []
+
+    def _submit(self, func, filepath, *args):
+        self._slots.acquire()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='output-writer')
+            future = self._executor.submit(self._run, func, filepath, PROFILE.current_stage(),
+                                           *args)
+            self._pending.append((filepath, future))
+
+    def _run(self, func, filepath, stage, *args):
+        # Charged (and its messages attributed) to the stage that queued the output
+        try:
+            with PROFILE.charged_to(stage):
+                wall, cpu = time.perf_counter(), time.thread_time()
+                os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+                func(filepath, *args)
+                PROFILE.record_call(func.__name__.lstrip('_'), time.perf_counter() - wall,
+                                    time.thread_time() - cpu)
+                PROFILE.record_output(filepath)
+                with self._lock:
+                    self._written.append(filepath)
+                    self.saved.append(filepath)
+                print(f"✓ Saved: {filepath}")
+        finally:
+            self._slots.release()
+
+    def write_figure(self, fig, filepath, dpi=600, bbox_inches='tight',
+                     facecolor='white'):
+        """Rasterize `fig` now and queue PNG encoding and writing"""
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches=bbox_inches,
+                    facecolor=facecolor, edgecolor='none',
+                    pil_kwargs={'compress_level': 0})
+        self._submit(_encode_png, filepath, buffer.getvalue(), dpi)
+
+    def write_table(self, df, filepath, **to_csv_kwargs):
+        """Queue a snapshot of `df` for CSV serialization"""
+        self._submit(_write_csv, filepath, df.copy(), to_csv_kwargs)
+
+    def flush(self, raise_errors=True):
+        """
+        Block until every queued output is written, fsync the output
+        directories and report failures. Returns the number of files written
+        since the previous flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        errors = []
+        for filepath, future in pending:
+            exc = future.exception()
+            if exc is not None:
+                errors.append((filepath, exc))
+
+        with self._lock:
+            written, self._written = self._written, []
+
+        for directory in sorted({os.path.dirname(os.path.abspath(p)) for p in written}):
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+        if errors:
+            print(f"\n⚠ {len(errors)} output(s) failed to write:")
+            for filepath, exc in errors:
+                print(f"  ✗ {filepath}: {exc}")
+            if raise_errors:
+                raise IOError(f"{len(errors)} output(s) failed to write; "
+                              f"first failure: {errors[0][0]}: {errors[0][1]}")
+
+        return len(written)
+
+# Shared writer used by save_figure/save_table; outputs still queued when the
+# interpreter exits are drained and any failures reported
+OUTPUT_WRITER = OutputWriter()
+atexit.register(OUTPUT_WRITER.flush, raise_errors=False)
+
+# ============================================================================
+# IMPROVED DATA CLEANING FUNCTIONS
+# ============================================================================
+
+DEFAULT_EXCLUDED_GENERA = ['Steinernema', 'Heterorhabditis']
+
+GENERIC_SPECIES_PATTERNS = ['^sp$', '^sp\.$', '^spp$', '^spp\.$', '^species$',
+                            '^spec$', '^spec\.$']
+
+# Filter predicates take the distinct values of a column (its categorical
+# dictionary) and return one flag per value; _category_mask broadcasts the
+# flags back to rows, so string work is done once per value, not per row
+
+def _is_generic_species(categories):
+    return categories.astype(str).str.lower().str.match('|'.join(GENERIC_SPECIES_PATTERNS))
+
+def _is_excluded_genus(categories, exclude_list):
+    return categories.str.capitalize().isin([g.capitalize() for g in exclude_list])
+
+def _category_mask(series, predicate):
+    """Evaluate a category predicate on the distinct values of series"""
+    codes, categories = pd.factorize(series)
+    flagged = np.asarray(predicate(pd.Series(categories, dtype=object)), dtype=bool)
+    # Code -1 (missing value) picks the trailing False
+    return pd.Series(np.append(flagged, False)[codes], index=series.index)
+
+def generic_species_mask(df, species_col='Species'):
+    """
+    Boolean mask of rows with generic species names (sp, sp., spp, spp., species)
+    """
+    if species_col not in df.columns:
+        return pd.Series(False, index=df.index)
+
+    return _category_mask(df[species_col], _is_generic_species)
+
+def excluded_genera_mask(df, genus_col='Genus', exclude_list=None):
+    """
+    Boolean mask of rows from excluded genera (Steinernema, Heterorhabditis by default)
+    """
+    if exclude_list is None:
+        exclude_list = DEFAULT_EXCLUDED_GENERA
+
+    if genus_col not in df.columns:
+        return pd.Series(False, index=df.index)
+
+    return _category_mask(df[genus_col], lambda categories: _is_excluded_genus(categories, exclude_list))
+
+def clean_species_names(df, species_col='Species'):
+    """
+    Remove generic species names (sp, sp., spp, spp., species)
+    Returns cleaned dataframe
+    """
+    mask = generic_species_mask(df, species_col)
+    print(f"✓ Removed {mask.sum():,} non-specific species names")
+
+    return df[~mask]
+
+def filter_excluded_genera(df, genus_col='Genus', exclude_list=None):
+    """
+    Remove excluded genera (Steinernema, Heterorhabditis by default)
+    These are entomopathogenic nematodes, not plant-parasitic
+    """
+    if exclude_list is None:
+        exclude_list = DEFAULT_EXCLUDED_GENERA
+
+    mask = excluded_genera_mask(df, genus_col, exclude_list)
+    print(f"✓ Removed {mask.sum():,} records from excluded genera: {', '.join(exclude_list)}")
+
+    return df[~mask]
+
+def _source_positions(df, source):
+    """
+    df.index as row positions of source, or None when they are not: no
+    valid cache, a non-integer index or one out of range, or a 0-based
+    RangeIndex shorter than the source (a subset whose index was reset)
+    """
+    from mention_store import cached_row_count
+    n_rows = cached_row_count(source)
+    index = df.index
+    if n_rows is None or len(index) == 0 or not pd.api.types.is_integer_dtype(index):
+        return None
+    if isinstance(index, pd.RangeIndex) and index.start == 0 and len(index) != n_rows:
+        return None
+    if index.min() < 0 or index.max() >= n_rows:
+        return None
+    return index.to_numpy()
+
+def repeated_mentions(df, source=None):
+    """
+    Boolean array per row of df, True where the row repeats the (publication,
+    Genus, Species) mention of an earlier row of df
+
+    Publications are the cached canonical ids of `source` when df's index
+    holds source rows, as on the bitmap path; otherwise they are computed
+    from df's own key columns (near-duplicate titles merged, abstracts not
+    compared).
+    """
+    positions = _source_positions(df, source) if source is not None else None
+    if positions is not None:
+        pub_ids = load_publication_ids(source)[positions]
+    else:
+        from near_duplicates import canonical_publication_ids
+        pub_ids = canonical_publication_ids(df).to_numpy()
+    mentions = pd.DataFrame({'pub_id': pub_ids, 'Genus': df['Genus'].to_numpy(),
+                             'Species': df['Species'].to_numpy()})
+    return mentions.duplicated().to_numpy()
+
+@profiled
+def apply_analysis_filters(df, keep=None, source=None, exclude_list=None, deduplicate=True):
+    """
+    Apply all standard filters for analysis
+    The filter masks (and an optional caller-supplied `keep` mask) are
+    combined first and applied as a single row selection, so the frame is
+    subset once rather than once per filter
+
+    When `source` (the file df was loaded from) is given and df is still the
+    full table, the combined genus/species validity is read from a bitmap
+    cached next to the source (see mention_store); changing `exclude_list`
+    only rebuilds that bitmap. With `deduplicate`, rows repeating a
+    mention of the same publication (near-duplicates merged, see
+    near_duplicates) are dropped in the same selection, on either path
+    (see repeated_mentions)
+
+    When the run context has a subset (a corpus slice, see slices.py), only
+    the rows of that slice are kept
+    """
+    if exclude_list is None:
+        exclude_list = DEFAULT_EXCLUDED_GENERA
+
+    print("\nApplying analysis filters...")
+    subset = current_context().subset
+    if subset and source is not None:
+        from slices import validate_slice, slice_mask
+        in_slice = slice_mask(source, validate_slice(subset))[df.index.to_numpy()]
+        print(f"✓ Slice {subset['name']}: {in_slice.sum():,} of {len(df):,} records")
+        keep = pd.Series(in_slice, index=df.index) if keep is None else keep & in_slice
+    drop = pd.Series(False, index=df.index) if keep is None else ~keep
+
+    if source is not None:
+        from mention_store import validity_bitmap
+        valid = validity_bitmap(
+            source, df,
+            predicates={'Genus': lambda categories: _is_excluded_genus(categories, exclude_list),
+                        'Species': _is_generic_species},
+            config={'exclude_genera': sorted(g.capitalize() for g in exclude_list),
+                    'generic_species': GENERIC_SPECIES_PATTERNS})
+        if valid is not None:
+            invalid = ~valid & ~drop.to_numpy()
+            print(f"✓ Removed {invalid.sum():,} records from excluded genera "
+                  f"({', '.join(exclude_list)}) or with non-specific species names")
+            if deduplicate:
+                from mention_store import duplicate_mentions
+                repeated = duplicate_mentions(source) & valid & ~drop.to_numpy()
+                print(f"✓ Removed {repeated.sum():,} repeated mentions of the same publication")
+                valid = valid & ~repeated
+            df = df[~drop.to_numpy() & valid]
+            print(f"✓ Final dataset: {len(df):,} records\n")
+            return df
+
+    excluded = excluded_genera_mask(df, exclude_list=exclude_list) & ~drop
+    print(f"✓ Removed {excluded.sum():,} records from excluded genera: "
+          f"{', '.join(exclude_list)}")
+    drop |= excluded
+
+    generic = generic_species_mask(df) & ~drop
+    print(f"✓ Removed {generic.sum():,} non-specific species names")
+    drop |= generic
+
+    if deduplicate:
+        repeated = repeated_mentions(df, source) & ~drop.to_numpy()
+        print(f"✓ Removed {repeated.sum():,} repeated mentions of the same publication")
+        drop |= repeated
+
+    df = df[~drop]
+    print(f"✓ Final dataset: {len(df):,} records\n")
+    return df
+
+# ============================================================================
+# IMPROVED HOST PLANT EXTRACTION
+# ============================================================================
+
+# Comprehensive list of crop and plant names
+CROP_PLANTS = {
+    # Vegetables
+    'tomato', 'potato', 'pepper', 'eggplant', 'carrot', 'onion', 'garlic',
+    'lettuce', 'cucumber', 'cabbage', 'cauliflower', 'broccoli', 'spinach',
+    'radish', 'turnip', 'beet', 'beetroot', 'celery', 'asparagus',
+
+    # Cereals and grains
+    'wheat', 'rice', 'maize', 'corn', 'barley', 'oat', 'rye', 'sorghum',
+    'millet', 'triticale',
+
+    # Legumes
+    'soybean', 'soya', 'bean', 'pea', 'chickpea', 'lentil', 'peanut',
+    'groundnut', 'cowpea', 'pigeon pea', 'mung bean', 'faba bean',
+
+    # Industrial crops
+    'cotton', 'tobacco', 'sugarcane', 'sugar beet', 'rapeseed', 'canola',
+    'sunflower', 'safflower', 'sesame', 'flax', 'hemp', 'jute',
+
+    # Fruits
+    'banana', 'plantain', 'apple', 'pear', 'peach', 'plum', 'cherry',
+    'apricot', 'citrus', 'orange', 'lemon', 'grapefruit', 'grape',
+    'strawberry', 'raspberry', 'blueberry', 'pineapple', 'mango',
+    'papaya', 'avocado', 'fig', 'kiwi',
+
+    # Root crops
+    'cassava', 'yam', 'sweet potato', 'taro', 'ginger', 'turmeric',
+
+    # Forages
+    'alfalfa', 'clover', 'grass', 'ryegrass', 'fescue', 'timothy',
+
+    # Tree crops
+    'coffee', 'cacao', 'cocoa', 'tea', 'coconut', 'palm', 'rubber',
+    'olive', 'walnut', 'almond', 'hazelnut', 'pecan', 'cashew',
+
+    # Ornamentals
+    'rose', 'chrysanthemum', 'tulip', 'lily', 'orchid', 'carnation',
+
+    # Trees
+    'pine', 'oak', 'poplar', 'eucalyptus', 'acacia', 'willow', 'maple',
+}
+
+def extract_host_plants_improved(abstract):
+    """
+    Extract host plant names from abstract text with improved accuracy
+    Only extracts known crop/plant names, not random phrases
+    """
+    if pd.isna(abstract):
+        return []
+
+    import re
+
+    abstract_lower = str(abstract).lower()
+    hosts = []
+
+    # Extract known crop plants
+    for plant in CROP_PLANTS:
+        # Match whole word boundaries
+        pattern = r'\b' + re.escape(plant) + r'(?:es|s)?\b'
+        if re.search(pattern, abstract_lower):
+            hosts.append(plant.title())
+
+    # Extract scientific binomial names (but validate they look like plants)
+    # Pattern: Capitalized genus + lowercase species
+    binomial_pattern = r'\b([A-Z][a-z]{3,})\s+([a-z]{3,})\b'
+    binomials = re.findall(binomial_pattern, str(abstract))
+
+    # Common plant genera
+    plant_genera = {
+        'Solanum', 'Lycopersicon', 'Triticum', 'Oryza', 'Zea', 'Glycine',
+        'Nicotiana', 'Gossypium', 'Brassica', 'Lactuca', 'Cucumis', 'Citrus',
+        'Malus', 'Prunus', 'Vitis', 'Fragaria', 'Saccharum', 'Beta',
+        'Allium', 'Daucus', 'Pisum', 'Phaseolus', 'Vigna', 'Arachis',
+        'Coffea', 'Theobroma', 'Musa', 'Hordeum', 'Avena', 'Medicago',
+        'Trifolium', 'Pinus', 'Quercus', 'Populus', 'Eucalyptus',
+    }
+
+    for genus, species in binomials:
+        if genus in plant_genera:
+            hosts.append(f"{genus} {species}")
+
+    # Remove duplicates and return
+    return list(set(hosts))
+
+# ============================================================================
+# ENHANCED STATISTICAL FUNCTIONS
+# ============================================================================
+
+def calculate_confidence_interval(data, confidence=0.95, method='t',
+                                  n_resamples=2000, seed=42):
+    """
+    Calculate confidence interval for the mean of data
+    method='t' uses the t-distribution, method='bootstrap' a percentile
+    bootstrap (see resampling.bootstrap_group_stats for many groups at once)
+    """
+    from scipy import stats
+
+    data_clean = data.dropna()
+    if len(data_clean) < 2:
+        return None, None
+
+    if method == 'bootstrap':
+        from resampling import bootstrap_group_stats
+        ci = bootstrap_group_stats(data_clean, confidence=confidence,
+                                   n_resamples=n_resamples, seed=seed).iloc[0]
+        return ci['CI_Lower'], ci['CI_Upper']
+
+    mean = data_clean.mean()
+    se = stats.sem(data_clean)
+    ci = se * stats.t.ppf((1 + confidence) / 2., len(data_clean)-1)
+
+    return mean - ci, mean + ci
+
+def add_significance_bar(ax, x1, x2, y, p_value, height=0.05, orientation='vertical'):
+    """
+    Add significance bar to plot
+    x1, x2 are the bar positions being compared and y the value-axis level
+    of the bracket; use orientation='horizontal' for barh charts
+    p_value typically comes from resampling.permutation_test
+    """
+    # Determine significance level
+    if p_value < 0.001:
+        sig_text = '***'
+    elif p_value < 0.01:
+        sig_text = '**'
+    elif p_value < 0.05:
+        sig_text = '*'
+    else:
+        sig_text = 'ns'
+
+    # Draw bar
+    if orientation == 'horizontal':
+        ax.plot([y, y+height, y+height, y], [x1, x1, x2, x2], 'k-', linewidth=1)
+        ax.text(y+height, (x1+x2)/2, f' {sig_text}', ha='left', va='center', fontsize=8)
+    else:
+        ax.plot([x1, x1, x2, x2], [y, y+height, y+height, y], 'k-', linewidth=1)
+        ax.text((x1+x2)/2, y+height, sig_text, ha='center', va='bottom', fontsize=8)
+
+def calculate_growth_rate(years, values):
+    """
+    Calculate compound annual growth rate (CAGR)
+    """
+    if len(years) < 2 or len(values) < 2:
+        return None
+
+    years = np.array(years)
+    values = np.array(values)
+
+    # Filter out zeros and negatives
+    mask = values > 0
+    if mask.sum() < 2:
+        return None
+
+    years_clean = years[mask]
+    values_clean = values[mask]
+
+    n_years = years_clean[-1] - years_clean[0]
+    if n_years == 0:
+        return None
+
+    cagr = (values_clean[-1] / values_clean[0]) ** (1/n_years) - 1
+    return cagr * 100  # Return as percentage
+
+def detect_trend_change_points(years, values, min_segment_length=5):
+    """
+    Detect change points in time series using Bayesian changepoint detection
+    """
+    from scipy import stats
+
+    if len(years) < min_segment_length * 2:
+        return []
+
+    # Simple implementation: look for significant slope changes
+    changepoints = []
+
+    for i in range(min_segment_length, len(years) - min_segment_length):
+        # Fit line to before and after segments
+        before_slope, _, _, _, _ = stats.linregress(years[:i], values[:i])
+        after_slope, _, _, _, _ = stats.linregress(years[i:], values[i:])
+
+        # If slopes differ significantly, mark as changepoint
+        if abs(before_slope - after_slope) > 0.5:
+            changepoints.append(i)
+
+    return changepoints
+
+# ============================================================================
+# DATA PROCESSING FUNCTIONS
+# ============================================================================
+
+def process_count_field(df, count_col='Count'):
+    """
+    Process Count field - convert to numeric where possible
+    """
+    # Try to convert to numeric, set non-numeric to NaN
+    count_numeric = pd.to_numeric(df[count_col], errors='coerce')
+
+    # Fill NaN with 1 (assuming single mention if not specified)
+    return df.assign(count_numeric=count_numeric.fillna(1).astype(int))
+
+# Date layouts found in publication_date: each distinct value is classified
+# by pattern and every group is parsed in one call with explicit formats
+# (tried in order for the rows still unparsed). Slash dates are read day
+# first or month first for the whole column, whichever the values that
+# are unambiguous (a field above 12) point to.
+DATE_FORMATS = [
+    (r'\d{4}-\d{1,2}-\d{1,2}', ('%Y-%m-%d',)),
+    (r'\d{4}/\d{1,2}/\d{1,2}', ('%Y/%m/%d',)),
+    (r'\d{4}-\d{1,2}', ('%Y-%m',)),
+    (r'[A-Za-z]+ \d{1,2}, \d{4}', ('%B %d, %Y', '%b %d, %Y')),
+    (r'[A-Za-z]+ \d{1,2} \d{4}', ('%B %d %Y', '%b %d %Y')),
+    (r'\d{1,2} [A-Za-z]+ \d{4}', ('%d %B %Y', '%d %b %Y')),
+    (r'[A-Za-z]+ \d{4}', ('%B %Y', '%b %Y')),
+]
+SLASH_DATE = r'\d{1,2}[/.-]\d{1,2}[/.-]\d{4}'
+BARE_YEAR = r'\d{4}(?:\.0+)?'
+
+def dates_from_years(years):
+    """January 1st of each year (NaT where missing or out of range), built numerically"""
+    years = pd.to_numeric(pd.Series(years), errors='coerce')
+    valid = (years.between(1678, 2261) & (years % 1 == 0)).to_numpy()
+    dates = np.full(len(years), np.datetime64('NaT'), dtype='datetime64[ns]')
+    dates[valid] = (years[valid].to_numpy(dtype=np.int64) - 1970).astype('datetime64[Y]')
+    return pd.Series(dates, index=years.index)
+
+def _slash_formats(text):
+    fields = text.str.extract(r'^(\d+)[/.-](\d+)[/.-]\d{4}$').astype(float)
+    dayfirst = (fields[0] > 12).sum() >= (fields[1] > 12).sum()
+    order = ('%d', '%m') if dayfirst else ('%m', '%d')
+    return tuple(f'{order[0]}{sep}{order[1]}{sep}%Y' for sep in '/.-')
+
+def parse_publication_dates(values):
+    """
+    datetime64 Series for a column of dates in mixed layouts, parsed once
+    per distinct value; values matching no known layout go through
+    pandas' per-element inference, unparseable ones become NaT
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    # Only the date of timestamps is kept
+    text = text.str.replace(r'^(\d{4}-\d{1,2}-\d{1,2})[T ].*$', r'\1', regex=True)
+    parsed = pd.Series(np.datetime64('NaT'), index=text.index, dtype='datetime64[ns]')
+
+    years = text.str.fullmatch(BARE_YEAR)
+    parsed[years] = dates_from_years(text[years].str[:4])
+
+    slash = text.str.fullmatch(SLASH_DATE)
+    layouts = DATE_FORMATS + [(SLASH_DATE, _slash_formats(text[slash]) if slash.any() else ())]
+    for pattern, formats in layouts:
+        group = text.str.fullmatch(pattern) & parsed.isna()
+        for date_format in formats:
+            if not group.any():
+                break
+            parsed[group] = pd.to_datetime(text[group], format=date_format,
+                                           errors='coerce').astype('datetime64[ns]')
+            group &= parsed.isna()
+
+    rest = parsed.isna() & text.str.contains(r'\d{4}')
+    if rest.any():
+        parsed[rest] = pd.to_datetime(text[rest], format='mixed', errors='coerce').astype('datetime64[ns]')
+
+    # Code -1 (missing value) picks the trailing NaT
+    dates = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(dates, index=values.index, name=values.name)
+
+@profiled
+def standardize_publication_dates(df, source=None):
+    """
+    Standardize publication_date column to datetime
+    With `source` (the file df was loaded from, df's index holding source
+    row positions), the parsed column is read from the mention cache, so
+    dates are parsed only on the first load
+    """
+    if source is not None:
+        from mention_store import date_column
+        dates = date_column(source, 'publication_date', parse_publication_dates)
+        publication_date = pd.Series(dates[df.index.to_numpy()], index=df.index)
+    else:
+        publication_date = parse_publication_dates(df['publication_date'])
+
+    # If publication_date is missing, use pub_year to create date
+    mask = publication_date.isna()
+    if mask.any() and 'pub_year' in df.columns:
+        publication_date[mask] = dates_from_years(df.loc[mask, 'pub_year'])
+
+    return df.assign(publication_date=publication_date)
+
+def extract_country_from_factorials(row):
+    """
+    Extract country information from factorials column if country column is empty
+    """
+    if pd.notna(row.get('country')) and row.get('country') != '':
+        return row['country']
+
+    if pd.notna(row.get('factorials')):
+        parts = str(row['factorials']).split('=')
+        if len(parts) >= 10:
+            country_part = parts[9].strip()
+            if country_part and country_part != 'NA':
+                # Take first country if multiple
+                return country_part.split(';')[0].strip()
+
+    return None
+
+@profiled
+def standardize_countries(df):
+    """
+    Standardize country names and extract from all available columns
+
+    country_clean holds every listed country in canonical form (see
+    countries.py), '; '-separated; the factorials country field fills rows
+    without a country. Names are normalized once per distinct value.
+    """
+    from countries import normalize_countries
+
+    # Extract country from factorials if missing
+    if 'country' not in df.columns and 'factorials' not in df.columns:
+        return df
+
+    country = df['country'] if 'country' in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+    country = country.where(country != '')
+    if 'factorials' in df.columns:
+        # Field 10 of factorials; take first country if multiple
+        fields = df['factorials'].astype(object).where(df['factorials'].notna()).str.split('=')
+        from_factorials = fields.str[9].str.split(';').str[0].str.strip()
+        from_factorials = from_factorials.where(~from_factorials.isin(['', 'NA']))
+        country = country.fillna(from_factorials)
+
+    return df.assign(country_clean=normalize_countries(country))
+
+# ============================================================================
+# LOADING AND INITIALIZATION
+# ============================================================================
+
+# Long free-text columns: never loaded into the analysis frame by a
+# projected load, read on demand through a memory-mapped TextColumn
+TEXT_COLUMNS = ('abstract', 'text', 'factorials')
+
+@profiled
+def load_mention_table(filepath, columns=None):
+    """
+    Load a mention table (CSV or xlsx)
+    With `columns`, only those columns are read, through the columnar
+    cache next to the file (see mention_store); text columns in the list
+    are skipped, use load_text_column / with_text_column for them.
+    Without `columns` the whole file is read as before.
+    """
+    if columns is None:
+        if filepath.lower().endswith(('.xlsx', '.xls')):
+            return pd.read_excel(filepath, engine='openpyxl')
+        return pd.read_csv(filepath, low_memory=False)
+
+    from mention_store import load_columns
+    return load_columns(filepath, [c for c in columns if c not in TEXT_COLUMNS])
+
+@profiled
+def load_text_column(filepath, column):
+    """Lazily loaded, memory-mapped text column of a mention table"""
+    from mention_store import text_column
+    return text_column(filepath, column)
+
+@profiled
+def rows_with_text(df, texts):
+    """
+    Rows of df (loaded with load_mention_table, so its index holds source
+    row positions) that have a value in the TextColumn `texts`
+    """
+    return df[texts.notna()[df.index.to_numpy()]]
+
+def with_text_column(df, filepath, column, name=None):
+    """
+    rows_with_text for text column `column`, with that column materialized
+    as `name` (default: the column name)
+    """
+    texts = load_text_column(filepath, column)
+    df = rows_with_text(df, texts)
+    return df.assign(**{name or column: texts.take(df.index.to_numpy(), index=df.index)})
+
+def load_publication_ids(filepath):
+    """Canonical publication id per row of a mention table (see near_duplicates)"""
+    from mention_store import publication_ids
+    return publication_ids(filepath)
+
+@profiled
+def one_row_per_publication(df, filepath):
+    """
+    First row of each publication in df (loaded with load_mention_table),
+    for stages that count publications rather than taxon mentions
+    """
+    pub_ids = load_publication_ids(filepath)[df.index.to_numpy()]
+    return df[~pd.Series(pub_ids).duplicated().to_numpy()]
+
+@profiled
+def load_and_prepare_data(filepath, columns=None):
+    """
+    Load CSV and apply initial preparation
+    `columns` restricts loading to the columns an analysis needs (see
+    load_mention_table); preparation steps whose inputs were not loaded
+    are skipped
+    """
+    print(f"\nLoading data from: {filepath}")
+    df = load_mention_table(filepath, columns)
+    if columns is not None and 'factorials' in columns:
+        # Country extraction reads the factorials text
+        rows = df.index.to_numpy()
+        df = df.assign(factorials=load_text_column(filepath, 'factorials').take(rows, index=df.index))
+
+    # Apply standard processing
+    if 'publication_date' in df.columns:
+        df = standardize_publication_dates(df, source=filepath)
+    df = standardize_countries(df)
+    if 'Count' in df.columns:
+        df = process_count_field(df)
+
+    print(f"✓ Loaded {len(df):,} records")
+    if 'pub_year' in df.columns:
+        print(f"✓ Date range: {df['pub_year'].min()} - {df['pub_year'].max()}")
+    if 'Genus' in df.columns:
+        print(f"✓ Unique genera: {df['Genus'].nunique()}")
+    if 'Species' in df.columns:
+        print(f"✓ Unique species: {df['Species'].nunique()}")
+
+    return df
+
+# ============================================================================
+# REPORT GENERATION HELPERS
+# ============================================================================
+
+def create_summary_table(df, title="Summary Statistics"):
+    """Create a formatted summary statistics table"""
+    summary = {
+        'Total Records': f"{len(df):,}",
+        'Unique Genera': df['Genus'].nunique() if 'Genus' in df.columns else 'N/A',
+        'Unique Species': df['Species'].nunique() if 'Species' in df.columns else 'N/A',
+        'Date Range': f"{df['pub_year'].min()}-{df['pub_year'].max()}" if 'pub_year' in df.columns else 'N/A',
+        'Total Citations': f"{df['citations'].sum():,.0f}" if 'citations' in df.columns else 'N/A',
+        'Mean Citations': f"{df['citations'].mean():.1f}" if 'citations' in df.columns else 'N/A',
+    }
+    return pd.DataFrame([summary]).T.rename(columns={0: 'Value'})
+
+# ============================================================================
+# INITIALIZE ON IMPORT
+# ============================================================================
+
+# Set Nature-quality style when module is imported
+set_nature_style()
+
+print("\n" + "="*70)
+print("✓ IMPROVED Nematode Analysis Utilities Loaded")
+print("="*70)
+print("✓ Nature-quality publication style configured (600 DPI)")
+print("✓ Professional color scheme initialized (32 genera)")
+print("✓ Enhanced statistical functions available")
+print("✓ Improved host plant extraction with validated plant list")
+print("="*70 + "\n")
@@ -0,0 +1,208 @@
+"""
+Batch Runs
+The part reports for many corpus slices at once
+
+A batch takes slice definitions (a JSON file, see slices.py, or --by
+decade / --by region) and runs the part scripts once per (slice, part):
+1. the parent process runs the Setup stage of every part (the imports of
+   the analysis stack), switches mention_store to resident mode and loads
+   the base dataset once: columns, text columns and publication ids
+2. a fork-based pool of --jobs workers runs the (slice, part) tasks; the
+   children share the parent's loaded data and modules copy-on-write, so
+   no task parses the data file or imports the plotting stack again. Each
+   task gets a fresh child (maxtasksperchild=1), so figures, profiles and
+   output writers never carry over between tasks
+3. every task runs under a run context of its own (run_context.py):
+   output root <root>/<slice>/, the slice as subset, one worker (the
+   parallelism is the pool's); its output goes to <root>/<slice>/Logs/partN.log
+
+<root> is the output root of the run context, Slices/ in the track
+directory (--track) by default. <root>/batch_summary.csv lists every task
+with the slice's row count, its status and run time. Tasks are started
+largest slice first, so the pool stays busy until the end.
+
+Usage:
+    python batch.py run --slices slices.json [--parts 1 2 5] [--jobs 4] [--data CSV]
+    python batch.py run --by decade [--output-root runs/decades]
+    python batch.py list --by region
+"""
+
+import os
+import sys
+import ast
+import time
+import argparse
+import contextlib
+import traceback
+import multiprocessing
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from run_context import add_arguments, context_from_args, use_context
+from script_stages import ScriptStages, script_path
+
+PARTS = tuple(range(1, 8))
+SLICES_DIRNAME = 'Slices'
+SUMMARY_FILE = 'batch_summary.csv'
+
+def slice_dirname(name):
+    """Filesystem-safe directory name of a slice"""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(name))
+
+def batch_root(context):
+    return context.output_root or os.path.join(context.track_dir, SLICES_DIRNAME)
+
+# ============================================================================
+# PARENT: SHARED STATE
+# ============================================================================
+
+def prepare(parts, context):
+    """
+    Run the Setup stage of each part under `context` (imports, constants)
+    and load the base dataset resident; returns the data file
+    """
+    import mention_store
+    from analysis_utils_improved import TEXT_COLUMNS
+    use_context(context)
+    data_file = None
+    for part in parts:
+        script = ScriptStages(script_path(part))
+        setup = script.stages[0]
+        namespace = {'__name__': '__main__', '__file__': script.path}
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            exec(compile(ast.Module(body=setup.statements, type_ignores=[]), script.path, 'exec'),
+                 namespace)
+        data_file = data_file or namespace.get('DATA_FILE')
+    if not data_file:
+        raise ValueError("The part scripts define no DATA_FILE")
+    mention_store.keep_resident()
+    mention_store.warm(data_file, TEXT_COLUMNS)
+    return data_file
+
+# ============================================================================
+# CHILD: ONE TASK
+# ============================================================================
+
+def _run_task(task):
+    """Run one part on one slice (in a forked pool worker)"""
+    part, name, context = task
+    from analysis_utils_improved import flush_outputs
+    use_context(context)
+    os.makedirs(context.log_dir, exist_ok=True)
+    log_path = os.path.join(context.log_dir, f"part{part}.log")
+    started = time.perf_counter()
+    status = 'ok'
+    with open(log_path, 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            ScriptStages(script_path(part)).run()
+        except (Exception, SystemExit) as error:
+            traceback.print_exc()
+            status = f"{type(error).__name__}: {error}"
+            with contextlib.suppress(Exception):
+                flush_outputs()
+    return {'slice': name, 'part': part, 'status': status,
+            'seconds': round(time.perf_counter() - started, 2), 'log': log_path}
+
+# ============================================================================
+# BATCH
+# ============================================================================
+
+def slice_sizes(definitions, data_file):
+    from slices import slice_mask
+    return {d['name']: int(slice_mask(data_file, d).sum()) for d in definitions}
+
+def run_batch(definitions, parts, context, jobs, data_file=None):
+    """
+    Run `parts` for every slice; returns the summary DataFrame. data_file
+    is the result of prepare(parts, context) when the caller already ran it
+    """
+    import pandas as pd
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("Batch runs need the fork start method (Linux, macOS)")
+    root = batch_root(context)
+    if data_file is None:
+        data_file = prepare(parts, context)
+    sizes = slice_sizes(definitions, data_file)
+
+    print(f"Data file: {data_file}")
+    print(f"Output root: {root}")
+    for d in definitions:
+        print(f"  {d['name']:<24}{sizes[d['name']]:>10,} rows")
+    empty = [d['name'] for d in definitions if not sizes[d['name']]]
+    if empty:
+        print(f"⚠ Skipping empty slices: {', '.join(empty)}")
+
+    tasks = []
+    for d in sorted(definitions, key=lambda d: -sizes[d['name']]):
+        if not sizes[d['name']]:
+            continue
+        slice_context = context.replace(
+            data_file=data_file, output_root=os.path.join(root, slice_dirname(d['name'])),
+            name=d['name'], subset=d, workers=1)
+        tasks += [(part, d['name'], slice_context) for part in parts]
+
+    print(f"\nRunning {len(tasks)} tasks on {jobs} workers...")
+    started = time.perf_counter()
+    results = []
+    with multiprocessing.get_context('fork').Pool(jobs, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(_run_task, tasks):
+            results.append(result)
+            mark = '✓' if result['status'] == 'ok' else '✗'
+            print(f"{mark} {result['slice']} part{result['part']} ({result['seconds']:.1f}s)"
+                  + ('' if result['status'] == 'ok' else f" - {result['status']} ({result['log']})"))
+            sys.stdout.flush()
+
+    order = {d['name']: i for i, d in enumerate(definitions)}
+    summary = pd.DataFrame(results, columns=['slice', 'part', 'status', 'seconds', 'log'])
+    summary.insert(1, 'rows', summary['slice'].map(sizes))
+    summary = summary.sort_values(['slice', 'part'], key=lambda c: c.map(order) if c.name == 'slice' else c)
+    os.makedirs(root, exist_ok=True)
+    summary.to_csv(os.path.join(root, SUMMARY_FILE), index=False)
+    failed = int((summary['status'] != 'ok').sum())
+    print(f"\n{'✓' if not failed else '⚠'} {len(summary) - failed} of {len(summary)} tasks "
+          f"succeeded in {time.perf_counter() - started:.1f}s")
+    print(f"✓ Summary: {os.path.join(root, SUMMARY_FILE)}")
+    return summary
+
+def _definitions(args, data_file):
+    from slices import load_slices, decade_slices, region_slices
+    if args.slices:
+        return load_slices(args.slices)
+    if args.by == 'region':
+        return region_slices()
+    return decade_slices(data_file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the part reports for many corpus slices')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command, help_text in (('run', 'run the parts for every slice'),
+                               ('list', 'show the slices and their row counts')):
+        sub = commands.add_parser(command, help=help_text)
+        source = sub.add_mutually_exclusive_group(required=True)
+        source.add_argument('--slices', metavar='FILE', help='slice definitions (JSON, see slices.py)')
+        source.add_argument('--by', choices=('decade', 'region'), help='one slice per decade/region')
+        sub.add_argument('--parts', type=int, nargs='+', default=list(PARTS), choices=PARTS,
+                         metavar='N', help='parts to run (default: all)')
+        add_arguments(sub)
+        if command == 'run':
+            sub.add_argument('--jobs', type=int,
+                             help='parallel tasks (default: the context workers, else all CPUs)')
+    args = parser.parse_args()
+
+    try:
+        context = context_from_args(args)
+        data_file = prepare(args.parts if args.command == 'run' else args.parts[:1], context)
+        definitions = _definitions(args, data_file)
+        if args.command == 'list':
+            for name, rows in slice_sizes(definitions, data_file).items():
+                print(f"{name:<24}{rows:>10,} rows")
+            return
+        jobs = args.jobs or context.workers or os.cpu_count() or 1
+        summary = run_batch(definitions, args.parts, context, jobs, data_file)
+    except (KeyError, ValueError, OSError, RuntimeError) as error:
+        print(f"ERROR: {error.args[0] if error.args else error}")
+        sys.exit(2)
+    sys.exit(0 if (summary['status'] == 'ok').all() else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Checkpoints
+Stage-level checkpoint and resume for the part scripts
+
+A checkpointed run (dataanalyz.py run partN --checkpoint) saves, after every
+stage, the values that later stages read from it: the cleaned table after
+Load, the host table, the document-term matrix, forecast tables, fitted
+models, ... They go to <OUTPUT_DIR>/Checkpoints/:
+- manifest.json         one entry per completed stage: its key, the saved
+                        names, the files it wrote (path + size), run time
+- <Stage>.pkl           the saved values of that stage, one pickle
+                        (protocol 5, so DataFrames, arrays and sparse
+                        matrices are written as raw buffers)
+
+The key of a stage hashes the checkpoint version, the shared modules the
+script imported, the script's Setup statements, the fingerprint (size +
+mtime) of DATA_FILE, the corpus slice of the run context (if any), the
+stage's own statements and the keys of the stages it needs
+(script_stages). Editing a stage or its upstream stages, changing the data
+or a shared module changes the key.
+
+A resumed run (--resume) skips every stage whose manifest entry has the
+current key, holds every value the run needs of the stage, and whose files
+are all still on disk at the recorded size.
+Values of skipped stages are loaded only when a stage that does run reads
+them, so a run that failed in Fig5 restarts at Fig5 with the Load
+checkpoint instead of the CSV, and a run that completed does nothing but
+Setup and the final stage. The outputs of each checkpointed stage are
+flushed to disk before its entry is written.
+
+A value that cannot be pickled (a function defined in the script, an open
+handle) is not saved; a run that needs it runs its stage again.
+Checkpoints are pickles: only load directories written by this project.
+
+Usage:
+    python dataanalyz.py run part4 --checkpoint
+    python dataanalyz.py run part4 --resume
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import pickle
+import hashlib
+
+from analysis_utils_improved import OUTPUT_WRITER, flush_outputs
+from mention_store import source_fingerprint
+from run_context import current_context
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_DIRNAME = 'Checkpoints'
+MANIFEST_FILE = 'manifest.json'
+PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+def _digest(*parts):
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(str(part).encode('utf-8'))
+        sha.update(b'\0')
+    return sha.hexdigest()[:16]
+
+def _statements_digest(statements):
+    """Hash of statements that ignores their position in the file"""
+    return _digest(ast.dump(ast.Module(body=statements, type_ignores=[])))
+
+def library_digest():
+    """Hash of the source of every loaded module that lives next to this one"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha1()
+    paths = {os.path.abspath(module.__file__) for module in list(sys.modules.values())
+             if getattr(module, '__file__', None)
+             and os.path.dirname(os.path.abspath(module.__file__)) == here}
+    for path in sorted(paths):
+        if path.endswith('.py'):
+            with open(path, 'rb') as handle:
+                sha.update(handle.read())
+    return sha.hexdigest()[:16]
+
+def _filename(name):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class CheckpointStore:
+    """Checkpoint directory of one script: manifest plus one pickle per stage"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        try:
+            with open(self.manifest_path, encoding='utf-8') as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            manifest = None
+        if not manifest or manifest.get('version') != CHECKPOINT_VERSION:
+            manifest = {'version': CHECKPOINT_VERSION, 'stages': {}}
+        self.manifest = manifest
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{_filename(name)}.pkl")
+
+    def entry(self, name):
+        return self.manifest['stages'].get(name)
+
+    def valid(self, name, key, needed=()):
+        """
+        True when stage `name` has a complete checkpoint under `key` that
+        holds every name in `needed`
+        """
+        entry = self.entry(name)
+        if not entry or entry['key'] != key:
+            return False
+        if not set(needed) <= set(entry['names']) - set(entry['unsaved']):
+            return False
+        if not os.path.exists(self.path(name)):
+            return False
+        return all(os.path.exists(path) and os.path.getsize(path) == size
+                   for path, size in entry['outputs'].items())
+
+    def _write_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(self.manifest, handle, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _dump(self, values):
+        tmp_path = f"{self.path('_pending')}.tmp"
+        try:
+            with open(tmp_path, 'wb') as handle:
+                pickle.dump(values, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def save(self, name, key, values, outputs, seconds):
+        """
+        Write the checkpoint of stage `name`; returns the names whose values
+        could not be pickled (runs that need them do not restore the stage)
+        """
+        unsaved = []
+        try:
+            tmp_path = self._dump(values)
+        except PICKLE_ERRORS:
+            for value_name, value in values.items():
+                try:
+                    pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                except PICKLE_ERRORS:
+                    unsaved.append(value_name)
+            tmp_path = self._dump({k: v for k, v in values.items() if k not in unsaved})
+        os.replace(tmp_path, self.path(name))
+        self.manifest['stages'][name] = {
+            'key': key,
+            'names': sorted(values),
+            'unsaved': unsaved,
+            'outputs': {path: os.path.getsize(path) for path in outputs if os.path.exists(path)},
+            'seconds': round(seconds, 3),
+            'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self._write_manifest()
+        return unsaved
+
+    def load(self, name):
+        with open(self.path(name), 'rb') as handle:
+            return pickle.load(handle)
+
+    def prune(self, names):
+        """Drop entries and files of stages not in `names`"""
+        for name in list(self.manifest['stages']):
+            if name not in names:
+                del self.manifest['stages'][name]
+                if os.path.exists(self.path(name)):
+                    os.remove(self.path(name))
+        self._write_manifest()
+
+# ============================================================================
+# CHECKPOINTED RUN
+# ============================================================================
+
+class StageCheckpoints:
+    """
+    Checkpoint bookkeeping of one run of a ScriptStages selection, created
+    once Setup has run (it needs OUTPUT_DIR and DATA_FILE)
+    """
+
+    def __init__(self, script, selected, namespace, resume=False):
+        output_dir = namespace.get('OUTPUT_DIR')
+        if not output_dir:
+            raise ValueError(f"{os.path.basename(script.path)} defines no OUTPUT_DIR "
+                             f"to keep checkpoints in")
+        self.script = script
+        self.store = CheckpointStore(os.path.join(output_dir, CHECKPOINT_DIRNAME))
+        self.store.prune({stage.name for stage in script.stages})
+        self.final = selected[-1]
+        self._mark = len(OUTPUT_WRITER.saved)
+
+        data_file = namespace.get('DATA_FILE')
+        fingerprint = (source_fingerprint(data_file)
+                       if data_file and os.path.exists(data_file) else None)
+        subset = current_context().subset
+        stages = script.stages
+        self.keys = {selected[0]: _digest(CHECKPOINT_VERSION, library_digest(),
+                                          _statements_digest(stages[selected[0]].statements),
+                                          json.dumps(fingerprint, sort_keys=True),
+                                          json.dumps(subset, sort_keys=True))}
+        for i in selected[1:]:
+            upstream = [self.keys[j] for j in sorted(script.needs(i)) if j in self.keys]
+            self.keys[i] = _digest(self.keys[selected[0]],
+                                   _statements_digest(stages[i].statements), *upstream)
+
+        # What each stage saves: the names it assigns or modifies that any
+        # later stage of the script reads, so that a checkpoint written by a
+        # selective run (--only) also serves a later full run. What this
+        # selection needs of it is the part its later selected stages read
+        self.exports, self.needed = {}, {}
+        for i in selected[1:-1]:
+            produced = stages[i].binds | stages[i].mutates
+            later = set().union(*(stage.reads for stage in stages[i + 1:]))
+            self.exports[i] = produced & later
+            self.needed[i] = produced & set().union(
+                *(stages[k].reads for k in selected if k > i))
+
+        self.skipped = set()
+        if resume:
+            self.skipped = {i for i in selected[1:-1]
+                            if self.store.valid(stages[i].name, self.keys[i], self.needed[i])}
+        # Of a skipped stage, only the values a stage that runs reads are loaded
+        self.restore = {}
+        running = [k for k in selected if k not in self.skipped]
+        for i in self.skipped:
+            read_later = set().union(*(stages[k].reads for k in running if k > i))
+            if self.needed[i] & read_later:
+                self.restore[i] = self.needed[i] & read_later
+
+    def load(self, i, namespace):
+        """Bring the values of skipped stage i into namespace (if anything runs after it reads them)"""
+        from profiling import PROFILE
+        name = self.script.stages[i].name
+        entry = self.store.entry(name)
+        # Its files stay in the output manifest of the run (run_profile.json)
+        for path in entry['outputs']:
+            PROFILE.record_output(path, stage=name)
+        if i in self.restore:
+            PROFILE.stage(f"{name} (checkpoint)")
+            values = self.store.load(name)
+            restored = {k: v for k, v in values.items() if k in self.restore[i]}
+            missing = self.restore[i] - set(restored)
+            if missing:
+                raise ValueError(f"Checkpoint of {name} lacks {', '.join(sorted(missing))}; "
+                                 f"rerun without --resume")
+            namespace.update(restored)
+            print(f"✓ {name}: restored {', '.join(sorted(restored))} "
+                  f"from checkpoint of {entry['saved_at']}")
+        else:
+            print(f"✓ {name}: up to date (checkpoint of {entry['saved_at']})")
+
+    def save(self, i, namespace, seconds):
+        """Checkpoint stage i after it ran; its outputs are flushed first"""
+        if i not in self.exports:
+            return
+        flush_outputs()
+        outputs, self._mark = OUTPUT_WRITER.saved[self._mark:], len(OUTPUT_WRITER.saved)
+        name = self.script.stages[i].name
+        values = {k: namespace[k] for k in sorted(self.exports[i]) if k in namespace}
+        unsaved = self.store.save(name, self.keys[i], values, outputs, seconds)
+        if unsaved:
+            print(f"⚠ {name}: cannot pickle {', '.join(unsaved)}; "
+                  f"runs that need them rerun this stage")
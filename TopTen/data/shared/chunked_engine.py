@@ -0,0 +1,714 @@
+"""
+Chunked Aggregation Engine
+Bounded-memory aggregate tables for parts 1, 2, 3, 5 and 7
+
+The mention CSV is streamed in row groups (only the columns the requested
+aggregates need) and every row group is cleaned exactly like the part
+scripts clean the full table. Each aggregate folds a row group into a small
+mergeable partial, and partials are combined at the end:
+- Keyed counts / sums / min / max (KeyedAggregate), merged by re-reducing
+- Distinct counts, exact (distinct key pairs) or approximate (HyperLogLog
+  registers in DistinctSketch, merged by elementwise max)
+- Medians and quantiles, exact, from merged value histograms
+- h-index, exact, from per-author citation histograms
+
+Memory therefore grows with the number of distinct keys (years, genera,
+species, countries, authors, journals), never with the number of rows or
+the size of the text columns. Tables named after a script table (TableN_...)
+match the in-memory groupby results of the scripts; the others have no
+script counterpart. Bootstrap intervals and permutation p-values are
+resampling results that cannot be merged from partials, so part 3's
+citation metrics (Table2 with its CI and p-value columns in the script)
+are written without them as Genus_Citation_Metrics.
+
+The merged states are persisted as a cube in the source's mention cache
+(.mention_cache/<name>/cube.pkl); later runs on an unchanged source, and
+batches appended by ingest.py, reuse it instead of streaming again. Besides
+the per-part aggregates the cube always holds the query facts: records,
+citation sum and maximum per (year, genus, species, journal), and per
+(year, genus, species, journal, country), which query_service.py slices.
+
+Usage:
+    python chunked_engine.py [--parts 1 2 3 5 7] [--data FILE] [--output-root DIR]
+                             [--chunksize N] [--rebuild]
+Tables are written to <output-root>/PART_N_ANALYSIS/Tables/Chunked/
+"""
+
+import os
+import sys
+import argparse
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from analysis_utils_improved import (excluded_genera_mask, generic_species_mask,
+                                     extract_host_plants_improved, save_table,
+                                     flush_outputs)
+from mention_store import cache_dir_for, source_fingerprint, duplicate_mentions
+from publication_keys import key_columns, publication_keys
+from countries import collaboration_pairs, explode_countries
+from run_context import current_context, mention_table
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Buffered partials per aggregate before they are reduced into one frame
+COMPACT_EVERY = 8
+
+# Part 2 restricts the analysis to this publication window
+PART2_YEAR_RANGE = (1960, 2023)
+
+# Country columns of parts 1 and 5, in the order the scripts fall back
+PART1_COUNTRY_COLUMNS = ('country_clean', 'country')
+PART5_COUNTRY_COLUMNS = ('org_country', 'country')
+
+# Keys of the query facts; missing key values are stored as ''
+QUERY_KEYS = ['pub_year', 'Genus', 'Species', 'journal']
+QUERY_MEASURES = {'n': ('pub_year', 'size'), 'citations_sum': ('citations', 'sum'),
+                  'citations_max': ('citations', 'max')}
+
+CUBE_VERSION = 4
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+
+def source_columns(source):
+    """Column names of the source file, read from the header only"""
+    return pd.read_csv(source, nrows=0).columns.tolist()
+
+def clean_chunk(chunk, exclude_list=None):
+    """
+    Per-row-group version of the scripts' loading step: numeric year and
+    citations, rows without a year dropped, excluded genera and
+    non-specific species names removed
+    """
+    pub_year = pd.to_numeric(chunk['pub_year'], errors='coerce')
+    chunk = chunk.assign(
+        pub_year=pub_year,
+        citations=pd.to_numeric(chunk['citations'], errors='coerce').fillna(0))
+    drop = pub_year.isna()
+    drop |= excluded_genera_mask(chunk, exclude_list=exclude_list)
+    drop |= generic_species_mask(chunk)
+    chunk = chunk[~drop]
+    return chunk.assign(pub_year=chunk['pub_year'].astype(int))
+
+def iter_row_groups(source, columns=None, chunksize=DEFAULT_CHUNKSIZE, exclude_list=None):
+    """
+    Cleaned row groups of a mention CSV, reading only `columns` (plus the
+    ones cleaning needs); rows repeating a mention of the same publication
+    are dropped, as apply_analysis_filters does. The publication ids are
+    read from the mention cache (hashed once per source, then extended row
+    by row as ingest.py appends), so no text is read here once they exist
+    Yields (raw_rows, chunk) so callers can report progress on the source
+    """
+    usecols = None
+    if columns is not None:
+        wanted = set(columns) | {'pub_year', 'citations', 'Genus', 'Species'}
+        usecols = [column for column in source_columns(source) if column in wanted]
+
+    repeated = duplicate_mentions(source)
+    for raw in pd.read_csv(source, usecols=usecols, chunksize=chunksize):
+        # Row group indexes continue across groups, so they are source positions
+        yield len(raw), clean_chunk(raw[~repeated[raw.index.to_numpy()]], exclude_list=exclude_list)
+
+# ============================================================================
+# MERGEABLE PARTIAL AGGREGATES
+# ============================================================================
+
+# How a measure's partials combine
+_MERGE_REDUCERS = {'size': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+class KeyedAggregate:
+    """
+    Row counts and sum/min/max of value columns per key, built one row
+    group at a time
+
+    measures maps output name -> (column, 'size' | 'sum' | 'min' | 'max').
+    `prepare`, if given, turns a cleaned row group into the rows to
+    aggregate (a subset, or derived rows such as host or country pairs).
+    Partials are buffered and reduced every COMPACT_EVERY row groups.
+    """
+
+    def __init__(self, keys, measures, prepare=None):
+        self.keys = list(keys)
+        self.measures = dict(measures)
+        self.prepare = prepare
+        self._parts = []
+
+    def update(self, chunk):
+        if self.prepare is not None:
+            chunk = self.prepare(chunk)
+        if len(chunk) == 0:
+            return
+        partial = chunk.groupby(self.keys, sort=False).agg(**self.measures)
+        self._parts.append(partial)
+        if len(self._parts) >= COMPACT_EVERY:
+            self._compact()
+
+    def merge(self, other):
+        """Fold in the partials of another aggregate over the same keys"""
+        self._parts.extend(other._parts)
+        self._compact()
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            combined = pd.concat(self._parts)
+            reducers = {name: _MERGE_REDUCERS[how] for name, (_, how) in self.measures.items()}
+            self._parts = [combined.groupby(level=list(range(len(self.keys)))).agg(reducers)]
+
+    def result(self):
+        """Merged table, one row per key, sorted by key like groupby"""
+        self._compact()
+        if not self._parts:
+            return pd.DataFrame(columns=self.keys + list(self.measures))
+        return self._parts[0].sort_index().reset_index()
+
+    def load_state(self, table):
+        """Resume from a table previously returned by result()"""
+        self._parts = [table.set_index(self.keys)] if len(table) else []
+
+def counts(keys, prepare=None):
+    """KeyedAggregate of row counts (column n) per key"""
+    return KeyedAggregate(keys, {'n': (keys[0], 'size')}, prepare=prepare)
+
+class DistinctSketch:
+    """
+    HyperLogLog distinct-value counter (relative error ~1.04 / sqrt(2^p),
+    0.8% at the default precision, in 2^p bytes)
+    Sketches of the same precision merge by taking register maxima
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # Guard bit below the remaining bits bounds the rank at 64 - p + 1
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+
+        leading = np.zeros(len(rest), dtype=np.uint8)
+        for shift in (32, 16, 8, 4, 2, 1):
+            empty = rest <= (np.uint64(0xFFFFFFFFFFFFFFFF) >> np.uint64(shift))
+            leading[empty] += shift
+            rest[empty] <<= np.uint64(shift)
+        np.maximum.at(self.registers, index, leading + 1)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -self.registers.astype(int)).sum()
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))  # linear counting
+        return int(round(raw))
+
+# ============================================================================
+# FINALIZING PARTIALS
+# ============================================================================
+
+def histogram_quantiles(histogram, keys, value, q):
+    """
+    Exact quantile(s) per key from a merged value histogram (columns keys,
+    value, n), with pandas' linear interpolation
+    Returns a DataFrame with the keys and one column per q
+    """
+    qs = np.atleast_1d(q)
+    histogram = histogram.sort_values(keys + [value], kind='stable')
+    if keys:
+        totals = histogram.groupby(keys, sort=False)['n'].sum()
+        group_n = totals.to_numpy()
+        out = totals.index.to_frame(index=False)
+    else:
+        group_n = np.array([histogram['n'].sum()])
+        out = pd.DataFrame(index=[0])
+    offsets = np.concatenate([[0], np.cumsum(group_n)[:-1]])
+
+    cumulative = np.cumsum(histogram['n'].to_numpy())
+    values = histogram[value].to_numpy(dtype=float)
+
+    def value_at(rank):
+        return values[np.searchsorted(cumulative, offsets + rank, side='right')]
+
+    for quantile in qs:
+        position = (group_n - 1) * quantile
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low, high = value_at(lower), value_at(upper)
+        out[quantile] = low + (high - low) * (position - lower)
+    return out
+
+def histogram_h_index(histogram, key, value):
+    """
+    h-index per key from a merged citation histogram: the largest h such
+    that h papers have at least h citations each
+    """
+    ordered = histogram.sort_values([key, value], ascending=[True, False], kind='stable')
+    papers_at_least = ordered.groupby(key, sort=False)['n'].cumsum()
+    candidate = np.minimum(np.floor(ordered[value]), papers_at_least).clip(lower=0)
+    return candidate.groupby(ordered[key], sort=True).max().astype(int)
+
+def distinct_per_key(pairs, key):
+    """Number of distinct second-level values per key from a pair table"""
+    return pairs.groupby(key, sort=True).size()
+
+# ============================================================================
+# ROW PREPARATION
+# ============================================================================
+
+def _in_part2_window(chunk):
+    return chunk[chunk['pub_year'].between(*PART2_YEAR_RANGE)]
+
+def _host_rows(chunk):
+    """(Genus, Species, Host, Year) records, as in Part 1 Figure 4"""
+    chunk = chunk[chunk['abstract'].notna()]
+    hosts = chunk['abstract'].map(extract_host_plants_improved).explode().dropna()
+    rows = chunk.loc[hosts.index, ['Genus', 'Species', 'pub_year']]
+    return rows.assign(Host=hosts.to_numpy()).rename(columns={'pub_year': 'Year'})
+
+def _first_author_rows(chunk):
+    """(Author, Genus, Citations) records, as in Part 3 Figure 4"""
+    chunk = chunk[chunk['authors'].notna()]
+    first = chunk['authors'].astype(str).str.split(';').str[0].str.strip()
+    valid = first.str.len() > 2
+    return pd.DataFrame({'Author': first[valid], 'Genus': chunk['Genus'][valid],
+                         'Citations': chunk['citations'][valid]})
+
+def _country_rows(chunk, country_columns):
+    """One record per listed (canonical) country, as in Part 1 Figure 5 and Part 5 Figure 1"""
+    return explode_countries(chunk, country_columns)
+
+def _collaboration_rows(chunk, country_columns):
+    """(Country1, Country2) pairs of multi-country papers, as in Part 5 Figure 2"""
+    return collaboration_pairs(chunk, country_columns, max_countries=5)
+
+def _query_rows(chunk, country_columns=None):
+    """
+    Query fact records: the key columns with missing values as '', and with
+    country_columns one record per listed country, as in Part 1 Figure 5
+    """
+    if country_columns is not None:
+        chunk = explode_countries(chunk, country_columns)
+    keys = QUERY_KEYS + (['Country'] if country_columns is not None else [])
+    rows = pd.DataFrame({key: (chunk[key].astype(object).where(chunk[key].notna(), '')
+                               if key in chunk.columns else '')
+                         for key in keys if key != 'pub_year'}, index=chunk.index)
+    return rows.assign(pub_year=chunk['pub_year'], citations=chunk['citations'])
+
+# ============================================================================
+# PER-PART AGGREGATE SPECIFICATIONS
+# ============================================================================
+
+def _country_aggregates(name, country_columns):
+    """Per-country publication, citation, genus and species aggregates"""
+    prepare = partial(_country_rows, country_columns=country_columns)
+    return {name: KeyedAggregate(['Country'], {'n': ('pub_year', 'size'),
+                                               'citations_sum': ('citations', 'sum')},
+                                 prepare=prepare),
+            f'{name}_genus': counts(['Country', 'Genus'], prepare=prepare),
+            f'{name}_species': counts(['Country', 'Species'], prepare=prepare)}
+
+def build_aggregates(parts, columns):
+    """
+    Aggregates needed by the requested parts, keyed by name, plus the
+    source columns they read
+    """
+    aggregates, needed = {}, set()
+    stats = {'n': ('pub_year', 'size'), 'citations_sum': ('citations', 'sum'),
+             'first_year': ('pub_year', 'min'), 'last_year': ('pub_year', 'max')}
+
+    if parts & {1, 7}:
+        aggregates['genus'] = KeyedAggregate(['Genus'], stats)
+        aggregates['genus_species'] = counts(['Genus', 'Species'])
+    if 1 in parts:
+        aggregates['year_species'] = counts(['pub_year', 'Species'])
+        aggregates['hosts'] = counts(['Genus', 'Host'], prepare=_host_rows)
+        needed.add('abstract')
+        country_1 = [c for c in PART1_COUNTRY_COLUMNS if c in columns]
+        if country_1:
+            aggregates.update(_country_aggregates('country_1', country_1))
+            needed.update(country_1)
+    if 2 in parts:
+        aggregates['year_genus_2'] = counts(['pub_year', 'Genus'], prepare=_in_part2_window)
+    if parts & {3, 7}:
+        aggregates['genus_citation_hist'] = counts(['Genus', 'citations'])
+    if 3 in parts:
+        aggregates['genus'] = KeyedAggregate(['Genus'], stats)
+        aggregates['citation_hist'] = counts(['citations'])
+        aggregates['author'] = KeyedAggregate(['Author'], {
+            'n': ('Citations', 'size'), 'citations_sum': ('Citations', 'sum')},
+            prepare=_first_author_rows)
+        aggregates['author_genus'] = counts(['Author', 'Genus'], prepare=_first_author_rows)
+        aggregates['author_citation_hist'] = counts(['Author', 'Citations'],
+                                                    prepare=_first_author_rows)
+        needed |= {'authors', 'journal'}
+        if 'journal' in columns:
+            aggregates['journal'] = KeyedAggregate(['journal'], {
+                'n': ('pub_year', 'size'), 'citations_sum': ('citations', 'sum')})
+            aggregates['journal_genus'] = counts(['journal', 'Genus'])
+    # Query facts, for every cube
+    aggregates['query'] = KeyedAggregate(QUERY_KEYS, QUERY_MEASURES, prepare=_query_rows)
+    needed.add('journal')
+    country_1 = [c for c in PART1_COUNTRY_COLUMNS if c in columns]
+    if country_1:
+        aggregates['query_country'] = KeyedAggregate(
+            QUERY_KEYS + ['Country'], QUERY_MEASURES,
+            prepare=partial(_query_rows, country_columns=country_1))
+        needed.update(country_1)
+
+    country_5 = [c for c in PART5_COUNTRY_COLUMNS if c in columns]
+    if 5 in parts and country_5:
+        aggregates.update(_country_aggregates('country_5', country_5))
+        aggregates['collaborations'] = counts(['Country1', 'Country2'],
+                                              prepare=partial(_collaboration_rows,
+                                                              country_columns=country_5))
+        needed.update(country_5)
+
+    return aggregates, needed & set(columns)
+
+# ============================================================================
+# TABLES
+# ============================================================================
+
+def _genus_base(aggregates):
+    """Per-genus N_Species, N_Publications, years and mean citations"""
+    genus = aggregates['genus'].result().set_index('Genus')
+    genus['N_Species'] = distinct_per_key(aggregates['genus_species'].result(), 'Genus')
+    genus['Mean_Citations'] = genus['citations_sum'] / genus['n']
+    return genus
+
+def _keyed_stats(aggregates, name, key):
+    """Per-key N_Genera, N_Species, N_Publications and mean citations"""
+    stats = aggregates[name].result().set_index(key)
+    out = pd.DataFrame({
+        'N_Genera': distinct_per_key(aggregates[f'{name}_genus'].result(), key),
+        'N_Species': distinct_per_key(aggregates[f'{name}_species'].result(), key),
+        'N_Publications': stats['n'],
+        'Mean_Citations': stats['citations_sum'] / stats['n'],
+        'Total_Citations': stats['citations_sum'],
+    })
+    return out.rename_axis('Country').reset_index()
+
+def part1_tables(aggregates):
+    tables = {}
+
+    year_species = aggregates['year_species'].result()
+    species_by_year = year_species.groupby('pub_year').size().reset_index()
+    species_by_year.columns = ['Year', 'New_Species']
+    species_by_year['Cumulative_Species'] = species_by_year['New_Species'].cumsum()
+    species_by_year['MA_5yr'] = species_by_year['New_Species'].rolling(window=5, center=True).mean()
+    tables['Table1_Species_Discovery_Rates'] = species_by_year
+
+    genus = _genus_base(aggregates).reset_index()
+    genus_stats = pd.DataFrame({
+        'Genus': genus['Genus'], 'N_Species': genus['N_Species'],
+        'N_Publications': genus['n'], 'First_Year': genus['first_year'],
+        'Last_Year': genus['last_year'], 'Mean_Citations': genus['Mean_Citations']})
+    genus_stats['Years_Studied'] = genus_stats['Last_Year'] - genus_stats['First_Year']
+    genus_stats['Publications_Per_Species'] = genus_stats['N_Publications'] / genus_stats['N_Species']
+    tables['Table2_Genus_Taxonomic_Stats'] = genus_stats.sort_values('N_Species', ascending=False).head(20)
+
+    hosts = aggregates['hosts'].result()
+    if len(hosts):
+        tables['Table4_Genus_Host_Counts'] = hosts.rename(columns={'n': 'Count'})
+
+    if 'country_1' in aggregates:
+        country_stats = _keyed_stats(aggregates, 'country_1', aggregates['country_1'].keys[0])
+        country_stats = country_stats.drop(columns='Total_Citations')
+        tables['Table5_Country_Statistics'] = \
+            country_stats.sort_values('N_Publications', ascending=False).head(25)
+
+    genus_publications = pd.DataFrame({
+        'Genus': genus['Genus'], 'N_Publications': genus['n'],
+        'N_Species': genus['N_Species'], 'Mean_Citations': genus['Mean_Citations']})
+    genus_publications['Bias_Ratio'] = \
+        genus_publications['N_Publications'] / genus_publications['N_Publications'].mean()
+    genus_publications['Publications_Per_Species'] = \
+        genus_publications['N_Publications'] / genus_publications['N_Species']
+    genus_publications['Bias_Category'] = pd.cut(
+        genus_publications['Bias_Ratio'], [-np.inf, 0.25, 0.75, 1.5, np.inf], right=False,
+        labels=['Severely Understudied', 'Understudied', 'Adequately Studied', 'Overstudied']
+    ).astype(str)
+    tables['Table6_Research_Bias_Metrics'] = genus_publications
+    return tables
+
+def part2_tables(aggregates):
+    year_genus = aggregates['year_genus_2'].result().rename(columns={'n': 'Count'})
+    genus_totals = year_genus.groupby('Genus')['Count'].sum().sort_values(ascending=False, kind='stable')
+    top_genera = genus_totals.head(10).index
+
+    decades = year_genus[year_genus['Genus'].isin(top_genera[:8])]
+    decades = decades.assign(Decade=(decades['pub_year'] // 10) * 10)
+    decade_pivot = decades.groupby(['Decade', 'Genus'])['Count'].sum().unstack(fill_value=0)
+
+    return {
+        'Table1_Genus_Temporal_Trends': year_genus[year_genus['Genus'].isin(top_genera)],
+        'Table4_Decade_Trends': decade_pivot.astype(float),
+    }
+
+def part3_tables(aggregates):
+    tables = {}
+
+    percentiles = histogram_quantiles(aggregates['citation_hist'].result(), [], 'citations',
+                                      [0.5, 0.75, 0.90, 0.95, 0.99])
+    tables['Citation_Percentiles'] = percentiles.melt(var_name='Percentile',
+                                                      value_name='Citations')
+
+    genus = _genus_base(aggregates)
+    medians = histogram_quantiles(aggregates['genus_citation_hist'].result(), ['Genus'],
+                                  'citations', 0.5).set_index('Genus')[0.5]
+    genus_citations = pd.DataFrame({
+        'Total_Citations': genus['citations_sum'], 'Mean_Citations': genus['Mean_Citations'],
+        'Median_Citations': medians, 'N_Papers': genus['n'],
+        'First_Year': genus['first_year'], 'Last_Year': genus['last_year']}).reset_index()
+    genus_citations['Citations_Per_Year'] = genus_citations['Total_Citations'] / \
+        (genus_citations['Last_Year'] - genus_citations['First_Year'] + 1)
+    # Table2 of the script, without its resampling columns (see module docstring)
+    tables['Genus_Citation_Metrics'] = genus_citations
+
+    author = aggregates['author'].result()
+    if len(author):
+        author = author.set_index('Author')
+        author_metrics = pd.DataFrame({
+            'Total_Citations': author['citations_sum'],
+            'Mean_Citations': author['citations_sum'] / author['n'],
+            'N_Papers': author['n'],
+            'N_Genera': distinct_per_key(aggregates['author_genus'].result(), 'Author'),
+            'H_Index': histogram_h_index(aggregates['author_citation_hist'].result(),
+                                         'Author', 'Citations'),
+        }).reset_index()
+        tables['Table3_Author_Metrics'] = author_metrics
+
+    if 'journal' in aggregates:
+        journal = aggregates['journal'].result().set_index('journal')
+        journal_metrics = pd.DataFrame({
+            'Total_Citations': journal['citations_sum'],
+            'Mean_Citations': journal['citations_sum'] / journal['n'],
+            'N_Papers': journal['n'],
+            'N_Genera': distinct_per_key(aggregates['journal_genus'].result(), 'journal'),
+        }).rename_axis('Journal').reset_index()
+        if len(journal_metrics):
+            tables['Table4_Journal_Metrics'] = journal_metrics
+    return tables
+
+def part5_tables(aggregates):
+    tables = {}
+    if 'country_5' not in aggregates:
+        return tables
+
+    country_stats = _keyed_stats(aggregates, 'country_5', aggregates['country_5'].keys[0])
+    country_stats['Citations_Per_Paper'] = country_stats['Total_Citations'] / country_stats['N_Publications']
+    tables['Table1_Country_Statistics'] = country_stats
+
+    collab_counts = aggregates['collaborations'].result().rename(columns={'n': 'Count'})
+    collab_counts = collab_counts[collab_counts['Count'] >= 3]
+    if len(collab_counts):
+        tables['Table2_Collaboration_Pairs'] = collab_counts
+    return tables
+
+def part7_tables(aggregates):
+    genus = _genus_base(aggregates)
+    medians = histogram_quantiles(aggregates['genus_citation_hist'].result(), ['Genus'],
+                                  'citations', 0.5).set_index('Genus')[0.5]
+    genus_features = pd.DataFrame({
+        'N_Species': genus['N_Species'], 'N_Papers': genus['n'],
+        'First_Year': genus['first_year'], 'Last_Year': genus['last_year'],
+        'Mean_Cit': genus['Mean_Citations'], 'Median_Cit': medians,
+        'Total_Cit': genus['citations_sum']}).reset_index()
+    genus_features['Years_Span'] = genus_features['Last_Year'] - genus_features['First_Year'] + 1
+    genus_features['Papers_Per_Year'] = genus_features['N_Papers'] / genus_features['Years_Span']
+    genus_features['Citations_Per_Paper'] = genus_features['Total_Cit'] / genus_features['N_Papers']
+    return {'Genus_Features': genus_features}
+
+PART_TABLES = {1: part1_tables, 2: part2_tables, 3: part3_tables,
+               5: part5_tables, 7: part7_tables}
+
+def high_impact_papers(source, threshold, chunksize=DEFAULT_CHUNKSIZE, exclude_list=None):
+    """
+    Part 3 Table 1 (papers at or above the 95th citation percentile), from a
+    second streaming pass once the percentile is known
+    """
+    columns = ['title', 'authors', 'pub_year', 'journal', 'citations', 'Genus', 'Species']
+    columns = [column for column in columns if column in source_columns(source)]
+    selected = [chunk.loc[chunk['citations'] >= threshold, columns]
+                for _, chunk in iter_row_groups(source, columns, chunksize, exclude_list)]
+    return pd.concat(selected).sort_values('citations', ascending=False)
+
+def corpus_summary(source=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Record count, distinct genera and species, year range and approximate
+    distinct titles of the raw (uncleaned) source (default: the run
+    context's mention table), in one streaming pass
+    """
+    source = mention_table(source)
+    columns = [c for c in ('pub_year', 'Genus', 'Species', 'title') if c in source_columns(source)]
+    genera, species = set(), set()
+    titles = DistinctSketch()
+    n_records, first_year, last_year = 0, np.inf, -np.inf
+
+    for raw in pd.read_csv(source, usecols=columns, chunksize=chunksize):
+        n_records += len(raw)
+        if 'Genus' in raw.columns:
+            genera.update(raw['Genus'].dropna().unique())
+        if 'Species' in raw.columns:
+            species.update(raw['Species'].dropna().unique())
+        if 'title' in raw.columns:
+            titles.update(raw['title'])
+        if 'pub_year' in raw.columns:
+            years = pd.to_numeric(raw['pub_year'], errors='coerce')
+            first_year = min(first_year, years.min())
+            last_year = max(last_year, years.max())
+
+    return {'n_records': n_records,
+            'n_genera': len(genera) if 'Genus' in columns else None,
+            'n_species': len(species) if 'Species' in columns else None,
+            'first_year': first_year, 'last_year': last_year,
+            'n_titles_approx': titles.estimate() if 'title' in columns else None}
+
+# ============================================================================
+# DRIVER
+# ============================================================================
+
+def build_sketches(columns):
+    """Distinct-count sketches kept alongside the aggregates, plus their source columns"""
+    return {'publications': DistinctSketch()}, set(key_columns(columns))
+
+def update_sketches(sketches, chunk):
+    sketches['publications'].update(publication_keys(chunk))
+
+# ============================================================================
+# PERSISTED CUBE
+# ============================================================================
+
+def _cube_path(source):
+    return os.path.join(cache_dir_for(source), 'cube.pkl')
+
+def save_cube(source, parts, aggregates, sketches):
+    """
+    Persist the merged aggregate states and sketch registers (the cube)
+    next to the source's mention cache, tied to the current source
+    fingerprint
+    """
+    path = _cube_path(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.to_pickle({'version': CUBE_VERSION, 'source': source_fingerprint(source),
+                  'parts': sorted(parts),
+                  'states': {name: aggregate.result() for name, aggregate in aggregates.items()},
+                  'sketches': {name: sketch.registers for name, sketch in sketches.items()}},
+                 f"{path}.{os.getpid()}.tmp")
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+def load_cube(source, parts=None):
+    """
+    (parts, aggregates, sketches) restored from the cube, or None when
+    there is no cube for the current source or it lacks some of `parts`
+    """
+    path = _cube_path(source)
+    try:
+        payload = pd.read_pickle(path)
+    except (OSError, ValueError, EOFError):
+        return None
+    if (payload.get('version') != CUBE_VERSION
+            or payload.get('source') != source_fingerprint(source)
+            or (parts is not None and not set(parts) <= set(payload['parts']))):
+        return None
+
+    columns = source_columns(source)
+    aggregates, _ = build_aggregates(set(payload['parts']), columns)
+    for name, aggregate in aggregates.items():
+        aggregate.load_state(payload['states'][name])
+    sketches, _ = build_sketches(columns)
+    for name, sketch in sketches.items():
+        sketch.registers = payload['sketches'][name]
+    return set(payload['parts']), aggregates, sketches
+
+# ============================================================================
+# DRIVER
+# ============================================================================
+
+def cube_aggregates(source=None, parts=(1, 2, 3, 5, 7), chunksize=DEFAULT_CHUNKSIZE,
+                    exclude_list=None, use_cube=True):
+    """
+    (aggregates, sketches) for `parts`, from the persisted cube when it is
+    current for `source` (default: the run context's mention table);
+    otherwise the source is streamed once and, for the default filters,
+    the cube is saved for the next run
+    """
+    source = mention_table(source)
+    parts = set(parts)
+    cube = load_cube(source, parts) if use_cube and exclude_list is None else None
+    if cube is not None:
+        _, aggregates, sketches = cube
+        print(f"\n✓ Aggregates loaded from the cube for {source}")
+    else:
+        columns = source_columns(source)
+        aggregates, needed = build_aggregates(parts, columns)
+        sketches, sketch_columns = build_sketches(columns)
+
+        print(f"\nStreaming {source} in row groups of {chunksize:,} rows...")
+        rows_read = rows_kept = 0
+        for raw_rows, chunk in iter_row_groups(source, needed | sketch_columns, chunksize,
+                                               exclude_list):
+            for aggregate in aggregates.values():
+                aggregate.update(chunk)
+            update_sketches(sketches, chunk)
+            rows_read += raw_rows
+            rows_kept += len(chunk)
+            print(f"  {rows_read:,} rows read, {rows_kept:,} kept", end='\r')
+        print(f"\n✓ Aggregated {rows_kept:,} of {rows_read:,} records")
+        if use_cube and exclude_list is None:
+            save_cube(source, parts, aggregates, sketches)
+    return aggregates, sketches
+
+def run_chunked(source=None, parts=(1, 2, 3, 5, 7), chunksize=DEFAULT_CHUNKSIZE,
+                exclude_list=None, use_cube=True):
+    """Return {part: {table_name: DataFrame}} (see cube_aggregates)"""
+    source = mention_table(source)
+    parts = set(parts)
+    aggregates, sketches = cube_aggregates(source, parts, chunksize, exclude_list, use_cube)
+    print(f"✓ Distinct publications (approx.): {sketches['publications'].estimate():,}")
+
+    results = {part: PART_TABLES[part](aggregates) for part in sorted(parts)}
+    if 3 in parts:
+        threshold = results[3]['Citation_Percentiles'].set_index('Percentile')['Citations'][0.95]
+        results[3]['Table1_High_Impact_Papers'] = high_impact_papers(
+            source, threshold, chunksize, exclude_list)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--data', help='mention CSV (default: the run context\'s)')
+    parser.add_argument('--output-root',
+                        help='directory holding the PART_N_ANALYSIS folders '
+                             '(default: the run context\'s)')
+    parser.add_argument('--parts', type=int, nargs='+', default=sorted(PART_TABLES),
+                        choices=sorted(PART_TABLES))
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--rebuild', action='store_true',
+                        help='ignore the persisted cube and stream the source again')
+    args = parser.parse_args()
+
+    results = run_chunked(args.data, args.parts, args.chunksize, use_cube=not args.rebuild)
+    context = current_context()
+    for part, tables in results.items():
+        table_dir = os.path.join(args.output_root or context.root,
+                                 f'PART_{part}_ANALYSIS', 'Tables', 'Chunked')
+        os.makedirs(table_dir, exist_ok=True)
+        for name, table in tables.items():
+            keep_index = name == 'Table4_Decade_Trends'
+            save_table(table, f'{table_dir}/{name}.csv', index=keep_index)
+        print(f"✓ Part {part}: {len(tables)} tables -> {table_dir}")
+    flush_outputs()
+
+if __name__ == '__main__':
+    main()
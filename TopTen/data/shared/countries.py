@@ -0,0 +1,384 @@
+"""
+Country Normalization
+Alias table for country names (ISO 3166 names and codes plus common
+variants), region membership, and multi-country string handling
+
+Country fields hold one name or several separated by ';', ',' or '|'
+("The Netherlands; United States"). Fields are split on ';' and '|'
+first; a comma splits only outside inverted ISO names ("Korea, Republic
+of"). NA, N/A and empty fields hold no country. Every function here
+works on the distinct values of a column: a value is split, each part is
+looked up in the alias table once, and the result is broadcast back to
+rows through the column's factorize codes.
+
+Names missing from the table are kept as written (trimmed); they simply
+have no region ('Other').
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Region names used by the figures, in the order regions are reported
+REGIONS = ['North America', 'Europe', 'Asia', 'South America', 'Africa', 'Oceania']
+REGION_CATEGORIES = REGIONS + ['Other', 'Unknown']
+
+_REGION_CODES = {'NA': 'North America', 'EU': 'Europe', 'AS': 'Asia',
+                 'SA': 'South America', 'AF': 'Africa', 'OC': 'Oceania', '--': 'Other'}
+
+# canonical name | ISO alpha-2 | ISO alpha-3 | region | other names (';')
+# Canonical names follow the short forms the analyses already report
+# (USA, UK, Netherlands)
+_COUNTRY_TABLE = """
+Afghanistan|AF|AFG|AS|
+Albania|AL|ALB|EU|
+Algeria|DZ|DZA|AF|
+Andorra|AD|AND|EU|
+Angola|AO|AGO|AF|
+Antigua and Barbuda|AG|ATG|NA|
+Argentina|AR|ARG|SA|
+Armenia|AM|ARM|AS|
+Australia|AU|AUS|OC|
+Austria|AT|AUT|EU|
+Azerbaijan|AZ|AZE|AS|
+Bahamas|BS|BHS|NA|The Bahamas
+Bahrain|BH|BHR|AS|
+Bangladesh|BD|BGD|AS|
+Barbados|BB|BRB|NA|
+Belarus|BY|BLR|EU|
+Belgium|BE|BEL|EU|
+Belize|BZ|BLZ|NA|
+Benin|BJ|BEN|AF|
+Bhutan|BT|BTN|AS|
+Bolivia|BO|BOL|SA|Plurinational State of Bolivia;Bolivia, Plurinational State of
+Bosnia and Herzegovina|BA|BIH|EU|Bosnia
+Botswana|BW|BWA|AF|
+Brazil|BR|BRA|SA|Brasil
+Brunei|BN|BRN|AS|Brunei Darussalam
+Bulgaria|BG|BGR|EU|
+Burkina Faso|BF|BFA|AF|
+Burundi|BI|BDI|AF|
+Cabo Verde|CV|CPV|AF|Cape Verde
+Cambodia|KH|KHM|AS|
+Cameroon|CM|CMR|AF|
+Canada|CA|CAN|NA|
+Central African Republic|CF|CAF|AF|
+Chad|TD|TCD|AF|
+Chile|CL|CHL|SA|
+China|CN|CHN|AS|People's Republic of China;PR China;P.R. China;Mainland China
+Colombia|CO|COL|SA|
+Comoros|KM|COM|AF|
+Congo|CG|COG|AF|Republic of the Congo;Congo-Brazzaville
+Costa Rica|CR|CRI|NA|
+Cote d'Ivoire|CI|CIV|AF|Côte d'Ivoire;Ivory Coast
+Croatia|HR|HRV|EU|
+Cuba|CU|CUB|NA|
+Cyprus|CY|CYP|EU|
+Czech Republic|CZ|CZE|EU|Czechia
+Democratic Republic of the Congo|CD|COD|AF|DR Congo;DRC;Congo, Democratic Republic of the;Congo-Kinshasa;Zaire
+Denmark|DK|DNK|EU|
+Djibouti|DJ|DJI|AF|
+Dominica|DM|DMA|NA|
+Dominican Republic|DO|DOM|NA|
+Ecuador|EC|ECU|SA|
+Egypt|EG|EGY|AF|
+El Salvador|SV|SLV|NA|
+Equatorial Guinea|GQ|GNQ|AF|
+Eritrea|ER|ERI|AF|
+Estonia|EE|EST|EU|
+Eswatini|SZ|SWZ|AF|Swaziland
+Ethiopia|ET|ETH|AF|
+Fiji|FJ|FJI|OC|
+Finland|FI|FIN|EU|
+France|FR|FRA|EU|
+French Guiana|GF|GUF|SA|
+French Polynesia|PF|PYF|OC|
+Gabon|GA|GAB|AF|
+Gambia|GM|GMB|AF|The Gambia
+Georgia|GE|GEO|AS|
+Germany|DE|DEU|EU|Federal Republic of Germany
+Ghana|GH|GHA|AF|
+Greece|GR|GRC|EU|
+Grenada|GD|GRD|NA|
+Guadeloupe|GP|GLP|NA|
+Guatemala|GT|GTM|NA|
+Guinea|GN|GIN|AF|
+Guinea-Bissau|GW|GNB|AF|
+Guyana|GY|GUY|SA|
+Haiti|HT|HTI|NA|
+Honduras|HN|HND|NA|
+Hong Kong|HK|HKG|AS|Hong Kong SAR;Hong Kong, China
+Hungary|HU|HUN|EU|
+Iceland|IS|ISL|EU|
+India|IN|IND|AS|
+Indonesia|ID|IDN|AS|
+Iran|IR|IRN|AS|Islamic Republic of Iran;Iran, Islamic Republic of
+Iraq|IQ|IRQ|AS|
+Ireland|IE|IRL|EU|Republic of Ireland
+Israel|IL|ISR|AS|
+Italy|IT|ITA|EU|
+Jamaica|JM|JAM|NA|
+Japan|JP|JPN|AS|
+Jordan|JO|JOR|AS|
+Kazakhstan|KZ|KAZ|AS|
+Kenya|KE|KEN|AF|
+Kiribati|KI|KIR|OC|
+Kosovo|XK|XKX|EU|
+Kuwait|KW|KWT|AS|
+Kyrgyzstan|KG|KGZ|AS|
+Laos|LA|LAO|AS|Lao PDR;Lao People's Democratic Republic
+Latvia|LV|LVA|EU|
+Lebanon|LB|LBN|AS|
+Lesotho|LS|LSO|AF|
+Liberia|LR|LBR|AF|
+Libya|LY|LBY|AF|
+Liechtenstein|LI|LIE|EU|
+Lithuania|LT|LTU|EU|
+Luxembourg|LU|LUX|EU|
+Macau|MO|MAC|AS|Macao
+Madagascar|MG|MDG|AF|
+Malawi|MW|MWI|AF|
+Malaysia|MY|MYS|AS|
+Maldives|MV|MDV|AS|
+Mali|ML|MLI|AF|
+Malta|MT|MLT|EU|
+Martinique|MQ|MTQ|NA|
+Mauritania|MR|MRT|AF|
+Mauritius|MU|MUS|AF|
+Mexico|MX|MEX|NA|
+Micronesia|FM|FSM|OC|Federated States of Micronesia
+Moldova|MD|MDA|EU|Republic of Moldova
+Monaco|MC|MCO|EU|
+Mongolia|MN|MNG|AS|
+Montenegro|ME|MNE|EU|
+Morocco|MA|MAR|AF|
+Mozambique|MZ|MOZ|AF|
+Myanmar|MM|MMR|AS|Burma
+Namibia|NA|NAM|AF|
+Nepal|NP|NPL|AS|
+Netherlands|NL|NLD|EU|The Netherlands;Holland;Kingdom of the Netherlands
+New Caledonia|NC|NCL|OC|
+New Zealand|NZ|NZL|OC|
+Nicaragua|NI|NIC|NA|
+Niger|NE|NER|AF|
+Nigeria|NG|NGA|AF|
+North Korea|KP|PRK|AS|Democratic People's Republic of Korea;Korea, Democratic People's Republic of;DPRK
+North Macedonia|MK|MKD|EU|Macedonia;Republic of North Macedonia
+Norway|NO|NOR|EU|
+Oman|OM|OMN|AS|
+Pakistan|PK|PAK|AS|
+Palestine|PS|PSE|AS|State of Palestine;Palestinian Territories
+Panama|PA|PAN|NA|
+Papua New Guinea|PG|PNG|OC|
+Paraguay|PY|PRY|SA|
+Peru|PE|PER|SA|
+Philippines|PH|PHL|AS|The Philippines
+Poland|PL|POL|EU|
+Portugal|PT|PRT|EU|
+Puerto Rico|PR|PRI|NA|
+Qatar|QA|QAT|AS|
+Reunion|RE|REU|AF|Réunion
+Romania|RO|ROU|EU|
+Russia|RU|RUS|EU|Russian Federation;USSR;Soviet Union
+Rwanda|RW|RWA|AF|
+Saint Kitts and Nevis|KN|KNA|NA|
+Saint Lucia|LC|LCA|NA|
+Saint Vincent and the Grenadines|VC|VCT|NA|
+Samoa|WS|WSM|OC|
+San Marino|SM|SMR|EU|
+Sao Tome and Principe|ST|STP|AF|São Tomé and Príncipe
+Saudi Arabia|SA|SAU|AS|
+Senegal|SN|SEN|AF|
+Serbia|RS|SRB|EU|Serbia and Montenegro;Yugoslavia
+Seychelles|SC|SYC|AF|
+Sierra Leone|SL|SLE|AF|
+Singapore|SG|SGP|AS|
+Slovakia|SK|SVK|EU|Slovak Republic
+Slovenia|SI|SVN|EU|
+Solomon Islands|SB|SLB|OC|
+Somalia|SO|SOM|AF|
+South Africa|ZA|ZAF|AF|Republic of South Africa
+South Korea|KR|KOR|AS|Korea;Republic of Korea;Korea, Republic of;Korea (South)
+South Sudan|SS|SSD|AF|
+Spain|ES|ESP|EU|
+Sri Lanka|LK|LKA|AS|Ceylon
+Sudan|SD|SDN|AF|
+Suriname|SR|SUR|SA|
+Sweden|SE|SWE|EU|
+Switzerland|CH|CHE|EU|
+Syria|SY|SYR|AS|Syrian Arab Republic
+Taiwan|TW|TWN|AS|Taiwan, Province of China;Republic of China;Chinese Taipei
+Tajikistan|TJ|TJK|AS|
+Tanzania|TZ|TZA|AF|United Republic of Tanzania;Tanzania, United Republic of
+Thailand|TH|THA|AS|
+Timor-Leste|TL|TLS|AS|East Timor
+Togo|TG|TGO|AF|
+Tonga|TO|TON|OC|
+Trinidad and Tobago|TT|TTO|NA|
+Tunisia|TN|TUN|AF|
+Turkey|TR|TUR|AS|Türkiye;Turkiye
+Turkmenistan|TM|TKM|AS|
+Uganda|UG|UGA|AF|
+UK|GB|GBR|EU|United Kingdom;Great Britain;Britain;England;Scotland;Wales;Northern Ireland;United Kingdom of Great Britain and Northern Ireland
+Ukraine|UA|UKR|EU|
+United Arab Emirates|AE|ARE|AS|UAE
+Uruguay|UY|URY|SA|
+USA|US|USA|NA|United States;United States of America;U.S.A.;U.S.;America
+Uzbekistan|UZ|UZB|AS|
+Vanuatu|VU|VUT|OC|
+Venezuela|VE|VEN|SA|Bolivarian Republic of Venezuela;Venezuela, Bolivarian Republic of
+Vietnam|VN|VNM|AS|Viet Nam
+Yemen|YE|YEM|AS|
+Zambia|ZM|ZMB|AF|
+Zimbabwe|ZW|ZWE|AF|
+Antarctica|AQ|ATA|--|
+"""
+
+# Field values that mean "no country"
+MISSING_VALUES = ('', 'NA', 'N/A', 'NAN', 'NONE')
+
+# Trailing part of an inverted ISO name ("Korea, Republic of", "Congo,
+# Democratic Republic of the"), which follows a comma
+_INVERTED_TAIL = re.compile(r'\bof(\s+the)?\s*$', re.IGNORECASE)
+
+def _alias_key(name):
+    """Lookup form of a name: case-folded, accents and dots kept, spacing folded"""
+    return ' '.join(str(name).replace('.', '').casefold().split())
+
+def _build_tables():
+    aliases, regions = {}, {}
+    for line in _COUNTRY_TABLE.strip().splitlines():
+        canonical, iso2, iso3, region, others = line.split('|')
+        regions[canonical] = _REGION_CODES[region]
+        names = [canonical, iso2, iso3] + [n for n in others.split(';') if n]
+        for name in names:
+            aliases.setdefault(_alias_key(name), canonical)
+        aliases.setdefault(_alias_key(f'the {canonical}'), canonical)
+    return aliases, regions
+
+COUNTRY_ALIASES, COUNTRY_REGIONS = _build_tables()
+
+# Two-letter codes that are also ordinary words or US state abbreviations
+# in free-text fields; matched only when the whole field is the code
+_AMBIGUOUS_CODES = {'in', 'is', 'it', 'me', 'no', 'to', 'am', 'be', 'do', 'ga', 'pa', 'ma',
+                    'ca', 'co', 'de', 'al', 'ar', 'id', 'mn', 'mo', 'mt', 'ne', 'sc', 'tn',
+                    'va', 'na'}
+
+def _is_missing(name):
+    return name is None or pd.isna(name) or str(name).strip().upper() in MISSING_VALUES
+
+def normalize_country(name):
+    """Canonical name for one country name (trimmed input if unknown, None if empty)"""
+    if _is_missing(name):
+        return None
+    name = str(name).strip()
+    return COUNTRY_ALIASES.get(_alias_key(name), name)
+
+def _comma_parts(part):
+    """
+    Split one ';'/'|' part on ',', keeping inverted ISO names ("Korea,
+    Republic of") and other names containing a comma ("Hong Kong, China")
+    whole
+    """
+    if _alias_key(part) in COUNTRY_ALIASES:
+        return [part]
+    names = []
+    for piece in part.split(','):
+        if names and (_INVERTED_TAIL.search(piece)
+                      or _alias_key(f'{names[-1]},{piece}') in COUNTRY_ALIASES):
+            names[-1] = f'{names[-1]},{piece}'
+        else:
+            names.append(piece)
+    return names
+
+def _split_value(value):
+    """Distinct canonical countries of one field value, in order of appearance"""
+    if _is_missing(value):
+        return []
+    names = [name for part in re.split(r'[;|]', str(value)) for name in _comma_parts(part)]
+    countries = []
+    for name in names:
+        # Ambiguous codes count only when they are the whole field
+        if len(names) > 1 and _alias_key(name) in _AMBIGUOUS_CODES:
+            continue
+        country = normalize_country(name)
+        if country is not None and country not in countries:
+            countries.append(country)
+    return countries
+
+def coalesce_columns(df, columns):
+    """First non-missing value per row among the given columns that df has"""
+    present = [c for c in columns if c in df.columns]
+    if not present:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    values = df[present[0]].astype(object)
+    for column in present[1:]:
+        values = values.where(values.notna() & (values != ''), df[column].astype(object))
+    return values.where(values != '')
+
+def country_lists(values):
+    """
+    (codes, lists): factorize codes of `values` and the list of canonical
+    countries of each distinct value
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    return codes, [_split_value(value) for value in uniques]
+
+def normalize_countries(values):
+    """
+    Canonical form of a country column: every listed country normalized,
+    repeats dropped, joined with '; ' (NaN where no country remains)
+    """
+    values = pd.Series(values)
+    codes, lists = country_lists(values)
+    normalized = np.array(['; '.join(c) if c else np.nan for c in lists] + [np.nan], dtype=object)
+    # Code -1 (missing value) picks the trailing NaN
+    return pd.Series(normalized[codes], index=values.index, name=values.name)
+
+def explode_countries(df, columns, name='Country'):
+    """
+    One row of df per listed country (rows repeated, index kept), the
+    canonical country in column `name`; the country is read from the first
+    of `columns` that has a value, rows without any are dropped
+    """
+    codes, lists = country_lists(coalesce_columns(df, columns))
+    lengths = np.array([len(c) for c in lists] + [0])[codes]
+    flat = np.array([country for c in lists for country in c], dtype=object)
+    offsets = np.concatenate([[0], np.cumsum([len(c) for c in lists])])
+    rows = np.repeat(np.arange(len(df)), lengths)
+    # Position of each repeated row within its value's country list
+    within = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    countries = flat[offsets[codes[rows]] + within] if len(rows) else flat[:0]
+    return df.iloc[rows].assign(**{name: countries})
+
+def collaboration_pairs(df, columns, max_countries=5):
+    """
+    (Country1, Country2) pairs of every multi-country row, indexed by the
+    row's index; the countries of a row are sorted before the
+    max_countries cap, so pairs are reproducible
+    """
+    codes, lists = country_lists(coalesce_columns(df, columns))
+    pair_lists = []
+    for countries in lists:
+        countries = sorted(countries)[:max_countries]
+        pair_lists.append([(a, b) for i, a in enumerate(countries) for b in countries[i + 1:]])
+    lengths = np.array([len(p) for p in pair_lists] + [0])[codes]
+    rows = np.repeat(np.arange(len(df)), lengths)
+    pairs = [pair for code in codes[lengths > 0] for pair in pair_lists[code]]
+    return pd.DataFrame(pairs, columns=['Country1', 'Country2'],
+                        index=df.index[rows]) if pairs else \
+        pd.DataFrame(columns=['Country1', 'Country2'], index=df.index[:0])
+
+def country_regions(countries):
+    """
+    Region of each canonical country name as a categorical
+    (REGION_CATEGORIES); 'Unknown' for missing, 'Other' for names outside
+    the table
+    """
+    countries = pd.Series(countries)
+    codes, uniques = pd.factorize(countries)
+    regions = [COUNTRY_REGIONS.get(normalize_country(c), 'Other') for c in uniques] + ['Unknown']
+    return pd.Series(pd.Categorical(np.array(regions, dtype=object)[codes],
+                                    categories=REGION_CATEGORIES),
+                     index=countries.index, name='Region')
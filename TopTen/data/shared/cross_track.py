@@ -0,0 +1,179 @@
+"""
+Cross-Track Join
+Enrich the genus/species mention table (CSV track) with the bibliometric
+columns of the publication table (xlsx track: RCR, FCR, Altmetric,
+funders, ...)
+
+Every publication of the xlsx table is entered in a hash index under each
+key it carries (normalized DOI, PMID and title, see publication_keys).
+Each mention row then probes the index with its own keys in precedence
+order (DOI, then PMID, then title); the first hit wins. Building the index
+and probing it are both single hash passes (pd.Index.get_indexer), so the
+join is linear in the size of the two tables.
+
+Match rates are reported per key kind, for rows and for distinct
+publications of the mention table, and for the coverage of the
+publication table.
+
+Usage:
+    python cross_track.py [--mentions CSV] [--publications XLSX] [--output CSV]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from publication_keys import key_columns, keys_by_kind, publication_keys
+from run_context import PUBLICATIONS_FILE, current_context, mention_table
+
+OUTPUT_NAME = 'ALL_NEMATODES_ENRICHED.csv'
+
+# Publication-table columns not carried over: the title (the mention table
+# has its own), long free text (abstract, acknowledgements) and the taxon
+# fields of the xlsx extraction (genus, species, mention count). Unnamed
+# overflow columns are dropped separately in bibliometric_columns
+SKIPPED_COLUMNS = ('Title', 'Abstract', 'Acknowledgements', 'Genus', 'Species', 'Count')
+
+# Suffix for carried columns whose name the mention table already uses
+SUFFIX = '_xlsx'
+
+# ============================================================================
+# INDEX AND JOIN
+# ============================================================================
+
+def bibliometric_columns(columns):
+    """Columns of the publication table carried onto the mention table"""
+    return [c for c in columns
+            if c not in SKIPPED_COLUMNS and not str(c).startswith('Unnamed')]
+
+class PublicationIndex:
+    """
+    Hash index from every key of a publication table (DOI, PMID and title
+    keys of each row) to the row position holding it
+
+    A key shared by several rows points to the first of them; those keys
+    are counted in `ambiguous`.
+    """
+
+    def __init__(self, publications):
+        kinds = keys_by_kind(publications)
+        positions = np.arange(len(publications))
+        keys = pd.concat([pd.Series(positions, index=kind_keys.to_numpy(dtype=object))
+                          for kind_keys in kinds.values()]) if kinds else pd.Series(dtype=np.int64)
+        keys = keys[keys.index.notna()]
+        repeated = keys.index.duplicated()
+        self.ambiguous = int(len(pd.unique(keys.index[repeated])))
+        self.positions = keys[~repeated]
+        self.n_publications = len(publications)
+        self.kinds = list(kinds)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def probe(self, mentions):
+        """
+        (position, kind) per mention row: the matched publication row
+        position (-1 when unmatched) and the key kind that matched
+        """
+        position = np.full(len(mentions), -1, dtype=np.int64)
+        kind = np.full(len(mentions), None, dtype=object)
+        for kind_name, kind_keys in keys_by_kind(mentions).items():
+            open_rows = position < 0
+            found = self.positions.index.get_indexer(kind_keys.to_numpy(dtype=object))
+            hit = open_rows & (found >= 0)
+            position[hit] = self.positions.to_numpy()[found[hit]]
+            kind[hit] = kind_name
+        return position, kind
+
+def hash_join(mentions, publications, columns=None):
+    """
+    (enriched, report): mentions with the publication-table `columns`
+    (default: bibliometric_columns) added for matched rows, plus the
+    matched publication row (xlsx_row, -1 if none) and the key kind that
+    matched (match_key); report holds the match rates
+    """
+    if columns is None:
+        columns = bibliometric_columns(publications.columns)
+    index = PublicationIndex(publications)
+    position, kind = index.probe(mentions)
+    matched = position >= 0
+
+    # Position -1 is not in the RangeIndex, so unmatched rows come out empty
+    carried = publications[columns].reset_index(drop=True).reindex(position)
+    carried = carried.rename(columns={c: f"{c}{SUFFIX}" for c in columns if c in mentions.columns})
+    carried.index = mentions.index
+    enriched = pd.concat([mentions, carried], axis=1).assign(
+        xlsx_row=position, match_key=pd.Series(kind, index=mentions.index, dtype=object))
+
+    mention_publications = publication_keys(mentions)
+    has_key = mention_publications.notna().to_numpy()
+    publication_matched = pd.Series(matched[has_key]).groupby(
+        mention_publications[has_key].to_numpy()).any()
+    report = {
+        'mention_rows': len(mentions),
+        'matched_rows': int(matched.sum()),
+        'row_match_rate': float(matched.mean()) if len(mentions) else 0.0,
+        'matched_by': {k: int((kind == k).sum()) for k in index.kinds},
+        'mention_publications': int(len(publication_matched)),
+        'matched_publications': int(publication_matched.sum()),
+        'publication_match_rate': float(publication_matched.mean()) if len(publication_matched) else 0.0,
+        'publication_rows': index.n_publications,
+        'publications_covered': int(len(np.unique(position[matched]))),
+        'index_keys': len(index),
+        'ambiguous_keys': index.ambiguous,
+    }
+    report['coverage_rate'] = (report['publications_covered'] / index.n_publications
+                               if index.n_publications else 0.0)
+    return enriched, report
+
+def print_report(report):
+    print(f"✓ Index: {report['index_keys']:,} keys over {report['publication_rows']:,} publications"
+          f" ({report['ambiguous_keys']:,} keys shared by several rows)")
+    print(f"✓ Mention rows matched: {report['matched_rows']:,} of {report['mention_rows']:,}"
+          f" ({report['row_match_rate']:.1%})")
+    for kind, n in report['matched_by'].items():
+        print(f"    by {kind}: {n:,}")
+    print(f"✓ Mention publications matched: {report['matched_publications']:,} of "
+          f"{report['mention_publications']:,} ({report['publication_match_rate']:.1%})")
+    print(f"✓ Publication table covered: {report['publications_covered']:,} of "
+          f"{report['publication_rows']:,} ({report['coverage_rate']:.1%})")
+
+def main():
+    from mention_store import load_columns, source_columns
+
+    parser = argparse.ArgumentParser(description='Join the mention table with the publication table')
+    parser.add_argument('--mentions', help='mention CSV (default: the run context\'s)')
+    parser.add_argument('--publications', default=PUBLICATIONS_FILE)
+    parser.add_argument('--output', help=f'default: {OUTPUT_NAME} in the output root')
+    args = parser.parse_args()
+    args.mentions = mention_table(args.mentions)
+    args.output = args.output or os.path.join(current_context().root, OUTPUT_NAME)
+
+    print("=" * 80)
+    print("CROSS-TRACK JOIN")
+    print("=" * 80)
+    mentions = pd.read_csv(args.mentions, low_memory=False)
+    publication_columns = source_columns(args.publications)
+    columns = bibliometric_columns(publication_columns)
+    wanted = set(columns) | set(key_columns(publication_columns))
+    publications = load_columns(args.publications, [c for c in publication_columns if c in wanted])
+    print(f"\n✓ {len(mentions):,} mention rows, {len(publications):,} publications, "
+          f"{len(columns)} bibliometric columns")
+
+    enriched, report = hash_join(mentions, publications, columns)
+    print_report(report)
+
+    enriched.to_csv(args.output, index=False)
+    report_path = f"{os.path.splitext(args.output)[0]}_match_report.json"
+    with open(report_path, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\n✓ Enriched mention table: {args.output}")
+    print(f"✓ Match report: {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+DataAnalyz Command Line
+Run whole analysis parts, or single figures and tables of a part
+
+`run` executes the analysis script of a part. With --only it runs just the
+stages that save the named figures/tables (Fig4, Table3, or a stage name
+such as Fig4) together with the upstream stages they need, as resolved by
+script_stages.py; Setup, Load and the final output flush always run.
+`list` shows the stages of a part, what each saves and which earlier
+stages it needs.
+
+--checkpoint saves the results of every stage under
+<OUTPUT_DIR>/Checkpoints; --resume does the same and skips the stages whose
+checkpoint still matches the code and the data (see checkpoints.py), so a
+rerun after a failure starts where the failed run stopped.
+
+The track (Real_Analyses or NematodeAnalysis), dataset, output root, cache
+directory and worker count come from the run context (--context FILE
+and/or --track, --data, --output-root, --cache-dir, --workers; see
+run_context.py), so runs on different datasets can share one machine.
+
+Usage:
+    python dataanalyz.py run part1 [--only Fig4 --only Table3] [--dry-run]
+    python dataanalyz.py run part4 --resume
+    python dataanalyz.py run part1 --data slice.csv --output-root runs/slice --workers 2
+    python dataanalyz.py list part1
+    python dataanalyz.py run part2 --track NematodeAnalysis
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from script_stages import ScriptStages
+from run_context import add_arguments, context_from_args, use_context
+
+def list_part(part):
+    stages = ScriptStages.for_part(part)
+    print(f"\n{stages.path}\n")
+    print(f"{'Stage':<16}{'Outputs':<40}Needs")
+    for name, outputs, needs in stages.describe():
+        print(f"{name:<16}{', '.join(outputs) or '-':<40}{', '.join(needs) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(prog='dataanalyz', description=__doc__.split('\n')[2])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='run an analysis part')
+    run.add_argument('part', help='part1 ... part7')
+    run.add_argument('--only', action='append', default=[], metavar='NAME',
+                     help='figure, table or stage to produce (repeatable)')
+    run.add_argument('--dry-run', action='store_true', help='print the stages without running them')
+    run.add_argument('--checkpoint', action='store_true', help='save the results of every stage')
+    run.add_argument('--resume', action='store_true',
+                     help='skip the stages whose checkpoint is up to date (implies --checkpoint)')
+    add_arguments(run)
+    listing = commands.add_parser('list', help='list the stages and outputs of a part')
+    listing.add_argument('part', help='part1 ... part7')
+    add_arguments(listing)
+    args = parser.parse_args()
+
+    try:
+        use_context(context_from_args(args))
+        if args.command == 'list':
+            list_part(args.part)
+        else:
+            ScriptStages.for_part(args.part).run(args.only, dry_run=args.dry_run,
+                                                 checkpoint=args.checkpoint, resume=args.resume)
+    except (KeyError, ValueError, FileNotFoundError) as error:
+        print(f"ERROR: {error.args[0] if error.args else error}")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Sparse Graph Analytics
+Structural metrics for the host-parasite, co-authorship, co-occurrence and
+collaboration networks
+
+All functions work on a symmetric scipy.sparse CSR adjacency matrix (edge
+weight = number of shared mentions) plus the array of node labels produced
+by the builders below. Every algorithm is a sequence of sparse
+matrix-vector products or per-edge bincounts, so the cost per iteration is
+linear in the number of edges:
+- Weighted degree and strength
+- Eigenvector centrality and PageRank (power iteration)
+- Approximate betweenness (Brandes from sampled sources, hop-count paths)
+- Louvain communities and modularity
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from profiling import profiled
+
+# ============================================================================
+# BUILDING ADJACENCY MATRICES
+# ============================================================================
+
+def adjacency_from_edges(sources, targets, weights=None):
+    """
+    Undirected adjacency from an edge list (repeated pairs are summed)
+    Returns (A, nodes) where nodes[i] is the label of row/column i
+    """
+    sources = pd.Series(sources, dtype=object).reset_index(drop=True)
+    targets = pd.Series(targets, dtype=object).reset_index(drop=True)
+    codes, nodes = pd.factorize(pd.concat([sources, targets], ignore_index=True))
+    u, v = codes[:len(sources)], codes[len(sources):]
+
+    if weights is None:
+        weights = np.ones(len(u))
+    weights = np.asarray(weights, dtype=float)
+
+    keep = (u != v) & (u >= 0) & (v >= 0)
+    u, v, weights = u[keep], v[keep], weights[keep]
+
+    n = len(nodes)
+    A = sparse.coo_matrix((np.concatenate([weights, weights]),
+                           (np.concatenate([u, v]), np.concatenate([v, u]))),
+                          shape=(n, n)).tocsr()
+    A.sum_duplicates()
+    return A, np.asarray(nodes, dtype=object)
+
+def adjacency_from_groups(groups, items):
+    """
+    Co-occurrence adjacency: items are linked once for every group (paper)
+    they share, e.g. co-authors or countries on the same publication
+    Computed as B^T B on the group x item incidence matrix
+    Returns (A, nodes)
+    """
+    group_codes, _ = pd.factorize(pd.Series(groups, dtype=object))
+    item_codes, nodes = pd.factorize(pd.Series(items, dtype=object))
+    keep = (group_codes >= 0) & (item_codes >= 0)
+    group_codes, item_codes = group_codes[keep], item_codes[keep]
+
+    B = sparse.coo_matrix((np.ones(len(item_codes)), (group_codes, item_codes)),
+                          shape=(group_codes.max() + 1 if len(group_codes) else 0,
+                                 len(nodes))).tocsr()
+    B.sum_duplicates()
+    B.data[:] = 1.0  # an item listed twice on one paper counts once
+
+    A = (B.T @ B).tocsr()
+    A.setdiag(0)
+    A.eliminate_zeros()
+    return A, np.asarray(nodes, dtype=object)
+
+# ============================================================================
+# CENTRALITY
+# ============================================================================
+
+def weighted_degree(A):
+    """Number of neighbours and total edge weight per node"""
+    A = sparse.csr_matrix(A)
+    degree = np.diff(A.indptr)
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    return degree, strength
+
+def eigenvector_centrality(A, max_iter=1000, tol=1e-6):
+    """
+    Weighted eigenvector centrality by power iteration, unit L2 norm
+    Iterates on (A + I) like networkx so bipartite graphs converge
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        x_next = A @ x + x
+        norm = np.linalg.norm(x_next)
+        if norm == 0:
+            return x_next
+        x_next /= norm
+        if np.abs(x_next - x).sum() < n * tol:
+            return x_next
+        x = x_next
+    print(f"⚠ Eigenvector centrality did not converge in {max_iter} iterations")
+    return x
+
+def pagerank(A, alpha=0.85, max_iter=100, tol=1e-6):
+    """Weighted PageRank by power iteration (dangling nodes teleport uniformly)"""
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    dangling = strength == 0
+    inv_strength = np.divide(1.0, strength, out=np.zeros(n), where=~dangling)
+    P_T = (sparse.diags(inv_strength) @ A).T.tocsr()
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        x_next = alpha * (P_T @ x + x[dangling].sum() / n) + (1.0 - alpha) / n
+        if np.abs(x_next - x).sum() < n * tol:
+            return x_next
+        x = x_next
+    print(f"⚠ PageRank did not converge in {max_iter} iterations")
+    return x
+
+def approximate_betweenness(A, n_samples=64, seed=42, batch_size=32, normalized=True):
+    """
+    Betweenness centrality on hop-count shortest paths (edge weights ignored)
+
+    Runs Brandes' dependency accumulation from `n_samples` random source
+    nodes (all nodes if the graph is smaller) and extrapolates by n / k, as
+    nx.betweenness_centrality(G, k=...) does. Sources are processed in
+    batches so each BFS level is a single sparse matrix product.
+    """
+    n = A.shape[0]
+    betweenness = np.zeros(n)
+    if n < 3:
+        return betweenness
+
+    pattern = sparse.csr_matrix(A, copy=True)
+    pattern.data[:] = 1.0
+
+    rng = np.random.RandomState(seed)
+    if n_samples is None or n_samples >= n:
+        sources = np.arange(n)
+    else:
+        sources = rng.choice(n, n_samples, replace=False)
+
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        cols = np.arange(len(batch))
+
+        # Forward BFS: shortest-path counts (sigma) and depth per source
+        sigma = np.zeros((n, len(batch)))
+        sigma[batch, cols] = 1.0
+        depth = np.full((n, len(batch)), -1, dtype=np.int32)
+        depth[batch, cols] = 0
+        frontier = sigma.copy()
+        level = 0
+        while True:
+            reached = pattern @ frontier
+            reached[depth >= 0] = 0.0
+            if not reached.any():
+                break
+            level += 1
+            depth[reached > 0] = level
+            sigma += reached
+            frontier = reached
+
+        # Backward pass: dependencies, deepest level first
+        delta = np.zeros_like(sigma)
+        safe_sigma = np.where(sigma > 0, sigma, 1.0)
+        for d in range(level, 0, -1):
+            coef = np.where(depth == d, (1.0 + delta) / safe_sigma, 0.0)
+            delta += np.where(depth == d - 1, sigma * (pattern @ coef), 0.0)
+
+        delta[batch, cols] = 0.0
+        betweenness += delta.sum(axis=1)
+
+    # Undirected graphs count every path from both ends
+    scale = 0.5
+    if normalized:
+        scale = 1.0 / ((n - 1) * (n - 2))
+    return betweenness * scale * (n / len(sources))
+
+# ============================================================================
+# COMMUNITIES
+# ============================================================================
+
+def modularity(A, labels, resolution=1.0):
+    """Newman modularity of a partition of a weighted undirected graph"""
+    A = sparse.coo_matrix(A)
+    total = A.data.sum()
+    if total == 0:
+        return 0.0
+    internal = A.data[labels[A.row] == labels[A.col]].sum()
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    community_strength = np.bincount(labels, strength)
+    return internal / total - resolution * ((community_strength / total) ** 2).sum()
+
+def _louvain_local_moves(A, resolution, rng, threshold=1e-6, max_passes=10):
+    """
+    One Louvain level: greedily move nodes between neighbouring communities
+    until a full pass improves modularity by less than `threshold`
+
+    Passes are capped at `max_passes`: on hub-dominated graphs the tail of
+    the local-move phase keeps shuffling a few nodes for small gains, and the
+    next level's aggregated moves recover most of it at a fraction of the cost.
+
+    Neighbourhoods are small, so the per-node work runs on plain lists;
+    numpy call overhead would dominate otherwise.
+    """
+    n = A.shape[0]
+    strength_arr = np.asarray(A.sum(axis=1)).ravel()
+    total = float(strength_arr.sum())
+    strength = strength_arr.tolist()
+    community = list(range(n))
+    community_strength = list(strength)
+    indptr, indices, data = A.indptr.tolist(), A.indices.tolist(), A.data.tolist()
+    order = rng.permutation(n).tolist()
+
+    moved = False
+    for _ in range(max_passes):
+        pass_gain = 0.0
+        for i in order:
+            k_i = strength[i]
+            scale = resolution * k_i / total
+            links = {}
+            for pos in range(indptr[i], indptr[i + 1]):
+                j = indices[pos]
+                if j != i:
+                    c = community[j]
+                    links[c] = links.get(c, 0.0) + data[pos]
+            if not links:
+                continue
+
+            current = community[i]
+            community_strength[current] -= k_i
+            stay_gain = links.get(current, 0.0) - community_strength[current] * scale
+
+            target, best_gain = current, stay_gain
+            for c, weight in links.items():
+                gain = weight - community_strength[c] * scale
+                if gain > best_gain + 1e-12:
+                    target, best_gain = c, gain
+
+            community_strength[target] += k_i
+            if target != current:
+                community[i] = target
+                pass_gain += 2.0 * (best_gain - stay_gain) / total
+                moved = True
+
+        if pass_gain < threshold:
+            break
+
+    _, community = np.unique(community, return_inverse=True)
+    return community, moved
+
+def louvain_communities(A, resolution=1.0, seed=42, max_levels=10):
+    """
+    Louvain community detection
+    Returns one integer label per node, numbered by community size
+    (0 = largest community)
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=int)
+
+    rng = np.random.RandomState(seed)
+    labels = np.arange(n)
+    graph = sparse.csr_matrix(A, dtype=float)
+    for _ in range(max_levels):
+        community, moved = _louvain_local_moves(graph, resolution, rng)
+        if not moved:
+            break
+        labels = community[labels]
+
+        # Collapse each community into a single node and repeat
+        membership = sparse.csr_matrix(
+            (np.ones(len(community)), (np.arange(len(community)), community)))
+        graph = (membership.T @ graph @ membership).tocsr()
+
+    sizes = np.bincount(labels)
+    rank = np.empty_like(sizes)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+    return rank[labels]
+
+# ============================================================================
+# SUMMARY TABLE
+# ============================================================================
+
+@profiled
+def network_metrics(A, nodes, betweenness_samples=64, seed=42):
+    """
+    One row per node: degree, strength, eigenvector, PageRank, approximate
+    betweenness and Louvain community, sorted by PageRank
+    """
+    A = sparse.csr_matrix(A, dtype=float)
+    degree, strength = weighted_degree(A)
+    communities = louvain_communities(A, seed=seed)
+
+    metrics = pd.DataFrame({
+        'Node': nodes,
+        'Degree': degree,
+        'Strength': strength,
+        'Eigenvector': eigenvector_centrality(A),
+        'PageRank': pagerank(A),
+        'Betweenness': approximate_betweenness(A, n_samples=betweenness_samples, seed=seed),
+        'Community': communities,
+    })
+
+    n_communities = len(np.unique(communities))
+    print(f"✓ Network metrics: {A.shape[0]:,} nodes, {A.nnz // 2:,} edges, "
+          f"{n_communities} communities (Q = {modularity(A, communities):.3f})")
+    return metrics.sort_values('PageRank', ascending=False).reset_index(drop=True)
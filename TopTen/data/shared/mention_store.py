@@ -0,0 +1,553 @@
+"""
+Mention Store
+On-disk cache of derived per-row data for a mention table (CSV or xlsx)
+
+The cache lives next to the source file in .mention_cache/<name>/ (or
+under the cache_dir of the run context, see run_context.py) and is tied
+to the source fingerprint (size + modification time): when the source
+changes, everything derived from it is discarded.
+
+Contents:
+- manifest.json                 fingerprint and row count
+- <column>.codes.npy            int32 category codes per row (-1 = missing)
+- <column>.categories.json      the categorical dictionary for those codes
+- <column>.values.npy           numeric columns, stored as loaded
+- <column>.blob / .offsets.npy / .valid.npy
+                                long text columns (see text_store)
+- validity-<key>.npy            packed row-validity bitmap for one filter
+                                configuration; changing the configuration
+                                only adds a new bitmap, codes and
+                                dictionaries are reused
+- publication-keys.npy / mention-keys.npy
+                                uint64 key hashes per row (see
+                                publication_keys), the index new batches
+                                are deduplicated against
+- pub-ids.npy                   canonical publication id per row, with
+                                near-duplicates merged (see near_duplicates)
+- <column>.dates.npy            parsed datetime64 values of a date column
+
+In resident mode (keep_resident(), used by analysis_daemon) the loaded
+columns, text columns, key index, publication ids and parsed dates also
+stay in memory, checked against the source fingerprint on every use.
+
+append_rows extends a CSV source and every cached array in place, so a
+small batch does not invalidate the cache (publication ids, which depend
+on the whole table, and parsed dates are recomputed on next use).
+"""
+
+import io
+import os
+import json
+import hashlib
+import shutil
+import functools
+
+import numpy as np
+import pandas as pd
+
+from text_store import TextColumn, write_text_column, append_text_column, text_column_exists
+from publication_keys import key_columns, publication_keys, key_hashes, mention_keys
+from run_context import cache_root
+
+STORE_VERSION = 1
+CACHE_DIRNAME = '.mention_cache'
+KEY_INDEX_FILES = ('publication-keys.npy', 'mention-keys.npy')
+PUB_IDS_FILE = 'pub-ids.npy'
+PUB_INDEX_FILE = 'pub-index.npz'
+ABSTRACT_COLUMNS = ('abstract', 'Abstract')
+
+# ============================================================================
+# FILE HELPERS
+# ============================================================================
+
+def _atomic_write(path, write):
+    """
+    Call write(handle) on a temp file, then move it into place; the temp
+    name is per process, as concurrent runs (batch.py) share the cache
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        write(handle)
+    os.replace(tmp_path, path)
+
+def _write_json(path, payload):
+    _atomic_write(path, lambda handle: handle.write(json.dumps(payload).encode('utf-8')))
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+def _column_filename(column):
+    """Filesystem-safe stem for a column name"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in column)
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+def source_fingerprint(source):
+    """Identity of the source file contents as far as the cache is concerned"""
+    stat = os.stat(source)
+    return {'path': os.path.abspath(source), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns}
+
+def cache_dir_for(source):
+    """Cache directory for a source file (under the run context's cache_dir, if set)"""
+    configured = cache_root(source)
+    if configured:
+        return configured
+    source = os.path.abspath(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(os.path.dirname(source), CACHE_DIRNAME, name)
+
+def open_store(source, n_rows):
+    """
+    Cache directory for `source`, created (or reset, if the source changed
+    since it was written) as needed; n_rows is the row count of the loaded
+    table, which every cached array must match
+    """
+    cache_dir = cache_dir_for(source)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    expected = {'version': STORE_VERSION, 'source': source_fingerprint(source),
+                'n_rows': int(n_rows)}
+
+    if _read_json(manifest_path) != expected:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_json(manifest_path, expected)
+    return cache_dir
+
+def cached_row_count(source):
+    """Row count recorded for source, or None if there is no valid cache"""
+    manifest = _read_json(os.path.join(cache_dir_for(source), 'manifest.json'))
+    if (manifest is None or manifest.get('version') != STORE_VERSION
+            or manifest.get('source') != source_fingerprint(source)):
+        return None
+    return manifest['n_rows']
+
+# ============================================================================
+# RESIDENT MODE
+# ============================================================================
+
+# source path -> {'fingerprint': ..., 'items': {key: value}}; None when off
+_RESIDENT = None
+
+def keep_resident(enabled=True):
+    """Keep loaded data in memory for the life of the process (or stop doing so)"""
+    global _RESIDENT
+    _RESIDENT = {} if enabled else None
+
+def drop_resident(source=None):
+    """Forget the resident data of source (of every source when None)"""
+    if _RESIDENT is None:
+        return
+    if source is None:
+        _RESIDENT.clear()
+    else:
+        _RESIDENT.pop(os.path.abspath(source), None)
+
+def resident_sources():
+    """Fingerprint and resident item keys per source"""
+    if _RESIDENT is None:
+        return {}
+    return {source: {'fingerprint': entry['fingerprint'],
+                     'items': sorted('/'.join(str(getattr(part, '__name__', part)) for part in key)
+                                     for key in entry['items'])}
+            for source, entry in _RESIDENT.items()}
+
+def _resident_item(source, key, build):
+    """
+    build() once per source fingerprint in resident mode; arrays are made
+    read-only, since every caller shares them
+    """
+    if _RESIDENT is None:
+        return build()
+    source = os.path.abspath(source)
+    fingerprint = source_fingerprint(source)
+    entry = _RESIDENT.get(source)
+    if entry is None or entry['fingerprint'] != fingerprint:
+        entry = _RESIDENT[source] = {'fingerprint': fingerprint, 'items': {}}
+    if key not in entry['items']:
+        value = build()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        elif isinstance(value, tuple):
+            for array in value:
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+        entry['items'][key] = value
+    return entry['items'][key]
+
+def resident(func):
+    """Memoize func(source, *args) in resident mode"""
+    @functools.wraps(func)
+    def wrapper(source, *args):
+        return _resident_item(source, (func.__name__,) + args, lambda: func(source, *args))
+    return wrapper
+
+def categorical_column(cache_dir, column, values):
+    """
+    (codes, categories) for a column, loaded from the cache or built from
+    `values` with pd.factorize and stored
+    """
+    stem = os.path.join(cache_dir, _column_filename(column))
+    codes_path, categories_path = f"{stem}.codes.npy", f"{stem}.categories.json"
+
+    categories = _read_json(categories_path)
+    if categories is not None and os.path.exists(codes_path):
+        codes = np.load(codes_path)
+        if len(codes) == len(values):
+            return codes, categories
+
+    codes, uniques = pd.factorize(pd.Series(values).reset_index(drop=True))
+    codes = codes.astype(np.int32)
+    categories = [str(value) for value in uniques]
+    _atomic_write(codes_path, lambda handle: np.save(handle, codes))
+    _write_json(categories_path, categories)
+    return codes, categories
+
+def _config_key(config):
+    """Short stable hash of a JSON-serializable filter configuration"""
+    encoded = json.dumps(config, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+def validity_bitmap(source, df, predicates, config):
+    """
+    Boolean array, one entry per row of df: True where no predicate flags
+    the row
+
+    `predicates` maps column name -> function(categories Series) returning
+    a boolean array; each predicate is evaluated once per distinct value
+    and broadcast to rows through the cached category codes. The result is
+    stored as a packed bitmap under a key derived from `config`, which must
+    describe everything the predicates depend on.
+
+    Returns None when df is not the full, unfiltered source table as
+    cached (rows could not be matched to the cache); callers should
+    evaluate the predicates directly in that case. The store is never
+    opened from df's length, so a subset cannot reset the cache.
+    """
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return None
+
+    n_rows = len(df)
+    if cached_row_count(source) != n_rows:
+        return None
+    cache_dir = open_store(source, n_rows)
+    bitmap_path = os.path.join(cache_dir, f"validity-{_config_key(config)}.npy")
+    if os.path.exists(bitmap_path):
+        return np.unpackbits(np.load(bitmap_path), count=n_rows).astype(bool)
+
+    valid = np.ones(n_rows, dtype=bool)
+    for column, predicate in predicates.items():
+        if column not in df.columns:
+            continue
+        codes, categories = categorical_column(cache_dir, column, df[column])
+        flagged = np.asarray(predicate(pd.Series(categories, dtype=object)), dtype=bool)
+        # Code -1 (missing value) picks the trailing False
+        valid &= ~np.append(flagged, False)[codes]
+
+    _atomic_write(bitmap_path, lambda handle: np.save(handle, np.packbits(valid)))
+    return valid
+
+# ============================================================================
+# PROJECTED COLUMN LOADING
+# ============================================================================
+
+def _is_excel(source):
+    return source.lower().endswith(('.xlsx', '.xls'))
+
+def source_columns(source):
+    """Column names of the source file, read from the header only"""
+    if _is_excel(source):
+        return pd.read_excel(source, nrows=0, engine='openpyxl').columns.tolist()
+    return pd.read_csv(source, nrows=0).columns.tolist()
+
+def _read_source(source, columns):
+    if _is_excel(source):
+        return pd.read_excel(source, usecols=columns, engine='openpyxl')
+    return pd.read_csv(source, usecols=columns, low_memory=False)
+
+def _column_cached(cache_dir, column):
+    stem = os.path.join(cache_dir, _column_filename(column))
+    return (os.path.exists(f"{stem}.values.npy")
+            or (os.path.exists(f"{stem}.codes.npy") and os.path.exists(f"{stem}.categories.json")))
+
+def _store_column(cache_dir, column, values):
+    """Numeric columns as a plain array, everything else as categories"""
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        path = os.path.join(cache_dir, f"{_column_filename(column)}.values.npy")
+        array = values.to_numpy()
+        _atomic_write(path, lambda handle: np.save(handle, array))
+    else:
+        categorical_column(cache_dir, column, values)
+
+def _load_column(cache_dir, column):
+    stem = os.path.join(cache_dir, _column_filename(column))
+    if os.path.exists(f"{stem}.values.npy"):
+        return pd.Series(np.load(f"{stem}.values.npy"), name=column)
+    codes = np.load(f"{stem}.codes.npy")
+    # Code -1 (missing value) picks the trailing NaN
+    lookup = np.array(_read_json(f"{stem}.categories.json") + [np.nan], dtype=object)
+    return pd.Series(lookup[codes], name=column).infer_objects()
+
+def load_columns(source, columns):
+    """
+    Columns of the source table as a DataFrame (RangeIndex = source row
+    positions), read through the cache: only columns that are not cached
+    yet are read from the source file, and only those columns
+
+    Requested columns missing from the source are skipped; the result keeps
+    the source column order.
+    """
+    wanted = set(columns)
+    columns = [c for c in source_columns(source) if c in wanted]
+
+    n_rows = cached_row_count(source)
+    cache_dir = cache_dir_for(source)
+    missing = columns if n_rows is None else [c for c in columns if not _column_cached(cache_dir, c)]
+    if missing:
+        raw = _read_source(source, missing)
+        cache_dir = open_store(source, len(raw))
+        for column in missing:
+            _store_column(cache_dir, column, raw[column])
+        del raw
+
+    return pd.concat([_resident_item(source, ('column', column),
+                                     lambda column=column: _load_column(cache_dir, column))
+                      for column in columns], axis=1)
+
+@resident
+def date_column(source, column, parse):
+    """
+    datetime64[ns] array, one entry per source row, of a date column
+    parsed by `parse` (values -> datetime Series); parsed on first use and
+    cached
+    """
+    n_rows = cached_row_count(source)
+    path = os.path.join(cache_dir_for(source), f"{_column_filename(column)}.dates.npy")
+    if n_rows is not None and os.path.exists(path):
+        dates = np.load(path)
+        if len(dates) == n_rows:
+            return dates
+
+    values = load_columns(source, [column])[column]
+    dates = parse(values).to_numpy(dtype='datetime64[ns]')
+    cache_dir = open_store(source, len(values))
+    _atomic_write(os.path.join(cache_dir, os.path.basename(path)), lambda handle: np.save(handle, dates))
+    return dates
+
+@resident
+def text_column(source, column):
+    """
+    Memory-mapped TextColumn for a long text column of the source, written
+    to the cache on first use (reading only that column)
+    """
+    n_rows = cached_row_count(source)
+    stem = os.path.join(cache_dir_for(source), _column_filename(column))
+    if n_rows is None or not text_column_exists(stem, n_rows):
+        raw = _read_source(source, [column])
+        cache_dir = open_store(source, len(raw))
+        stem = os.path.join(cache_dir, _column_filename(column))
+        write_text_column(stem, raw[column])
+        del raw
+    return TextColumn(stem)
+
+# ============================================================================
+# KEY INDEX AND APPENDS
+# ============================================================================
+
+def _batch_key_hashes(df):
+    publication = publication_keys(df)
+    return key_hashes(publication), mention_keys(df, publication)
+
+@resident
+def key_index(source):
+    """
+    (publication, mention) uint64 key hashes per source row, 0 where a row
+    has no publication key; built from the cached columns on first use
+    """
+    n_rows = cached_row_count(source)
+    paths = [os.path.join(cache_dir_for(source), name) for name in KEY_INDEX_FILES]
+    if n_rows is not None and all(os.path.exists(path) for path in paths):
+        arrays = [np.load(path) for path in paths]
+        if all(len(array) == n_rows for array in arrays):
+            return tuple(arrays)
+
+    df = load_columns(source, key_columns(source_columns(source)) + ['Genus', 'Species'])
+    arrays = _batch_key_hashes(df)
+    cache_dir = open_store(source, len(df))
+    for name, array in zip(KEY_INDEX_FILES, arrays):
+        _atomic_write(os.path.join(cache_dir, name), lambda handle, a=array: np.save(handle, a))
+    return arrays
+
+@resident
+def publication_ids(source):
+    """
+    Canonical publication id per source row (int64), near-duplicate
+    publications merged; computed from the key columns and abstracts on
+    first use and cached with its key index, which append_rows extends
+    """
+    n_rows = cached_row_count(source)
+    path = os.path.join(cache_dir_for(source), PUB_IDS_FILE)
+    if n_rows is not None and os.path.exists(path):
+        pub_ids = np.load(path)
+        if len(pub_ids) == n_rows:
+            return pub_ids
+
+    from near_duplicates import publication_index
+    columns = source_columns(source)
+    df = load_columns(source, key_columns(columns))
+    abstract = next((c for c in ABSTRACT_COLUMNS if c in columns), None)
+    abstracts = text_column(source, abstract) if abstract is not None else None
+    pub_ids, index = publication_index(df, abstracts)
+    pub_ids = pub_ids.to_numpy(dtype=np.int64)
+    cache_dir = open_store(source, len(df))
+    _atomic_write(os.path.join(cache_dir, PUB_INDEX_FILE), lambda handle: np.savez(handle, **index))
+    _atomic_write(os.path.join(cache_dir, PUB_IDS_FILE), lambda handle: np.save(handle, pub_ids))
+    return pub_ids
+
+def warm(source, text_columns=()):
+    """
+    Load every column, the given text columns and the publication ids of
+    source (resident mode keeps them in memory for later jobs)
+    """
+    columns = source_columns(source)
+    load_columns(source, [c for c in columns if c not in text_columns])
+    for column in text_columns:
+        if column in columns:
+            text_column(source, column)
+    publication_ids(source)
+
+def duplicate_mentions(source):
+    """
+    Boolean array per source row, True where the row repeats the
+    (publication, Genus, Species) mention of an earlier row, publications
+    compared by canonical id
+    """
+    taxa = load_columns(source, ['Genus', 'Species'])
+    return taxa.assign(pub_id=publication_ids(source)).duplicated().to_numpy()
+
+def parse_rows(raw):
+    """
+    Typed version of raw string rows, inferred the way the source reader
+    infers them
+    """
+    return pd.read_csv(io.StringIO(raw.to_csv(index=False)), low_memory=False)
+
+def _extend_column(cache_dir, column, values):
+    """
+    Append values to a cached column; a column whose batch values do not
+    fit the cached representation is dropped and rebuilt on next load
+    """
+    stem = os.path.join(cache_dir, _column_filename(column))
+    values = values.reset_index(drop=True)
+    all_missing = values.isna().all()
+
+    if os.path.exists(f"{stem}.values.npy"):
+        if all_missing or pd.api.types.is_numeric_dtype(values):
+            array = np.concatenate([np.load(f"{stem}.values.npy"), values.to_numpy()])
+            _atomic_write(f"{stem}.values.npy", lambda handle: np.save(handle, array))
+        else:
+            os.remove(f"{stem}.values.npy")
+    elif os.path.exists(f"{stem}.codes.npy"):
+        categories = _read_json(f"{stem}.categories.json")
+        if categories is None or not (all_missing or pd.api.types.is_string_dtype(values)):
+            os.remove(f"{stem}.codes.npy")
+            return
+        lookup = {category: code for code, category in enumerate(categories)}
+        new_codes = np.full(len(values), -1, dtype=np.int32)
+        for i, value in enumerate(values):
+            if pd.isna(value):
+                continue
+            value = str(value)
+            if value not in lookup:
+                lookup[value] = len(categories)
+                categories.append(value)
+            new_codes[i] = lookup[value]
+        codes = np.concatenate([np.load(f"{stem}.codes.npy"), new_codes])
+        _atomic_write(f"{stem}.codes.npy", lambda handle: np.save(handle, codes))
+        _write_json(f"{stem}.categories.json", categories)
+
+    if os.path.exists(f"{stem}.offsets.npy"):
+        append_text_column(stem, values)
+
+def _extend_publication_ids(cache_dir, typed, n_rows):
+    """
+    Extend the cached publication ids by the typed new rows, hashing only
+    those (see near_duplicates.extend_publication_ids); without a cached
+    key index they are dropped, to be rebuilt on next use
+    """
+    ids_path = os.path.join(cache_dir, PUB_IDS_FILE)
+    index_path = os.path.join(cache_dir, PUB_INDEX_FILE)
+    if os.path.exists(ids_path) and os.path.exists(index_path):
+        pub_ids = np.load(ids_path)
+        if len(pub_ids) == n_rows:
+            from near_duplicates import extend_publication_ids
+            with np.load(index_path) as stored:
+                index = dict(stored)
+            abstract = next((c for c in ABSTRACT_COLUMNS if c in typed.columns), None)
+            new_ids, index = extend_publication_ids(
+                index, typed, typed[abstract] if abstract is not None else None)
+            pub_ids = np.concatenate([pub_ids, new_ids.to_numpy(dtype=np.int64)])
+            _atomic_write(index_path, lambda handle: np.savez(handle, **index))
+            _atomic_write(ids_path, lambda handle: np.save(handle, pub_ids))
+            return
+    for path in (ids_path, index_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def append_rows(source, raw):
+    """
+    Append raw string rows (all source columns) to a CSV source and extend
+    the cache in place: cached columns, text columns, the key index and
+    the publication ids grow by the new rows, validity bitmaps and parsed
+    dates are dropped (they are rebuilt from the cached columns on next use)
+
+    The manifest is removed while the cache is being extended, so an
+    interrupted append leaves a cache that is simply rebuilt.
+    """
+    if _is_excel(source):
+        raise ValueError(f"Appending is only supported for CSV sources, not {source}")
+    columns = source_columns(source)
+    raw = raw[columns]
+    n_rows = cached_row_count(source)
+    cache_dir = cache_dir_for(source)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+
+    if n_rows is not None:
+        os.remove(manifest_path)
+        typed = parse_rows(raw)
+        for column in columns:
+            _extend_column(cache_dir, column, typed[column])
+        for name in os.listdir(cache_dir):
+            if name.startswith('validity-') or name.endswith('.dates.npy'):
+                os.remove(os.path.join(cache_dir, name))
+        _extend_publication_ids(cache_dir, typed, n_rows)
+
+        key_paths = [os.path.join(cache_dir, name) for name in KEY_INDEX_FILES]
+        if all(os.path.exists(path) for path in key_paths):
+            for path, new in zip(key_paths, _batch_key_hashes(typed)):
+                array = np.concatenate([np.load(path), new])
+                _atomic_write(path, lambda handle, a=array: np.save(handle, a))
+        else:
+            for path in key_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    needs_newline = False
+    if os.path.getsize(source) > 0:
+        with open(source, 'rb') as handle:
+            handle.seek(-1, os.SEEK_END)
+            needs_newline = handle.read(1) != b'\n'
+    with open(source, 'a', encoding='utf-8', newline='') as handle:
+        if needs_newline:
+            handle.write('\n')
+        raw.to_csv(handle, header=False, index=False)
+
+    if n_rows is not None:
+        _write_json(manifest_path, {'version': STORE_VERSION, 'source': source_fingerprint(source),
+                                    'n_rows': int(n_rows + len(raw))})
@@ -0,0 +1,406 @@
+"""
+Near-Duplicate Publications
+MinHash / LSH detection of publications that appear more than once under
+slightly different titles or abstracts, and a canonical pub_id per row
+
+Rows are first grouped by their exact publication key (publication_keys:
+DOI, PMID or normalized title hash); one representative per key is then
+compared with all others:
+- Titles are shingled into character 5-grams, abstracts into word 3-grams
+  (first ABSTRACT_WORDS words), all documents at once in NumPy
+- NUM_PERM MinHash values per document (universal hashing modulo a
+  Mersenne prime), reduced per document with np.minimum.reduceat
+- LSH banding (BANDS bands of NUM_PERM / BANDS values): documents sharing
+  a bucket in any band are candidates; each bucket contributes its members
+  paired with its first member, so candidates grow near-linearly
+- Candidates are kept when the estimated Jaccard similarity reaches
+  JACCARD_THRESHOLD, or (titles only) when the shorter title is contained
+  in the longer one at CONTAINMENT_THRESHOLD, which catches truncation
+- Titles whose numbers differ (volumes, parts, years; a number missing
+  from one title counts as different) are never merged, nor is a title
+  with the main title of a subtitled one ("X" and "X: a review"), nor are
+  keys carrying different DOIs, or different PMIDs
+
+Connected components of the kept pairs are the publications; pub_id
+numbers them in order of first appearance in the table. The signatures
+are kept per key (the key index), so rows appended later are hashed on
+their own and compared with the stored keys (extend_publication_ids).
+
+Usage:
+    python near_duplicates.py [--data FILE] [--output FILE]
+Writes the merged groups (pub_id, publication key, title, rows) for review.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from publication_keys import (TITLE_COLUMNS, key_columns, publication_keys, key_hashes,
+                              normalize_title)
+
+
+SHINGLE_CHARS = 5
+SHINGLE_WORDS = 3
+ABSTRACT_WORDS = 200
+
+NUM_PERM = 128
+BANDS = 32
+JACCARD_THRESHOLD = 0.8
+CONTAINMENT_THRESHOLD = 0.9
+
+# Documents with fewer shingles are too short to compare reliably; they
+# only match through their exact key
+MIN_TITLE_SHINGLES = 20
+MIN_ABSTRACT_SHINGLES = 20
+
+SEED = 42
+
+# Where a raw title's subtitle starts: colon, question or exclamation mark,
+# full stop, or a dash between spaces
+SUBTITLE_SEPARATOR = r'[:?!.]\s|\s[-\u2013\u2014]+\s'
+
+# Shingles hashed per block (block x NUM_PERM uint64 values in memory)
+BLOCK_SHINGLES = 1 << 16
+
+_PRIME = np.uint64((1 << 31) - 1)
+
+# ============================================================================
+# SHINGLES AND SIGNATURES
+# ============================================================================
+
+def _window_hashes(tokens, lengths, k):
+    """
+    Hashes of the k-token windows of documents stored back to back in
+    `tokens` (uint64), one document per entry of `lengths`
+    Returns (document, hash) arrays; windows never span two documents
+    """
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    n_windows = np.maximum(lengths - k + 1, 0).astype(np.int64)
+    window_starts = np.concatenate([[0], np.cumsum(n_windows)[:-1]])
+    document = np.repeat(np.arange(len(lengths)), n_windows)
+    first = np.arange(n_windows.sum()) + np.repeat(starts - window_starts, n_windows)
+
+    hashes = np.zeros(len(first), dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * np.uint64(1000003) + tokens[first + j]
+    return document, hashes
+
+def char_shingles(texts, k=SHINGLE_CHARS):
+    """(document, hash) of the character k-grams of normalized texts"""
+    encoded = [text.encode('utf-8') for text in texts]
+    tokens = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+    return _window_hashes(tokens, np.array([len(e) for e in encoded], dtype=np.int64), k)
+
+def word_shingles(texts, k=SHINGLE_WORDS, max_words=ABSTRACT_WORDS):
+    """(document, hash) of the word k-grams of the first max_words words of normalized texts"""
+    words = pd.Series(list(texts), dtype=object).str.split().str[:max_words]
+    lengths = words.str.len().to_numpy(dtype=np.int64)
+    flat = [word for document in words for word in document]
+    codes, _ = pd.factorize(pd.Series(flat, dtype=object))
+    return _window_hashes(codes.astype(np.uint64) + np.uint64(1), lengths, k)
+
+def minhash_signatures(document, hashes, n_documents, num_perm=NUM_PERM, seed=SEED):
+    """
+    (n_documents, num_perm) uint32 MinHash signatures; documents without
+    shingles get the all-maximum signature
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+    x = hashes % _PRIME
+
+    signatures = np.full((n_documents, num_perm), _PRIME, dtype=np.uint64)
+    for lo in range(0, len(x), BLOCK_SHINGLES):
+        block_document = document[lo:lo + BLOCK_SHINGLES]
+        segments = np.flatnonzero(np.r_[True, block_document[1:] != block_document[:-1]])
+        values = (x[lo:lo + BLOCK_SHINGLES, None] * a + b) % _PRIME
+        minima = np.minimum.reduceat(values, segments, axis=0)
+        # A document split across two blocks keeps the smaller minima
+        rows = block_document[segments]
+        signatures[rows] = np.minimum(signatures[rows], minima)
+    return signatures.astype(np.uint32)
+
+# ============================================================================
+# LSH
+# ============================================================================
+
+def lsh_candidates(signatures, eligible, bands=BANDS, seed=SEED):
+    """
+    Unique (i, j) pairs, i < j, of eligible documents sharing a bucket in
+    at least one band
+    """
+    rows = np.flatnonzero(eligible)
+    if len(rows) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    per_band = signatures.shape[1] // bands
+    multipliers = np.random.default_rng(seed + 1).integers(
+        1, np.iinfo(np.int64).max, per_band, dtype=np.uint64) | np.uint64(1)
+
+    pairs = []
+    for band in range(bands):
+        values = signatures[rows, band * per_band:(band + 1) * per_band].astype(np.uint64)
+        keys = (values * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        new_bucket = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        first = order[np.flatnonzero(new_bucket)][np.cumsum(new_bucket) - 1]
+        member = ~new_bucket
+        pairs.append(np.stack([first[member], order[member]], axis=1))
+
+    pairs = rows[np.sort(np.concatenate(pairs), axis=1)]
+    return np.unique(pairs, axis=0)
+
+def estimated_jaccard(signatures, pairs, block=100_000):
+    """Fraction of equal MinHash values for each pair"""
+    similarity = np.empty(len(pairs))
+    for lo in range(0, len(pairs), block):
+        chunk = pairs[lo:lo + block]
+        similarity[lo:lo + block] = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+    return similarity
+
+def document_signatures(document, hashes, n_documents):
+    """(MinHash signatures, distinct shingle count) per document"""
+    sizes = pd.DataFrame({'document': document, 'hash': hashes}).drop_duplicates() \
+        .groupby('document').size().reindex(range(n_documents), fill_value=0).to_numpy()
+    return minhash_signatures(document, hashes, n_documents), sizes
+
+def similar_pairs(signatures, sizes, min_shingles, containment=False, first_new=0):
+    """
+    Pairs of documents judged to be the same text; only pairs with a
+    document numbered first_new or above (the new ones when stored
+    documents come first)
+    """
+    pairs = lsh_candidates(signatures, sizes >= min_shingles)
+    pairs = pairs[pairs[:, 1] >= first_new]
+    if len(pairs) == 0:
+        return pairs
+
+    jaccard = estimated_jaccard(signatures, pairs)
+    keep = jaccard >= JACCARD_THRESHOLD
+    if containment:
+        size_a, size_b = sizes[pairs[:, 0]], sizes[pairs[:, 1]]
+        overlap = jaccard * (size_a + size_b) / (1 + jaccard)
+        keep |= overlap / np.minimum(size_a, size_b) >= CONTAINMENT_THRESHOLD
+    return pairs[keep]
+
+def near_duplicate_pairs(document, hashes, n_documents, min_shingles, containment=False):
+    """Pairs of documents judged to be the same text"""
+    return similar_pairs(*document_signatures(document, hashes, n_documents),
+                         min_shingles, containment=containment)
+
+# ============================================================================
+# CANONICAL PUBLICATION IDS
+# ============================================================================
+
+# A key index holds one entry per publication key, in order of first
+# appearance: the key hash and kind, the MinHash signatures and shingle
+# counts of its title and abstract, the title features the filters below
+# compare, and its pub_id ('next_id' is the first unused pub_id). It is
+# all extend_publication_ids needs to place appended rows.
+
+def _key_kinds(keys):
+    """1 for DOI keys, 2 for PMID keys, 0 for the others"""
+    kind = pd.Series(keys, dtype=object).str.split(':').str[0]
+    return np.select([kind == 'doi', kind == 'pmid'], [1, 2], 0).astype(np.int8)
+
+def _title_features(raw_titles):
+    """Title signatures, shingle counts, number hash, length and main title length"""
+    raw = pd.Series(raw_titles, dtype=object).reset_index(drop=True)
+    titles = normalize_title(raw).fillna('')
+    signatures, sizes = document_signatures(*char_shingles(titles), len(titles))
+    main = normalize_title(raw.fillna('').astype(str).str.split(SUBTITLE_SEPARATOR, n=1, regex=True).str[0])
+    return {'title_signatures': signatures, 'title_sizes': sizes,
+            'title_numbers': key_hashes(titles.str.findall(r'\d+').str.join(' ')),
+            'title_lengths': titles.str.len().to_numpy(dtype=np.int64),
+            'main_title_lengths': main.str.len().fillna(0).to_numpy(dtype=np.int64)}
+
+def _key_index(df, keys, representatives, abstract_texts=None):
+    """Key index entries (without pub_ids) for keys first seen at the given rows of df"""
+    index = {'key_hashes': key_hashes(keys), 'kinds': _key_kinds(keys)}
+    title_column = next((c for c in TITLE_COLUMNS if c in df.columns), None)
+    if title_column is not None:
+        index.update(_title_features(df[title_column].iloc[representatives]))
+    if abstract_texts is not None:
+        texts = normalize_title(pd.Series(abstract_texts, dtype=object)).fillna('')
+        signatures, sizes = document_signatures(*word_shingles(texts), len(texts))
+        index.update(abstract_signatures=signatures, abstract_sizes=sizes)
+    return index
+
+def _numbers_differ(index, pairs):
+    """
+    Pairs whose titles do not carry the same numbers; "... part 2" and the
+    unnumbered title are different publications
+    """
+    numbers = index['title_numbers']
+    return numbers[pairs[:, 0]] != numbers[pairs[:, 1]]
+
+def _subtitle_only(index, pairs):
+    """
+    Pairs where the shorter title covers no more than the main title of the
+    longer one, which adds a subtitle ("X" and "X: a review"); a truncated
+    title that runs into the subtitle still matches
+    """
+    length, main_length = index['title_lengths'], index['main_title_lengths']
+    a, b = pairs[:, 0], pairs[:, 1]
+    longer = np.where(length[a] >= length[b], a, b)
+    shorter = a + b - longer
+    return (main_length[longer] < length[longer]) & (length[shorter] <= main_length[longer])
+
+def _conflicting(index, pairs):
+    """Pairs of keys that are both DOIs, or both PMIDs (keys of an index all differ)"""
+    kinds = index['kinds']
+    return (kinds[pairs[:, 0]] == kinds[pairs[:, 1]]) & (kinds[pairs[:, 0]] > 0)
+
+def _key_edges(index, first_new=0):
+    """Pairs of keys judged to be the same publication, involving a key numbered first_new or above"""
+    edges = []
+    if 'title_signatures' in index:
+        pairs = similar_pairs(index['title_signatures'], index['title_sizes'], MIN_TITLE_SHINGLES,
+                              containment=True, first_new=first_new)
+        edges.append(pairs[~(_numbers_differ(index, pairs) | _subtitle_only(index, pairs))])
+    if 'abstract_signatures' in index:
+        edges.append(similar_pairs(index['abstract_signatures'], index['abstract_sizes'],
+                                   MIN_ABSTRACT_SHINGLES, first_new=first_new))
+    edges = np.concatenate(edges) if edges else np.empty((0, 2), dtype=np.int64)
+    return edges[~_conflicting(index, edges)]
+
+def _components(edges, n_keys):
+    graph = sparse.coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])),
+                              shape=(n_keys, n_keys))
+    return connected_components(graph, directed=False)[1]
+
+def _first_rows(codes):
+    """Row of the first appearance of each code (codes numbered by first appearance, -1 skipped)"""
+    keyed = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[keyed], return_index=True)
+    return keyed[first]
+
+def publication_index(df, abstracts=None):
+    """
+    pub_id per row of df (a Series on df.index) and the key index of df;
+    rows sharing a publication key, or whose keys are near-duplicates by
+    title or abstract, share a pub_id. Rows without any key are
+    publications of their own.
+
+    `abstracts` is an optional TextColumn of the source (df.index holding
+    source row positions); only one abstract per key is read.
+    """
+    keys = publication_keys(df)
+    codes, uniques = pd.factorize(keys)
+    representatives = _first_rows(codes)
+    texts = None
+    if abstracts is not None:
+        texts = abstracts.take(df.index.to_numpy()[representatives])
+    index = _key_index(df, pd.Series(uniques, dtype=object), representatives, texts)
+    labels = _components(_key_edges(index), len(uniques))
+
+    unkeyed = codes < 0
+    row_labels = np.where(unkeyed, 0, labels[np.maximum(codes, 0)])
+    row_labels[unkeyed] = labels.max(initial=-1) + 1 + np.arange(unkeyed.sum())
+    pub_ids, _ = pd.factorize(row_labels)
+    pub_ids = pub_ids.astype(np.int64)
+    index['pub_ids'] = pub_ids[representatives]
+    index['next_id'] = np.array([pub_ids.max(initial=-1) + 1], dtype=np.int64)
+    return pd.Series(pub_ids, index=df.index, name='pub_id'), index
+
+def canonical_publication_ids(df, abstracts=None):
+    """pub_id per row of df (see publication_index)"""
+    return publication_index(df, abstracts)[0]
+
+def extend_publication_ids(index, df, abstracts=None):
+    """
+    pub_id per row of df, rows appended after the ones `index` was built
+    from, and the extended key index
+
+    Rows with a stored key keep its pub_id. New keys are compared with the
+    stored ones through the stored signatures, so only the new rows are
+    shingled and hashed. Stored pub_ids never change: a new key similar to
+    several stored publications joins the lowest of their ids (a rebuild
+    would merge them). New publications are numbered from next_id in order
+    of first appearance, as a rebuild numbers them.
+
+    `abstracts` is an optional Series of the new rows' abstracts, aligned
+    with df.
+    """
+    keys = publication_keys(df)
+    codes, uniques = pd.factorize(keys)
+    uniques = pd.Series(uniques, dtype=object)
+    stored = pd.Index(index['key_hashes']).get_indexer(key_hashes(uniques))
+    new = np.flatnonzero(stored < 0)
+    n_stored = len(index['key_hashes'])
+
+    unique_ids = np.full(len(uniques), -1, dtype=np.int64)
+    unique_ids[stored >= 0] = index['pub_ids'][stored[stored >= 0]]
+    pending = np.full(len(uniques), -1, dtype=np.int64)
+    if len(new):
+        representatives = _first_rows(codes)[new]
+        texts = None
+        if 'abstract_signatures' in index:
+            texts = (pd.Series(abstracts, dtype=object).iloc[representatives]
+                     if abstracts is not None else pd.Series('', index=range(len(new))))
+        added = _key_index(df, uniques.iloc[new], representatives, texts)
+        combined = {name: np.concatenate([index[name], added[name]]) for name in added}
+        labels = _components(_key_edges(combined, first_new=n_stored), n_stored + len(new))
+        joined = pd.Series(index['pub_ids']).groupby(labels[:n_stored]).min() \
+            .reindex(labels[n_stored:]).to_numpy()
+        known = ~np.isnan(joined)
+        unique_ids[new[known]] = joined[known].astype(np.int64)
+        pending[new[~known]] = labels[n_stored:][~known]
+
+    keyed = codes >= 0
+    row_ids = np.where(keyed, unique_ids[np.maximum(codes, 0)], -1)
+    tokens = np.where(keyed, pending[np.maximum(codes, 0)], -1)
+    tokens[~keyed] = n_stored + len(new) + np.arange((~keyed).sum())
+    fresh = row_ids < 0
+    fresh_ids, _ = pd.factorize(tokens[fresh])
+    next_id = int(index['next_id'][0])
+    row_ids[fresh] = next_id + fresh_ids
+
+    extended = dict(index)
+    if len(new):
+        added['pub_ids'] = row_ids[representatives]
+        extended = {name: np.concatenate([index[name], added[name]]) for name in added}
+    extended['next_id'] = np.array([max(next_id, row_ids.max(initial=-1) + 1)], dtype=np.int64)
+    return pd.Series(row_ids, index=df.index, name='pub_id'), extended
+
+def merged_groups(df, pub_ids):
+    """Rows of publications assembled from more than one key, for review"""
+    title_column = next((c for c in TITLE_COLUMNS if c in df.columns), None)
+    table = pd.DataFrame({'pub_id': pub_ids, 'publication_key': publication_keys(df),
+                          'title': df[title_column] if title_column else np.nan})
+    table = table.dropna(subset=['publication_key'])
+    n_keys = table.groupby('pub_id')['publication_key'].transform('nunique')
+    table = table[n_keys > 1]
+    return table.groupby(['pub_id', 'publication_key'], sort=True).agg(
+        title=('title', 'first'), rows=('title', 'size')).reset_index()
+
+def main():
+    from mention_store import load_columns, publication_ids, source_columns
+    from run_context import current_context, mention_table
+
+    parser = argparse.ArgumentParser(description='Report near-duplicate publications')
+    parser.add_argument('--data', help='mention table (default: the run context\'s)')
+    parser.add_argument('--output', help='default: publication_duplicates.csv in the output root')
+    args = parser.parse_args()
+    args.data = mention_table(args.data)
+    args.output = args.output or os.path.join(current_context().root, 'publication_duplicates.csv')
+
+    df = load_columns(args.data, key_columns(source_columns(args.data)))
+    pub_ids = publication_ids(args.data)
+    groups = merged_groups(df, pub_ids)
+    groups.to_csv(args.output, index=False)
+
+    n_keys = publication_keys(df).nunique()
+    print(f"✓ {len(df):,} rows, {n_keys:,} exact publication keys, "
+          f"{len(np.unique(pub_ids)):,} publications after near-duplicate merging")
+    print(f"✓ {groups['pub_id'].nunique():,} publications merged from "
+          f"{len(groups):,} keys -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Cached, Incremental Network Layouts
+Force-directed layout for the host-parasite, co-occurrence and
+collaboration networks
+
+Drop-in replacement for nx.spring_layout (same k / iterations / seed
+semantics) with two differences:
+- Repulsion uses a sparse-grid approximation: node pairs closer than one
+  grid cell are computed exactly (KD-tree), more distant nodes only see the
+  centroid of each occupied cell. Cost per iteration is roughly
+  O(n * cells + edges) instead of O(n^2).
+- Node positions of the latest graph are persisted per layout name, keyed
+  by repr(node), with the edges they were computed for. An unchanged graph gets its cached
+  positions back untouched. When most nodes of a graph are cached the
+  layout warm-starts from them with a low temperature and only new nodes
+  and the endpoints of added, removed or reweighted edges move, so
+  positions stay stable across runs.
+"""
+
+import os
+import json
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from profiling import profiled
+
+LAYOUT_CACHE_VERSION = 2
+
+# Far-field grid is at most MAX_GRID x MAX_GRID cells
+MAX_GRID = 16
+
+# Rows processed at a time in the far-field pass (bounds peak memory)
+FAR_FIELD_CHUNK = 4096
+
+# ============================================================================
+# FORCE COMPUTATION
+# ============================================================================
+
+def _accumulate(disp, index, forces):
+    """Scatter-add (m, 2) forces into the rows of disp given by index"""
+    n = len(disp)
+    disp[:, 0] += np.bincount(index, forces[:, 0], minlength=n)
+    disp[:, 1] += np.bincount(index, forces[:, 1], minlength=n)
+
+def _repulsion(pos, k):
+    """
+    Repulsive displacement (magnitude k^2 / d) for every node
+    Exact below one grid cell, cell-centroid approximation above it
+    """
+    n = len(pos)
+    disp = np.zeros_like(pos)
+
+    lo = pos.min(axis=0)
+    extent = max(float((pos.max(axis=0) - lo).max()), 1e-9)
+    grid = int(np.clip(np.sqrt(n), 1, MAX_GRID))
+    cell = extent / grid
+    radius = 1.5 * cell
+
+    # Near field: exact pairwise forces
+    pairs = cKDTree(pos).query_pairs(r=radius, output_type='ndarray')
+    if len(pairs):
+        i, j = pairs[:, 0], pairs[:, 1]
+        delta = pos[i] - pos[j]
+        dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-4)
+        forces = (k * k / dist2)[:, None] * delta
+        _accumulate(disp, i, forces)
+        _accumulate(disp, j, -forces)
+
+    # Far field: occupied cells act as point masses at their centroids
+    if grid > 1:
+        ij = np.minimum(((pos - lo) / cell).astype(int), grid - 1)
+        cell_id = ij[:, 0] * grid + ij[:, 1]
+        counts = np.bincount(cell_id, minlength=grid * grid)
+        occupied = np.flatnonzero(counts)
+        mass = counts[occupied].astype(float)
+        centroids = np.column_stack([
+            np.bincount(cell_id, pos[:, 0], grid * grid)[occupied] / mass,
+            np.bincount(cell_id, pos[:, 1], grid * grid)[occupied] / mass,
+        ])
+
+        # sum_c w_nc * (p_n - c_c) = p_n * sum_c w_nc - (W @ C)_n
+        centroid_sq = (centroids ** 2).sum(axis=1)
+        for start in range(0, n, FAR_FIELD_CHUNK):
+            block = pos[start:start + FAR_FIELD_CHUNK]
+            dist2 = (block ** 2).sum(axis=1)[:, None] + centroid_sq[None, :] \
+                - 2.0 * block @ centroids.T
+            weight = np.where(dist2 > radius * radius,
+                              mass / np.maximum(dist2, 1e-4), 0.0) * (k * k)
+            disp[start:start + FAR_FIELD_CHUNK] += \
+                block * weight.sum(axis=1)[:, None] - weight @ centroids
+
+    return disp
+
+def _attraction(pos, edges_u, edges_v, weights, k):
+    """Attractive displacement (magnitude w * d^2 / k) along every edge"""
+    disp = np.zeros_like(pos)
+    if len(edges_u) == 0:
+        return disp
+    delta = pos[edges_u] - pos[edges_v]
+    dist = np.sqrt((delta ** 2).sum(axis=1))
+    forces = (weights * dist / k)[:, None] * delta
+    _accumulate(disp, edges_u, -forces)
+    _accumulate(disp, edges_v, forces)
+    return disp
+
+def _fruchterman_reingold(pos, edges_u, edges_v, weights, k, iterations,
+                          temperature, threshold=1e-4, movable=None):
+    """
+    Run the cooling schedule used by nx.spring_layout on the grid forces
+    Nodes outside the `movable` mask (all nodes by default) stay pinned
+    """
+    n = len(pos)
+    dt = temperature / (iterations + 1)
+    for _ in range(iterations):
+        disp = _repulsion(pos, k) + _attraction(pos, edges_u, edges_v, weights, k)
+        length = np.sqrt((disp ** 2).sum(axis=1))
+        length = np.where(length < 0.01, 0.1, length)
+        step = disp * (temperature / length)[:, None]
+        if movable is not None:
+            step[~movable] = 0.0
+        pos += step
+        temperature -= dt
+        if np.linalg.norm(step) / n < threshold:
+            break
+    return pos
+
+def _rescale(pos, scale=1.0):
+    """Center on the origin and scale so the largest coordinate is `scale`"""
+    pos = pos - pos.mean(axis=0)
+    lim = np.abs(pos).max()
+    if lim > 0:
+        pos = pos * (scale / lim)
+    return pos
+
+# ============================================================================
+# POSITION CACHE
+# ============================================================================
+
+def _cache_path(cache_dir, name):
+    return os.path.join(cache_dir, f"{name}.layout.json")
+
+def _load_cache(cache_dir, name, k):
+    path = _cache_path(cache_dir, name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as handle:
+            cached = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if cached.get('version') != LAYOUT_CACHE_VERSION or cached.get('k') != k:
+        return {}
+    return cached
+
+def load_cached_positions(cache_dir, name, k):
+    """Cached raw positions {node_id: (x, y)} or {} if absent/incompatible"""
+    return _load_cache(cache_dir, name, k).get('positions', {})
+
+def load_cached_edges(cache_dir, name, k):
+    """
+    Edges of the last cached layout {(node_id, node_id): weight}, endpoints
+    in sorted order; {} if absent/incompatible
+    """
+    edges = _load_cache(cache_dir, name, k).get('edges', [])
+    return {(u, v): w for u, v, w in edges}
+
+def save_cached_positions(cache_dir, name, k, node_ids, pos, edges=None):
+    """
+    Persist raw positions keyed by node id and the edges
+    {(node_id, node_id): weight} they were computed for, replacing the
+    previous entry: only the nodes of the current graph are kept
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    positions = {node: [float(x), float(y)] for node, (x, y) in zip(node_ids, pos)}
+
+    path = _cache_path(cache_dir, name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as handle:
+        json.dump({'version': LAYOUT_CACHE_VERSION, 'k': k, 'positions': positions,
+                   'edges': [[u, v, w] for (u, v), w in (edges or {}).items()]}, handle)
+    os.replace(tmp_path, path)
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+@profiled
+def compute_layout(G, k=None, iterations=50, seed=42, weight='weight',
+                   name=None, cache_dir=None, warm_start_threshold=0.8,
+                   warm_iterations=15, scale=1.0):
+    """
+    Force-directed layout for a networkx graph
+    Returns {node: np.array([x, y])} like nx.spring_layout
+
+    When `name` and `cache_dir` are given, positions are cached on disk and
+    reused: if every node is cached and the edges are those of the cached
+    layout, the cached positions are returned as they are. Otherwise, if at
+    least `warm_start_threshold` of the nodes are cached, the layout starts
+    from those positions (new nodes are placed at the centroid of their
+    cached neighbours) and runs `warm_iterations` low-temperature
+    iterations in which only new nodes and nodes whose edges changed move,
+    instead of a cold start. The cache is rewritten only when positions
+    or the node set changed, and then holds this graph's nodes only.
+    Nodes are cached by repr(node); ValueError if two nodes share one.
+    """
+    nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {nodes[0]: np.zeros(2)}
+
+    cache_k = k
+    if k is None:
+        k = 1.0 / np.sqrt(n)
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edge_list = [(index[u], index[v], float(d.get(weight, 1.0)) if weight else 1.0)
+                 for u, v, d in G.edges(data=True) if u != v]
+    edge_arr = np.array(edge_list, dtype=float).reshape(-1, 3)
+    edges_u = edge_arr[:, 0].astype(int)
+    edges_v = edge_arr[:, 1].astype(int)
+    weights = edge_arr[:, 2]
+
+    # Typed ids: str() would give 1 and '1' the same cached position
+    node_ids = [repr(node) for node in nodes]
+    if len(set(node_ids)) != n:
+        raise ValueError("compute_layout: distinct nodes share the same repr(), "
+                         "their cached positions would collide")
+    edge_weights = {tuple(sorted((node_ids[u], node_ids[v]))): w
+                    for u, v, w in zip(edges_u, edges_v, weights)}
+    rng = np.random.RandomState(seed)
+    use_cache = bool(name and cache_dir)
+    cached = load_cached_positions(cache_dir, name, cache_k) if use_cache else {}
+    known = np.array([node_id in cached for node_id in node_ids])
+    changed = True
+
+    if cached and known.mean() >= warm_start_threshold:
+        pos = np.zeros((n, 2))
+        pos[known] = [cached[node_id] for node_id, hit in zip(node_ids, known) if hit]
+        start = pos.copy()
+        extent = max(float(np.ptp(pos[known], axis=0).max()), k)
+
+        # Cached nodes stay pinned unless one of their edges changed
+        previous = load_cached_edges(cache_dir, name, cache_k)
+        touched = {node for pair in set(edge_weights) | set(previous)
+                   if edge_weights.get(pair) != previous.get(pair) for node in pair}
+        movable = ~known | np.array([node_id in touched for node_id in node_ids])
+
+        # Place new nodes next to their already-positioned neighbours
+        for i in np.flatnonzero(~known):
+            neighbours = [index[v] for v in G.neighbors(nodes[i]) if known[index[v]]]
+            centre = pos[neighbours].mean(axis=0) if neighbours else pos[known].mean(axis=0)
+            pos[i] = centre + (rng.rand(2) - 0.5) * k
+
+        if movable.any():
+            pos = _fruchterman_reingold(pos, edges_u, edges_v, weights, k, warm_iterations,
+                                        temperature=0.02 * extent, movable=movable)
+            mode = f"warm start, {known.sum()}/{n} nodes cached, {movable.sum()} moved"
+        else:
+            mode = "cached"
+        # Also rewrite when nodes were dropped, so the cache only holds this graph
+        changed = not np.array_equal(pos, start) or len(cached) != known.sum()
+    else:
+        pos = rng.rand(n, 2)
+        pos = _fruchterman_reingold(pos, edges_u, edges_v, weights, k,
+                                    iterations, temperature=0.1)
+        mode = "cold start"
+
+    if use_cache and changed:
+        save_cached_positions(cache_dir, name, cache_k, node_ids, pos, edge_weights)
+
+    print(f"✓ Layout: {n:,} nodes, {len(edges_u):,} edges ({mode})")
+    pos = _rescale(pos, scale)
+    return {node: pos[i] for i, node in enumerate(nodes)}
@@ -0,0 +1,338 @@
+"""
+Run Profiling
+Per-stage and per-function timing for the part scripts
+
+Each script splits its run into stages (loading, one stage per figure, the
+final output flush) with PROFILE.stage(); a stage lasts until the next one
+starts, or, used as a context manager, until its block ends. For every
+stage the registry records:
+- wall time and CPU time (process CPU, including the output-writer and
+  worker threads)
+- the process peak RSS at the end of the stage (resource.getrusage; it
+  only ever grows) and, with DATAANALYZ_TRACEMALLOC=1, the peak of Python
+  allocations during the stage (tracemalloc; slows the run noticeably)
+- rows in (given by the script) and rows out (rows of the tables saved in
+  the stage, unless the script sets them)
+- the files the output writer wrote for the stage (path and size), which
+  makes run_profile.json the output manifest of the part (see report.py);
+  the outputs of stages a run did not run (dataanalyz.py run --only or
+  --resume, daemon jobs) are carried over from the previous manifest
+
+Utility functions wrapped with @profiled are timed per call and summed per
+stage, and the background PNG/CSV writes of the output writer are charged
+to the stage that queued them.
+
+PROFILE.write(OUTPUT_DIR) stores <OUTPUT_DIR>/Profile/run_profile.json (stages,
+functions and outputs) and run_profile.csv (stages). summarize_profiles() collects
+the profiles of all parts into one table.
+
+Usage:
+    python profiling.py [OUTPUT_ROOT]
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+import threading
+import functools
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+PROFILE_DIR = 'Profile'
+PROFILE_STEM = 'run_profile'
+SUMMARY_FILE = 'run_profile_summary.csv'
+
+TRACE_MEMORY = os.environ.get('DATAANALYZ_TRACEMALLOC', '') not in ('', '0')
+
+STAGE_COLUMNS = ['Stage', 'Wall_s', 'CPU_s', 'Peak_RSS_MB', 'Traced_Peak_MB',
+                 'Rows_In', 'Rows_Out']
+FUNCTION_COLUMNS = ['Stage', 'Function', 'Calls', 'Wall_s', 'CPU_s', 'Rows_In', 'Rows_Out']
+OUTPUT_COLUMNS = ['Stage', 'Path', 'Bytes']
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def n_rows(value):
+    """Row count of a frame, series or array result (None for anything else)"""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return len(value)
+    shape = getattr(value, 'shape', None)
+    return int(shape[0]) if shape else None
+
+class _Stage:
+    """Context-manager handle of an open stage"""
+
+    def __init__(self, profile, record):
+        self.profile = profile
+        self.record = record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.close_stage(self.record)
+        return False
+
+class RunProfile:
+    """
+    Registry of the stages of one script run and of the profiled calls
+    made in them
+    """
+
+    def __init__(self, name=None):
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+        self.reset(name)
+
+    def reset(self, name=None):
+        """Start a new run (processes that run several scripts, see script_stages)"""
+        self.name = name or os.path.splitext(os.path.basename(sys.argv[0] or 'run'))[0]
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.functions = {}
+        self.outputs = []
+        self._current = None
+
+    def stage(self, name, rows_in=None):
+        """
+        Start stage `name`, closing the previous one; use the result as a
+        context manager to close the stage at the end of a block
+        """
+        self.close_stage()
+        if TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        record = {'Stage': name, 'Rows_In': rows_in, 'Rows_Out': None,
+                  '_tables': 0, '_wall': time.perf_counter(), '_cpu': time.process_time()}
+        self.stages.append(record)
+        self._current = record
+        return _Stage(self, record)
+
+    def current_stage(self):
+        """
+        Name of the open stage (None between stages); on a thread working
+        for a stage (see charged_to), that stage
+        """
+        charged = getattr(self._thread, 'charged', None)
+        if charged:
+            return charged[-1]
+        record = self._current
+        return record['Stage'] if record is not None else None
+
+    @contextlib.contextmanager
+    def charged_to(self, stage):
+        """Make `stage` the current stage of this thread within the block (worker threads)"""
+        charged = self._thread.__dict__.setdefault('charged', [])
+        charged.append(stage)
+        try:
+            yield
+        finally:
+            charged.pop()
+
+    def rows_out(self, n):
+        """Set the rows-out count of the open stage"""
+        if self._current is not None:
+            self._current['Rows_Out'] = n
+
+    def close_stage(self, record=None):
+        """Close the open stage (or `record`, if it is still open)"""
+        current = self._current
+        if current is None or (record is not None and record is not current):
+            return
+        current['Wall_s'] = time.perf_counter() - current.pop('_wall')
+        current['CPU_s'] = time.process_time() - current.pop('_cpu')
+        current['Peak_RSS_MB'] = peak_rss_mb()
+        current['Traced_Peak_MB'] = (tracemalloc.get_traced_memory()[1] / 2**20
+                                     if tracemalloc.is_tracing() else None)
+        tables = current.pop('_tables')
+        if current['Rows_Out'] is None and tables:
+            current['Rows_Out'] = tables
+        self._current = None
+
+    def record_call(self, function, wall, cpu, rows_in=None, rows_out=None, stage=None):
+        """Add one call of `function` to its per-stage totals"""
+        stage = stage if stage is not None else self.current_stage()
+        with self._lock:
+            totals = self.functions.setdefault((stage, function), {
+                'Calls': 0, 'Wall_s': 0.0, 'CPU_s': 0.0, 'Rows_In': None, 'Rows_Out': None})
+            totals['Calls'] += 1
+            totals['Wall_s'] += wall
+            totals['CPU_s'] += cpu
+            # Row counts stay empty for functions that never see a table
+            for key, rows in (('Rows_In', rows_in), ('Rows_Out', rows_out)):
+                if rows is not None:
+                    totals[key] = (totals[key] or 0) + rows
+
+    def record_output(self, path, stage=None):
+        """Add a file written for `stage` (default: the open stage) to the output manifest"""
+        stage = stage if stage is not None else self.current_stage()
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        with self._lock:
+            self.outputs.append({'Stage': stage, 'Path': os.path.abspath(path), 'Bytes': size})
+
+    def record_table(self, rows):
+        """Count the rows of a table saved in the open stage"""
+        current = self._current
+        if current is not None:
+            current['_tables'] += rows
+
+    def stage_table(self):
+        self.close_stage()
+        return pd.DataFrame(self.stages, columns=STAGE_COLUMNS)
+
+    def function_table(self):
+        rows = [{'Stage': stage, 'Function': function, **totals}
+                for (stage, function), totals in self.functions.items()]
+        return pd.DataFrame(rows, columns=FUNCTION_COLUMNS)
+
+    def output_table(self, output_dir):
+        """Files written under output_dir (paths relative to it), latest write of each"""
+        root = os.path.abspath(output_dir)
+        latest = {}
+        with self._lock:
+            for record in self.outputs:
+                if os.path.commonpath([root, record['Path']]) == root:
+                    latest[record['Path']] = dict(record, Path=os.path.relpath(record['Path'], root))
+        return pd.DataFrame(list(latest.values()), columns=OUTPUT_COLUMNS)
+
+    def write(self, output_dir):
+        """Write run_profile.json/.csv under <output_dir>/Profile and print the stage table"""
+        stages = self.stage_table()
+        functions = self.function_table()
+        profile_dir = os.path.join(output_dir, PROFILE_DIR)
+        os.makedirs(profile_dir, exist_ok=True)
+        json_path = os.path.join(profile_dir, f'{PROFILE_STEM}.json')
+        outputs = _records(self.output_table(output_dir))
+        outputs += _carried_outputs(json_path, set(stages['Stage']),
+                                    {output['Path'] for output in outputs})
+        payload = {'name': self.name, 'started': self.started,
+                   'total_wall_s': float(stages['Wall_s'].sum()),
+                   'total_cpu_s': float(stages['CPU_s'].sum()),
+                   'peak_rss_mb': peak_rss_mb(),
+                   'stages': _records(stages), 'functions': _records(functions),
+                   'outputs': outputs}
+        with open(json_path, 'w', encoding='utf-8') as handle:
+            json.dump(payload, handle, indent=2)
+        stages.to_csv(os.path.join(profile_dir, f'{PROFILE_STEM}.csv'), index=False)
+
+        print_stage_table(stages, title=f"Run profile: {self.name}")
+        print(f"✓ Run profile: {json_path}")
+        return json_path
+
+def _carried_outputs(json_path, ran, written):
+    """
+    Outputs of the previous manifest at json_path from stages not in `ran`
+    and not rewritten by this run: a selective run replaces the outputs of
+    the stages it ran and keeps the others listed
+    """
+    try:
+        with open(json_path, encoding='utf-8') as handle:
+            previous = json.load(handle).get('outputs') or []
+    except (OSError, ValueError, AttributeError):
+        return []
+    return [output for output in previous
+            if output.get('Stage') not in ran and output.get('Path') not in written]
+
+def _records(table):
+    """Table rows as JSON-ready dicts (NaN as null)"""
+    return json.loads(table.to_json(orient='records'))
+
+# Registry used by the part scripts and by @profiled
+PROFILE = RunProfile()
+
+def profiled(func=None, *, name=None):
+    """
+    Decorator timing each call of a function into PROFILE, under the stage
+    open when the call is made; rows in/out are taken from the first
+    argument and the result when they are frames, series or arrays
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        PROFILE.record_call(label, time.perf_counter() - wall, time.process_time() - cpu,
+                            rows_in=n_rows(args[0]) if args else None,
+                            rows_out=n_rows(result))
+        return result
+    return wrapper
+
+def print_stage_table(stages, title="Run profile"):
+    """Print a stage table with each stage's share of the wall time"""
+    total = stages['Wall_s'].sum()
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+    print(f"{'Stage':<28}{'Wall s':>9}{'CPU s':>9}{'Share':>8}{'RSS MB':>9}{'Rows in':>10}{'Rows out':>10}")
+    for row in stages.itertuples(index=False):
+        share = row.Wall_s / total if total else 0.0
+        rows_in = '' if pd.isna(row.Rows_In) else f"{int(row.Rows_In):,}"
+        rows_out = '' if pd.isna(row.Rows_Out) else f"{int(row.Rows_Out):,}"
+        print(f"{str(row.Stage)[:27]:<28}{row.Wall_s:>9.2f}{row.CPU_s:>9.2f}{share:>8.1%}"
+              f"{row.Peak_RSS_MB:>9.0f}{rows_in:>10}{rows_out:>10}")
+    print(f"{'Total':<28}{total:>9.2f}{stages['CPU_s'].sum():>9.2f}")
+
+# ============================================================================
+# PIPELINE SUMMARY
+# ============================================================================
+
+def load_profiles(output_root):
+    """Stage tables of every PART_N_ANALYSIS/Profile/run_profile.json under output_root"""
+    tables = []
+    for entry in sorted(os.listdir(output_root)):
+        path = os.path.join(output_root, entry, PROFILE_DIR, f'{PROFILE_STEM}.json')
+        if not (entry.startswith('PART_') and os.path.exists(path)):
+            continue
+        with open(path, encoding='utf-8') as handle:
+            payload = json.load(handle)
+        stages = pd.DataFrame(payload['stages'], columns=STAGE_COLUMNS)
+        stages.insert(0, 'Part', entry.replace('_ANALYSIS', ''))
+        stages.insert(1, 'Started', payload.get('started'))
+        tables.append(stages)
+    return pd.concat(tables, ignore_index=True) if tables else None
+
+def summarize_profiles(output_root):
+    """
+    Per-part totals and the slowest stages across the pipeline, written to
+    <output_root>/run_profile_summary.csv (every stage of every part)
+    """
+    stages = load_profiles(output_root)
+    if stages is None:
+        print(f"⚠ No run profiles found under {output_root}")
+        return None
+    stages['Share'] = stages['Wall_s'] / stages['Wall_s'].sum()
+    stages.to_csv(os.path.join(output_root, SUMMARY_FILE), index=False)
+
+    parts = stages.groupby('Part', sort=True).agg(
+        Started=('Started', 'first'), Wall_s=('Wall_s', 'sum'), CPU_s=('CPU_s', 'sum'),
+        Peak_RSS_MB=('Peak_RSS_MB', 'max'))
+    print("\n" + "="*70)
+    print("PIPELINE RUN PROFILE")
+    print("="*70)
+    print(f"{'Part':<10}{'Started':<22}{'Wall s':>9}{'CPU s':>9}{'RSS MB':>9}")
+    for part, row in parts.iterrows():
+        print(f"{part:<10}{str(row['Started']):<22}{row['Wall_s']:>9.2f}{row['CPU_s']:>9.2f}"
+              f"{row['Peak_RSS_MB']:>9.0f}")
+    print(f"{'Total':<32}{parts['Wall_s'].sum():>9.2f}{parts['CPU_s'].sum():>9.2f}")
+
+    print("\nSlowest stages:")
+    for row in stages.nlargest(10, 'Wall_s').itertuples(index=False):
+        print(f"  {row.Part:<8} {str(row.Stage):<24}{row.Wall_s:>9.2f}s {row.Share:>7.1%}")
+    print(f"\n✓ Pipeline profile: {os.path.join(output_root, SUMMARY_FILE)}")
+    return stages
+
+if __name__ == "__main__":
+    from run_context import current_context
+    summarize_profiles(sys.argv[1] if len(sys.argv) > 1 else current_context().root)
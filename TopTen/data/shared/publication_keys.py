@@ -0,0 +1,106 @@
+"""
+Publication Keys
+Normalized identifiers for matching publications across batches and tracks
+
+A publication is identified by the first available of:
+- DOI   (lowercase, resolver prefixes removed)       -> 'doi:10.1016/...'
+- PMID  (digits only)                                -> 'pmid:12345678'
+- title (lowercase, punctuation and spacing folded)  -> 'title:<sha1 prefix>'
+
+The CSV mention table carries one row per genus/species mention, so a
+publication usually spans several rows; mention_keys adds the taxon to tell
+those rows apart.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+DOI_COLUMNS = ('doi', 'DOI')
+PMID_COLUMNS = ('pmid', 'PMID', 'PubMed ID')
+TITLE_COLUMNS = ('title', 'Title')
+
+_DOI_PREFIX = r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)'
+
+def _first_column(df, candidates):
+    return next((c for c in candidates if c in df.columns), None)
+
+def key_columns(columns):
+    """Source columns publication_keys reads, among `columns`"""
+    return [c for c in DOI_COLUMNS + PMID_COLUMNS + TITLE_COLUMNS if c in columns]
+
+def _as_text(values):
+    """Object Series of strings, missing values kept as NaN"""
+    return pd.Series(values, dtype=object).map(lambda v: v if pd.isna(v) else str(v))
+
+def normalize_doi(values):
+    doi = _as_text(values).str.strip().str.lower()
+    doi = doi.str.replace(_DOI_PREFIX, '', regex=True)
+    return doi.where(doi.str.startswith('10.'))
+
+def normalize_pmid(values):
+    pmid = _as_text(values).str.replace(r'\.0$', '', regex=True)
+    pmid = pmid.str.replace(r'\D', '', regex=True).str.lstrip('0')
+    return pmid.where(pmid.str.len() > 0)
+
+def normalize_title(values):
+    title = _as_text(values).str.lower()
+    title = title.str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip()
+    return title.where(title.str.len() > 0)
+
+def _title_digest(title):
+    return hashlib.sha1(title.encode('utf-8')).hexdigest()[:16]
+
+def _title_keys(values):
+    titles = normalize_title(values)
+    return pd.Series([np.nan if pd.isna(t) else 'title:' + _title_digest(t) for t in titles],
+                     dtype=object)
+
+KEY_KINDS = (('doi', DOI_COLUMNS, lambda values: 'doi:' + normalize_doi(values)),
+             ('pmid', PMID_COLUMNS, lambda values: 'pmid:' + normalize_pmid(values)),
+             ('title', TITLE_COLUMNS, _title_keys))
+
+def _keys_from(values, make_keys):
+    """make_keys applied once per distinct value of a column, broadcast to rows"""
+    codes, uniques = pd.factorize(values)
+    keys = make_keys(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    # Code -1 (missing value) picks the trailing NaN
+    return pd.Series(np.append(keys, np.nan)[codes], index=values.index, dtype=object)
+
+def keys_by_kind(df):
+    """
+    {'doi' | 'pmid' | 'title': key per row of df (NaN where missing)} for
+    the identifiers df carries, in precedence order
+    """
+    return {kind: _keys_from(df[column], make_keys)
+            for kind, candidates, make_keys in KEY_KINDS
+            if (column := _first_column(df, candidates)) is not None}
+
+def publication_keys(df):
+    """
+    One key string per row of df (NaN where no identifier is available),
+    the first of its DOI, PMID and title keys, computed once per distinct
+    identifier value
+    """
+    keys = pd.Series(np.nan, index=df.index, dtype=object)
+    for kind_keys in keys_by_kind(df).values():
+        keys = keys.fillna(kind_keys)
+    return keys
+
+def key_hashes(keys):
+    """Stable 64-bit hashes of key strings (0 for missing keys)"""
+    keys = pd.Series(keys, dtype=object)
+    hashes = pd.util.hash_array(keys.fillna('').to_numpy(dtype=object))
+    return np.where(keys.isna().to_numpy(), np.uint64(0), hashes)
+
+def mention_keys(df, publication=None):
+    """
+    64-bit hash of (publication key, Genus, Species) per row, 0 where the
+    publication has no key
+    """
+    if publication is None:
+        publication = publication_keys(df)
+    taxon = df['Genus'].astype(object).fillna('') + '|' + df['Species'].astype(object).fillna('')
+    combined = publication.astype(object) + '|' + taxon
+    return key_hashes(combined.where(publication.notna()))
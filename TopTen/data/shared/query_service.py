@@ -0,0 +1,392 @@
+"""
+Query Service
+Local HTTP API answering slice and roll-up queries over the aggregate cube
+
+Dashboards can ask questions such as "citations per year for Pratylenchus
+in Brazil" here instead of reading the CSVs under PART_*_ANALYSIS/Tables.
+Answers come from the query facts of the aggregate cube (chunked_engine):
+records, citation sum and citation maximum per year, genus, species and
+journal, and per country on exploded rows. Queries that filter or group on
+country, or ask for n_countries, use the per-country facts, where a record
+listing several countries counts once for each of them.
+
+GET  /query?genus=Pratylenchus&country=Brazil&group_by=year&metrics=citations
+     filters    year_from, year_to, genus, species, country, journal
+                (repeat a parameter or separate values with commas; names
+                match case-insensitively, countries through the alias table
+                of countries.py)
+     group_by   year, decade, genus, species, country, journal
+     metrics    records, citations, mean_citations, max_citations,
+                n_genera, n_species, n_countries, n_journals
+                (default: records, citations)
+     sort       a metric or group column, '-' prefix for descending
+     limit      maximum number of rows returned
+POST /query                    the same fields as a JSON object
+GET  /values?dimension=genus   values of one dimension, by record count
+GET  /dimensions               dimensions, metrics, cube and cache state
+POST /refresh                  reload the cube now
+
+Answers are kept in an LRU cache. Before answering, the service compares
+the source fingerprint with that of the loaded cube. When the source has
+changed (an ingest.py batch, a new export), the cube is reloaded, or
+rebuilt by streaming, and the cache is cleared.
+
+Usage:
+    python query_service.py [--data FILE] [--port 8766] [--cache-size 256]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from http import HTTPStatus
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from chunked_engine import cube_aggregates
+from run_context import mention_table
+from mention_store import source_fingerprint
+from countries import country_lists
+
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8766
+DEFAULT_CACHE_SIZE = 256
+
+# API name -> fact column
+DIMENSIONS = {'year': 'pub_year', 'decade': 'Decade', 'genus': 'Genus',
+              'species': 'Species', 'country': 'Country', 'journal': 'journal'}
+FILTERS = ('genus', 'species', 'country', 'journal')
+METRICS = ('records', 'citations', 'mean_citations', 'max_citations',
+           'n_genera', 'n_species', 'n_countries', 'n_journals')
+DEFAULT_METRICS = ('records', 'citations')
+DISTINCT_METRICS = {'n_genera': 'Genus', 'n_species': 'Species',
+                    'n_countries': 'Country', 'n_journals': 'journal'}
+CATEGORY_COLUMNS = ('Genus', 'Species', 'journal', 'Country')
+
+Query = namedtuple('Query', 'filters years group_by metrics sort limit')
+
+class LRUCache:
+    """Least-recently-used cache of query answers"""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self):
+        return {'entries': len(self._items), 'size': self.size,
+                'hits': self.hits, 'misses': self.misses}
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+def _values(raw):
+    """Values of a parameter given as a list, a comma-separated string or a scalar"""
+    if raw is None:
+        return []
+    items = raw if isinstance(raw, (list, tuple)) else [raw]
+    return [part.strip() for item in items for part in str(item).split(',') if part.strip()]
+
+def _country_values(raw):
+    """Canonical countries of a country parameter ("Korea, Republic of" stays whole)"""
+    items = raw if isinstance(raw, (list, tuple)) else [] if raw is None else [raw]
+    _, lists = country_lists(pd.Series([str(item) for item in items], dtype=object))
+    return [country for countries in lists for country in countries]
+
+def _integer(params, name):
+    values = _values(params.get(name))
+    if not values:
+        return None
+    try:
+        return int(values[0])
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, not {values[0]!r}") from None
+
+def parse_query(params):
+    """Query from request parameters (dict of values or lists); ValueError when invalid"""
+    known = set(FILTERS) | {'year_from', 'year_to', 'group_by', 'metrics', 'sort', 'limit'}
+    unknown = sorted(set(params) - known)
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}")
+
+    filters = []
+    for name in FILTERS:
+        values = _country_values(params.get(name)) if name == 'country' else _values(params.get(name))
+        if values:
+            filters.append((name, tuple(sorted({value.casefold() for value in values}))))
+
+    group_by = tuple(dict.fromkeys(_values(params.get('group_by'))))
+    metrics = tuple(dict.fromkeys(_values(params.get('metrics')))) or DEFAULT_METRICS
+    for kind, names, allowed in (('group_by', group_by, DIMENSIONS), ('metric', metrics, METRICS)):
+        bad = [name for name in names if name not in allowed]
+        if bad:
+            raise ValueError(f"Unknown {kind}: {', '.join(bad)} (choose from {', '.join(allowed)})")
+
+    sort = _values(params.get('sort'))
+    sort = sort[0] if sort else None
+    if sort is not None and sort.lstrip('-') not in group_by + metrics:
+        raise ValueError(f"sort must name a group_by column or a metric, not {sort!r}")
+    limit = _integer(params, 'limit')
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be positive")
+    return Query(tuple(filters), (_integer(params, 'year_from'), _integer(params, 'year_to')),
+                 group_by, metrics, sort, limit)
+
+def _describe(query):
+    """JSON form of a query, as echoed in answers"""
+    return {'filters': dict(query.filters), 'year_from': query.years[0], 'year_to': query.years[1],
+            'group_by': list(query.group_by), 'metrics': list(query.metrics),
+            'sort': query.sort, 'limit': query.limit}
+
+class QueryFacts:
+    """Query fact tables of one cube, text keys as categoricals (missing = NaN)"""
+
+    def __init__(self, aggregates, fingerprint):
+        self.fingerprint = fingerprint
+        self.token = (fingerprint['size'], fingerprint['mtime_ns'])
+        self.tables = {}
+        for name in ('query', 'query_country'):
+            if name not in aggregates:
+                continue
+            table = aggregates[name].result()
+            for column in table.columns.intersection(CATEGORY_COLUMNS):
+                values = table[column].astype('category')
+                if '' in values.cat.categories:
+                    values = values.cat.remove_categories([''])
+                table[column] = values
+            self.tables[name] = table
+        self._folded = {}
+
+    def _table(self, query):
+        by_country = 'country' in query.group_by or any(n == 'country' for n, _ in query.filters)
+        by_country |= 'n_countries' in query.metrics
+        name = 'query_country' if by_country else 'query'
+        if name not in self.tables:
+            raise ValueError("The source has no country columns")
+        return name, self.tables[name]
+
+    def _matches(self, name, table, column, values):
+        """Row mask of a case-insensitive isin on a categorical column"""
+        key = (name, column)
+        if key not in self._folded:
+            self._folded[key] = table[column].cat.categories.str.casefold()
+        wanted = np.append(self._folded[key].isin(values), False)
+        # Code -1 (missing value) picks the trailing False
+        return wanted[table[column].cat.codes.to_numpy()]
+
+    def answer(self, query):
+        """{'query', 'rows', 'n_rows', 'truncated'} for one query"""
+        name, table = self._table(query)
+        mask = np.ones(len(table), dtype=bool)
+        years = table['pub_year'].to_numpy()
+        if query.years[0] is not None:
+            mask &= years >= query.years[0]
+        if query.years[1] is not None:
+            mask &= years <= query.years[1]
+        for dimension, values in query.filters:
+            mask &= self._matches(name, table, DIMENSIONS[dimension], values)
+        rows = table[mask]
+        if 'decade' in query.group_by:
+            rows = rows.assign(Decade=rows['pub_year'] // 10 * 10)
+
+        result = _metric_table(rows, [DIMENSIONS[g] for g in query.group_by], query.metrics)
+        if query.sort is not None:
+            column = query.sort.lstrip('-')
+            result = result.sort_values(column, ascending=not query.sort.startswith('-'),
+                                        kind='stable')
+        n_rows = len(result)
+        if query.limit is not None:
+            result = result.head(query.limit)
+        return {'query': _describe(query), 'rows': json.loads(result.to_json(orient='records')),
+                'n_rows': n_rows, 'truncated': len(result) < n_rows}
+
+    def values(self, dimension):
+        """Values of a dimension with their record counts, most records first"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r} (choose from {', '.join(DIMENSIONS)})")
+        table = self.tables['query_country' if dimension == 'country' else 'query']
+        if dimension == 'decade':
+            table = table.assign(Decade=table['pub_year'] // 10 * 10)
+        counts = table.groupby(DIMENSIONS[dimension], observed=True)['n'].sum()
+        counts = counts.sort_values(ascending=False, kind='stable')
+        return {'dimension': dimension,
+                'values': [{'value': value.item() if hasattr(value, 'item') else value,
+                            'records': int(n)} for value, n in counts.items()]}
+
+def _metric_table(rows, keys, metrics):
+    """Requested metrics of fact rows, per group of `keys` (one row without keys)"""
+    spec = {}
+    if {'records', 'mean_citations'} & set(metrics):
+        spec['records'] = ('n', 'sum')
+    if {'citations', 'mean_citations'} & set(metrics):
+        spec['citations'] = ('citations_sum', 'sum')
+    if 'max_citations' in metrics:
+        spec['max_citations'] = ('citations_max', 'max')
+    for metric in metrics:
+        if metric in DISTINCT_METRICS:
+            spec[metric] = (DISTINCT_METRICS[metric], 'nunique')
+
+    if keys:
+        result = rows.groupby(keys, observed=True, dropna=False).agg(**spec).reset_index()
+        for key in keys:
+            if isinstance(result[key].dtype, pd.CategoricalDtype):
+                result[key] = result[key].astype(object)
+    else:
+        result = pd.DataFrame({name: [getattr(rows[column], how)()] for name, (column, how) in spec.items()})
+    if 'mean_citations' in metrics:
+        result['mean_citations'] = result['citations'] / result['records'].where(result['records'] > 0)
+    names = {column: api for api, column in DIMENSIONS.items()}
+    return result[keys + list(metrics)].rename(columns=names)
+
+# ============================================================================
+# SERVICE
+# ============================================================================
+
+class QueryService:
+    """Cube, cache and HTTP handling of the query API"""
+
+    def __init__(self, source=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.source = os.path.abspath(mention_table(source))
+        self.cache = LRUCache(cache_size)
+        self.facts = None
+        self.loads = 0
+        self._reload = asyncio.Lock()
+
+    def _load(self):
+        fingerprint = source_fingerprint(self.source)
+        aggregates, _ = cube_aggregates(self.source)
+        return QueryFacts(aggregates, fingerprint)
+
+    async def current_facts(self, force=False):
+        """Facts of the current source, reloaded when the source changed"""
+        def stale():
+            return (force or self.facts is None
+                    or self.facts.fingerprint != source_fingerprint(self.source))
+        if stale():
+            async with self._reload:
+                if stale():
+                    self.facts = await asyncio.to_thread(self._load)
+                    self.loads += 1
+                    self.cache.clear()
+                    force = False
+        return self.facts
+
+    async def _cached(self, key, compute):
+        facts = await self.current_facts()
+        key = (facts.token,) + key
+        answer = self.cache.get(key)
+        if answer is not None:
+            return answer, True
+        answer = await asyncio.to_thread(compute, facts)
+        self.cache.put(key, answer)
+        return answer, False
+
+    async def dispatch(self, method, target, body):
+        """(status, payload) of one request"""
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if method == 'POST' and url.path == '/query':
+            params = json.loads(body or b'{}')
+            if not isinstance(params, dict):
+                raise ValueError("Request body must be a JSON object")
+
+        if url.path == '/query' and method in ('GET', 'POST'):
+            started = time.perf_counter()
+            query = parse_query(params)
+            answer, cached = await self._cached(('query', query), lambda facts: facts.answer(query))
+            return HTTPStatus.OK, {**answer, 'cached': cached,
+                                   'elapsed_ms': round(1000 * (time.perf_counter() - started), 3)}
+        if url.path == '/values' and method == 'GET':
+            dimension = (_values(params.get('dimension')) or [''])[0]
+            answer, _ = await self._cached(('values', dimension), lambda facts: facts.values(dimension))
+            return HTTPStatus.OK, answer
+        if url.path == '/dimensions' and method == 'GET':
+            facts = await self.current_facts()
+            return HTTPStatus.OK, {'dimensions': list(DIMENSIONS), 'filters': list(FILTERS),
+                                   'metrics': list(METRICS), 'source': facts.fingerprint,
+                                   'facts': {name: len(table) for name, table in facts.tables.items()},
+                                   'loads': self.loads, 'cache': self.cache.stats()}
+        if url.path == '/refresh' and method == 'POST':
+            facts = await self.current_facts(force=True)
+            return HTTPStatus.OK, {'source': facts.fingerprint, 'loads': self.loads}
+        return HTTPStatus.NOT_FOUND, {'error': f"No route for {method} {url.path}"}
+
+    async def handle(self, reader, writer):
+        """One HTTP/1.1 request per connection"""
+        try:
+            method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length') or 0))
+            status, payload = await self.dispatch(method.upper(), target, body)
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            status, payload = HTTPStatus.BAD_REQUEST, {'error': str(error)}
+        except Exception as error:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(error).__name__}: {error}"}
+
+        data = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode('latin-1') + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(source=None, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE):
+    service = QueryService(source, cache_size)
+    facts = await service.current_facts()
+    server = await asyncio.start_server(service.handle, HOST, port)
+    print(f"✓ Query facts: {', '.join(f'{n} {len(t):,} rows' for n, t in facts.tables.items())}")
+    print(f"✓ Query service listening on http://{HOST}:{server.sockets[0].getsockname()[1]}")
+    sys.stdout.flush()
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate query API over the cube')
+    parser.add_argument('--data', help='mention CSV (default: the run context\'s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='answers kept in the LRU cache')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.data, args.port, args.cache_size))
+    except KeyboardInterrupt:
+        print("\n✓ Query service stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Report Assembly
+One navigable page over the figures, tables and run profiles of a run
+
+The summaries that used to be written by hand (ANALYSIS_SUMMARY.md, the
+per-part README.md files) drift from what the scripts actually produce.
+The report is generated from the outputs instead:
+- the output manifest of each part, the `outputs` of
+  Profile/run_profile.json (see profiling.py): every figure and table the
+  latest run of each stage wrote (selective runs keep the other stages'
+  entries), and the stage that wrote it. Files in Charts/ and Tables/ that
+  the manifest does not list are left over from earlier runs and are
+  marked stale
+- a thumbnail of every figure: the 600 DPI PNG downscaled to THUMB_WIDTH
+  pixels and reduced to a 256-colour palette, made in a pool of
+  worker_count() processes (run_context.py). A thumbnail is only redone
+  when its figure is newer
+- an excerpt of every table: its first EXCERPT_ROWS rows and
+  EXCERPT_COLUMNS columns, with the full row count
+- the stage timings of each part's run profile
+
+Everything goes to <output root>/Report/: index.html (contents, one section
+per part; thumbnails link to the full-resolution figures, excerpts to the
+CSVs), REPORT.md (the same in Markdown) and thumbs/. Links are relative,
+so the output root can be copied or archived as a whole.
+
+Usage:
+    python report.py [--context FILE] [--output-root DIR] [--parts 1 2] [--workers 4]
+"""
+
+import os
+import re
+import ast
+import sys
+import html
+import json
+import time
+import argparse
+import multiprocessing
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from run_context import add_arguments, context_from_args, use_context, worker_count
+from profiling import PROFILE_DIR, PROFILE_STEM
+
+PARTS = tuple(range(1, 8))
+REPORT_DIRNAME = 'Report'
+THUMB_DIRNAME = 'thumbs'
+HTML_FILE = 'index.html'
+MARKDOWN_FILE = 'REPORT.md'
+THUMB_WIDTH = 640
+EXCERPT_ROWS = 8
+EXCERPT_COLUMNS = 8
+
+def _natural_key(path):
+    """Fig2 before Fig10"""
+    return [int(t) if t.isdigit() else t.lower()
+            for t in re.split(r'(\d+)', os.path.basename(path))]
+
+def _caption(path):
+    return os.path.splitext(os.path.basename(path))[0].replace('_', ' ')
+
+def _link(path, start):
+    """Relative URL of path as seen from the directory start"""
+    return quote(os.path.relpath(path, start).replace(os.sep, '/'))
+
+def _size(n_bytes):
+    if n_bytes < 1024:
+        return f"{n_bytes} B"
+    if n_bytes < 1024 ** 2:
+        return f"{n_bytes / 1024:.1f} KB"
+    return f"{n_bytes / 1024 ** 2:.1f} MB"
+
+def part_title(part):
+    """Title line of the part's analysis script ('PART 1: Species & Taxonomic Analysis')"""
+    from script_stages import script_path
+    try:
+        with open(script_path(part), encoding='utf-8') as handle:
+            docstring = ast.get_docstring(ast.parse(handle.read())) or ''
+    except (OSError, ValueError, SyntaxError):
+        docstring = ''
+    title = docstring.strip().splitlines()[0] if docstring.strip() else f"PART {part}"
+    return title.split(' - ')[0].strip()
+
+# ============================================================================
+# COLLECTING
+# ============================================================================
+
+def load_profile(part_dir):
+    """run_profile.json of a part directory (None if the part has no profile)"""
+    path = os.path.join(part_dir, PROFILE_DIR, f'{PROFILE_STEM}.json')
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+def collect_part(part, part_dir):
+    """
+    Figures, tables and profile of one part directory. Each output is a
+    dict with path, stage (None if unknown), bytes and stale (None when
+    the part has no manifest to tell)
+    """
+    profile = load_profile(part_dir)
+    manifest = None
+    if profile is not None and profile.get('outputs') is not None:
+        manifest = {os.path.normpath(os.path.join(part_dir, o['Path'])): o['Stage']
+                    for o in profile['outputs']}
+
+    def outputs(subdir, extension):
+        directory = os.path.join(part_dir, subdir)
+        if not os.path.isdir(directory):
+            return []
+        paths = sorted((os.path.normpath(os.path.join(directory, name))
+                        for name in os.listdir(directory)
+                        if name.lower().endswith(extension)), key=_natural_key)
+        return [{'path': path,
+                 'stage': manifest.get(path) if manifest else None,
+                 'bytes': os.path.getsize(path),
+                 'stale': None if manifest is None else path not in manifest}
+                for path in paths]
+
+    return {'part': part, 'title': part_title(part), 'dir': part_dir, 'profile': profile,
+            'figures': outputs('Charts', '.png'), 'tables': outputs('Tables', '.csv')}
+
+def table_excerpt(path, rows=EXCERPT_ROWS, columns=EXCERPT_COLUMNS):
+    """(first rows and columns of a CSV table, its row count, its column count)"""
+    try:
+        head = pd.read_csv(path, nrows=rows)
+        n_rows = len(pd.read_csv(path, usecols=[0])) if len(head) == rows else len(head)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, ValueError, OSError):
+        return None, 0, 0
+    return head.iloc[:, :columns], n_rows, head.shape[1]
+
+# ============================================================================
+# THUMBNAILS
+# ============================================================================
+
+def make_thumbnail(task):
+    """Downscale one figure (in a pool worker); returns the thumbnail's (width, height)"""
+    from PIL import Image
+    source, target, width = task
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        with Image.open(target) as image:
+            return image.size
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        image.thumbnail((width, width * 4), Image.LANCZOS, reducing_gap=3.0)
+        image = image.quantize(colors=256)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        image.save(tmp_path, format='PNG', optimize=True)
+    os.replace(tmp_path, target)
+    return image.size
+
+def make_thumbnails(tasks, jobs=None):
+    """make_thumbnail over (source, target, width) tasks, in forked workers when jobs > 1"""
+    jobs = jobs or worker_count()
+    if jobs <= 1 or len(tasks) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [make_thumbnail(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)),
+                             mp_context=multiprocessing.get_context('fork')) as pool:
+        return list(pool.map(make_thumbnail, tasks))
+
+# ============================================================================
+# RENDERING
+# ============================================================================
+
+def _stage_table(profile):
+    stages = pd.DataFrame(profile['stages'])
+    total = stages['Wall_s'].sum() or 1.0
+    return pd.DataFrame({
+        'Stage': stages['Stage'],
+        'Wall s': stages['Wall_s'].round(2),
+        'Share': (stages['Wall_s'] / total).map('{:.1%}'.format),
+        'RSS MB': stages['Peak_RSS_MB'].round(0).astype('Int64'),
+        'Rows out': stages['Rows_Out'].astype('Int64'),
+    })
+
+def _overview_table(parts):
+    rows = []
+    for p in parts:
+        profile = p['profile'] or {}
+        outputs = p['figures'] + p['tables']
+        # Unknown without a manifest (profiles of runs before the outputs were recorded)
+        stale = (sum(bool(o['stale']) for o in outputs)
+                 if any(o['stale'] is not None for o in outputs) else None)
+        rows.append({'Part': p['title'], 'Run': profile.get('started', 'no profile'),
+                     'Wall s': round(profile['total_wall_s'], 1) if profile else None,
+                     'Figures': len(p['figures']), 'Tables': len(p['tables']),
+                     'Stale': stale})
+    return pd.DataFrame(rows)
+
+def _cell(value):
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return ''
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+def _html_table(df):
+    head = ''.join(f"<th>{html.escape(str(c))}</th>" for c in df.columns)
+    body = ''.join('<tr>' + ''.join(f"<td>{html.escape(_cell(v))}</td>" for v in row) + '</tr>'
+                   for row in df.itertuples(index=False))
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def _markdown_table(df):
+    def escape(text):
+        return text.replace('|', '\\|').replace('\n', ' ')
+    lines = ['| ' + ' | '.join(escape(str(c)) for c in df.columns) + ' |',
+             '|' + '---|' * len(df.columns)]
+    lines += ['| ' + ' | '.join(escape(_cell(v)) for v in row) + ' |'
+              for row in df.itertuples(index=False)]
+    return '\n'.join(lines)
+
+def _anchor(part):
+    return f"part{part['part']}"
+
+def _output_note(output):
+    note = _size(output['bytes'])
+    if output['stage']:
+        note += f", {output['stage']}"
+    if output['stale']:
+        note += ', stale: not written by the latest run of any stage'
+    return note
+
+HTML_STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em auto; max-width: 1400px; color: #222; }
+nav { background: #f4f4f4; padding: 0.5em 1em; }
+table { border-collapse: collapse; font-size: 0.85em; margin: 0.5em 0 1.5em; }
+th, td { border: 1px solid #ccc; padding: 2px 6px; text-align: left; }
+th { background: #eee; }
+.figures { display: flex; flex-wrap: wrap; gap: 1em; }
+figure { margin: 0; width: 320px; }
+figure img { width: 100%; height: auto; border: 1px solid #ddd; }
+figcaption, .note { font-size: 0.8em; color: #555; }
+.stale { color: #b35900; }
+"""
+
+def render_html(parts, report_dir, thumbs, title):
+    out = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+           f"<style>{HTML_STYLE}</style></head><body>",
+           f"<h1>{html.escape(title)}</h1>",
+           f"<p class='note'>Generated {time.strftime('%Y-%m-%d %H:%M')} from the outputs "
+           f"under {html.escape(os.path.dirname(report_dir))}</p>",
+           "<nav><strong>Contents</strong><ul>"]
+    for p in parts:
+        out.append(f"<li><a href='#{_anchor(p)}'>{html.escape(p['title'])}</a> "
+                   f"({len(p['figures'])} figures, {len(p['tables'])} tables)</li>")
+    out.append("</ul></nav><h2>Overview</h2>" + _html_table(_overview_table(parts)))
+
+    for p in parts:
+        out.append(f"<h2 id='{_anchor(p)}'>{html.escape(p['title'])}</h2>")
+        if p['figures']:
+            out.append("<h3>Figures</h3><div class='figures'>")
+            for figure in p['figures']:
+                width, height = thumbs[figure['path']]
+                css = " class='stale'" if figure['stale'] else ''
+                out.append(
+                    f"<figure><a href='{_link(figure['path'], report_dir)}'>"
+                    f"<img src='{_link(thumb_path(report_dir, p, figure), report_dir)}' "
+                    f"width='{width}' height='{height}' loading='lazy' "
+                    f"alt='{html.escape(_caption(figure['path']))}'></a>"
+                    f"<figcaption{css}><strong>{html.escape(_caption(figure['path']))}</strong> "
+                    f"({html.escape(_output_note(figure))})</figcaption></figure>")
+            out.append("</div>")
+        if p['tables']:
+            out.append("<h3>Tables</h3>")
+            for table in p['tables']:
+                excerpt, n_rows, n_columns = table_excerpt(table['path'])
+                css = " class='stale'" if table['stale'] else ''
+                out.append(f"<h4><a href='{_link(table['path'], report_dir)}'>"
+                           f"{html.escape(_caption(table['path']))}</a></h4>"
+                           f"<p class='note'><span{css}>{n_rows:,} rows × {n_columns} columns, "
+                           f"{html.escape(_output_note(table))}</span></p>")
+                if excerpt is not None and len(excerpt.columns):
+                    out.append(_html_table(excerpt))
+        if p['profile']:
+            out.append(f"<h3>Run profile</h3><p class='note'>Run of {p['profile']['started']}: "
+                       f"{p['profile']['total_wall_s']:.1f}s wall, "
+                       f"{p['profile']['total_cpu_s']:.1f}s CPU, "
+                       f"peak RSS {p['profile']['peak_rss_mb']:.0f} MB</p>")
+            out.append(_html_table(_stage_table(p['profile'])))
+    out.append("</body></html>")
+    return '\n'.join(out)
+
+def render_markdown(parts, report_dir, thumbs, title):
+    out = [f"# {title}", '',
+           f"Generated {time.strftime('%Y-%m-%d %H:%M')} from the outputs under "
+           f"`{os.path.dirname(report_dir)}`", '', '## Contents', '']
+    for p in parts:
+        anchor = re.sub(r'[^\w\- ]', '', p['title'].lower()).replace(' ', '-')
+        out.append(f"- [{p['title']}](#{anchor}) "
+                   f"({len(p['figures'])} figures, {len(p['tables'])} tables)")
+    out += ['', '## Overview', '', _markdown_table(_overview_table(parts)), '']
+
+    for p in parts:
+        out += [f"## {p['title']}", '']
+        if p['figures']:
+            out += ['### Figures', '']
+            for figure in p['figures']:
+                caption = _caption(figure['path'])
+                out += [f"[![{caption}]({_link(thumb_path(report_dir, p, figure), report_dir)})]"
+                        f"({_link(figure['path'], report_dir)})",
+                        f"**{caption}** ({_output_note(figure)})", '']
+        if p['tables']:
+            out += ['### Tables', '']
+            for table in p['tables']:
+                excerpt, n_rows, n_columns = table_excerpt(table['path'])
+                out += [f"#### [{_caption(table['path'])}]({_link(table['path'], report_dir)})", '',
+                        f"{n_rows:,} rows × {n_columns} columns, {_output_note(table)}", '']
+                if excerpt is not None and len(excerpt.columns):
+                    out += [_markdown_table(excerpt), '']
+        if p['profile']:
+            out += ['### Run profile', '',
+                    f"Run of {p['profile']['started']}: {p['profile']['total_wall_s']:.1f}s wall, "
+                    f"{p['profile']['total_cpu_s']:.1f}s CPU, "
+                    f"peak RSS {p['profile']['peak_rss_mb']:.0f} MB", '',
+                    _markdown_table(_stage_table(p['profile'])), '']
+    return '\n'.join(out)
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def thumb_path(report_dir, part, figure):
+    return os.path.join(report_dir, THUMB_DIRNAME, f"PART_{part['part']}",
+                        os.path.basename(figure['path']))
+
+def assemble_report(output_root, parts=PARTS, jobs=None, title=None):
+    """
+    Write <output_root>/Report/{index.html, REPORT.md, thumbs/} over the
+    parts that have outputs; returns the path of index.html (None if no
+    part has any)
+    """
+    from run_context import RunContext
+    context = RunContext(output_root=output_root)
+    collected = [collect_part(part, context.part_dir(part)) for part in parts]
+    collected = [p for p in collected if p['figures'] or p['tables'] or p['profile']]
+    if not collected:
+        print(f"⚠ No part outputs found under {output_root}")
+        return None
+
+    report_dir = os.path.join(output_root, REPORT_DIRNAME)
+    tasks = []
+    for p in collected:
+        thumb_dir = os.path.join(report_dir, THUMB_DIRNAME, f"PART_{p['part']}")
+        os.makedirs(thumb_dir, exist_ok=True)
+        tasks += [(f['path'], thumb_path(report_dir, p, f), THUMB_WIDTH) for f in p['figures']]
+        # Thumbnails of figures that are gone
+        current = {os.path.basename(f['path']) for f in p['figures']}
+        for name in os.listdir(thumb_dir):
+            if name not in current:
+                os.remove(os.path.join(thumb_dir, name))
+    started = time.perf_counter()
+    sizes = make_thumbnails(tasks, jobs)
+    thumbs = {source: size for (source, _, _), size in zip(tasks, sizes)}
+    print(f"✓ {len(tasks)} thumbnails in {time.perf_counter() - started:.1f}s")
+
+    title = title or f"Analysis Report: {os.path.basename(os.path.abspath(output_root))}"
+    html_path = os.path.join(report_dir, HTML_FILE)
+    for path, render in ((html_path, render_html),
+                         (os.path.join(report_dir, MARKDOWN_FILE), render_markdown)):
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(render(collected, report_dir, thumbs, title))
+    stale = sum(bool(o['stale']) for p in collected for o in p['figures'] + p['tables'])
+    if stale:
+        print(f"⚠ {stale} outputs are not in the output manifest (marked stale)")
+    print(f"✓ Report: {html_path}")
+    return html_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble the HTML/Markdown report of a run')
+    parser.add_argument('--parts', type=int, nargs='+', default=list(PARTS), choices=PARTS,
+                        metavar='N', help='parts to include (default: all)')
+    parser.add_argument('--title', help='report title (default: from the output root)')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        context = use_context(context_from_args(args))
+        path = assemble_report(context.root, args.parts, title=args.title)
+    except (OSError, ValueError) as error:
+        print(f"ERROR: {error}")
+        sys.exit(2)
+    sys.exit(0 if path else 1)
+
+if __name__ == "__main__":
+    main()
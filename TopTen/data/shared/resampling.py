@@ -0,0 +1,238 @@
+"""
+Resampling Engine
+Vectorized bootstrap and permutation statistics for figure annotations
+
+Resample indices are drawn as (B, n) matrices, chunk by chunk, and each
+chunk evaluates the statistic for every resample and every group with array
+operations instead of one Python-level call per resample.
+
+Every chunk gets its own child seed spawned from a single SeedSequence and
+the chunk layout depends only on the data size, so results are identical
+for a given seed however many worker threads process the chunks.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from run_context import worker_count
+
+DEFAULT_RESAMPLES = 2000
+
+# Resamples per chunk, reduced for large inputs so a chunk's (B, n) index
+# matrix stays below MAX_CHUNK_CELLS entries
+CHUNK_RESAMPLES = 250
+MAX_CHUNK_CELLS = 2 ** 23
+
+# ============================================================================
+# CHUNKED EXECUTION
+# ============================================================================
+
+def _run_chunks(func, n_resamples, n, seed, n_jobs=None):
+    """
+    Evaluate func(rng, size) over chunks of `n_resamples` resamples and
+    stack the results along the first axis
+    """
+    rows = max(1, min(CHUNK_RESAMPLES, MAX_CHUNK_CELLS // max(n, 1)))
+    sizes = [min(rows, n_resamples - start) for start in range(0, n_resamples, rows)]
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    tasks = [(np.random.default_rng(child), size)
+             for child, size in zip(root.spawn(len(sizes)), sizes)]
+
+    if n_jobs is None:
+        n_jobs = worker_count()
+    if n_jobs <= 1 or len(tasks) == 1:
+        results = [func(rng, size) for rng, size in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(lambda task: func(*task), tasks))
+    return np.concatenate(results, axis=0)
+
+def _percentile_ci(samples, confidence):
+    """Percentile interval along the resample axis"""
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanpercentile(samples, [100 * alpha, 100 * (1 - alpha)], axis=0)
+    return lower, upper
+
+def _permutation_p_value(observed, permuted):
+    """Two-sided permutation p-value with the +1 correction"""
+    extreme = (np.abs(permuted) >= np.abs(observed) - 1e-12).sum(axis=0)
+    return (extreme + 1) / (len(permuted) + 1)
+
+# ============================================================================
+# GROUP STATISTICS
+# ============================================================================
+
+def _group_layout(values, groups):
+    """
+    Drop missing values and sort by group so every group is a contiguous
+    block; returns (values, codes, labels, sizes, starts)
+    """
+    values = np.asarray(values, dtype=float)
+    if groups is None:
+        codes = np.zeros(len(values), dtype=np.int64)
+        labels = np.array(['All'], dtype=object)
+    else:
+        codes, labels = pd.factorize(pd.Series(groups).reset_index(drop=True), sort=True)
+        labels = np.asarray(labels, dtype=object)
+
+    keep = ~np.isnan(values) & (codes >= 0)
+    values, codes = values[keep], codes[keep]
+
+    # Groups left empty by the NaN filter are dropped
+    present = np.bincount(codes, minlength=len(labels)) > 0
+    remap = np.cumsum(present) - 1
+    codes, labels = remap[codes], labels[present]
+
+    order = np.argsort(codes, kind='stable')
+    values, codes = values[order], codes[order]
+    sizes = np.bincount(codes, minlength=len(labels))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    return values, codes, labels, sizes, starts
+
+def _group_statistic(sample, starts, sizes, statistic):
+    """Statistic of every contiguous group block along the last axis"""
+    if statistic == 'mean':
+        return np.add.reduceat(sample, starts, axis=-1) / sizes
+    if statistic == 'median':
+        return np.stack([np.median(sample[..., start:start + size], axis=-1)
+                         for start, size in zip(starts, sizes)], axis=-1)
+    raise ValueError(f"Unknown statistic '{statistic}' (expected 'mean' or 'median')")
+
+@profiled
+def bootstrap_group_stats(values, groups=None, statistic='mean', confidence=0.95,
+                          n_resamples=DEFAULT_RESAMPLES, seed=42, n_jobs=None):
+    """
+    Point estimate and percentile bootstrap CI of `statistic` ('mean' or
+    'median') for every group at once
+
+    Resampling is stratified: each group is resampled with replacement
+    within itself, all groups sharing one (B, n) index matrix.
+    Returns a DataFrame with Group, N, Estimate, CI_Lower, CI_Upper
+    """
+    values, codes, labels, sizes, starts = _group_layout(values, groups)
+    columns = ['Group', 'N', 'Estimate', 'CI_Lower', 'CI_Upper']
+    if len(values) == 0:
+        return pd.DataFrame(columns=columns)
+
+    row_start, row_size = starts[codes], sizes[codes]
+
+    def chunk(rng, size):
+        idx = row_start + (rng.random((size, len(values))) * row_size).astype(np.int64)
+        return _group_statistic(values[idx], starts, sizes, statistic)
+
+    boot = _run_chunks(chunk, n_resamples, len(values), seed, n_jobs)
+    lower, upper = _percentile_ci(boot, confidence)
+    return pd.DataFrame({
+        'Group': labels,
+        'N': sizes,
+        'Estimate': _group_statistic(values, starts, sizes, statistic),
+        'CI_Lower': lower,
+        'CI_Upper': upper,
+    }, columns=columns)
+
+@profiled
+def permutation_group_differences(values, groups, n_resamples=DEFAULT_RESAMPLES,
+                                  seed=42, n_jobs=None):
+    """
+    Difference in means between each group and all remaining observations,
+    with a two-sided permutation p-value, for every group at once
+
+    Each resample permutes the group labels; all group sums of a chunk come
+    from a single bincount over the (B, n) permuted label matrix.
+    Returns a DataFrame with Group, N, Mean, Mean_Rest, Difference, P_Value
+    """
+    values, codes, labels, sizes, starts = _group_layout(values, groups)
+    n, n_groups = len(values), len(labels)
+    columns = ['Group', 'N', 'Mean', 'Mean_Rest', 'Difference', 'P_Value']
+    if n_groups < 2:
+        return pd.DataFrame(columns=columns)
+
+    total = values.sum()
+    rest_sizes = np.maximum(n - sizes, 1)
+
+    def differences(group_sums):
+        return group_sums / sizes - (total - group_sums) / rest_sizes
+
+    def chunk(rng, size):
+        permuted = rng.permuted(np.broadcast_to(codes, (size, n)), axis=1)
+        offsets = (np.arange(size) * n_groups)[:, None]
+        sums = np.bincount((permuted + offsets).ravel(), np.tile(values, size),
+                           minlength=size * n_groups).reshape(size, n_groups)
+        return differences(sums)
+
+    observed_sums = np.add.reduceat(values, starts)
+    observed = differences(observed_sums)
+    permuted = _run_chunks(chunk, n_resamples, n, seed, n_jobs)
+    return pd.DataFrame({
+        'Group': labels,
+        'N': sizes,
+        'Mean': observed_sums / sizes,
+        'Mean_Rest': (total - observed_sums) / rest_sizes,
+        'Difference': observed,
+        'P_Value': _permutation_p_value(observed, permuted),
+    }, columns=columns)
+
+@profiled
+def permutation_test(a, b, n_resamples=DEFAULT_RESAMPLES, seed=42, n_jobs=None):
+    """
+    Two-sample permutation test on the difference in means (a - b)
+    Returns dict with difference and two-sided p_value
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    values = np.concatenate([a, b])
+    groups = np.concatenate([np.zeros(len(a), dtype=int), np.ones(len(b), dtype=int)])
+    result = permutation_group_differences(values, groups, n_resamples, seed, n_jobs)
+    if len(result) < 2:
+        return {'difference': np.nan, 'p_value': np.nan}
+    first = result.iloc[0]
+    return {'difference': float(first['Difference']), 'p_value': float(first['P_Value'])}
+
+# ============================================================================
+# CORRELATION
+# ============================================================================
+
+def _row_pearson(x, y):
+    """Pearson r of every row pair of two (B, n) matrices"""
+    xc = x - x.mean(axis=-1, keepdims=True)
+    yc = y - y.mean(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (xc * yc).sum(axis=-1) / np.sqrt((xc ** 2).sum(axis=-1) * (yc ** 2).sum(axis=-1))
+
+@profiled
+def bootstrap_correlation(x, y, confidence=0.95, n_resamples=DEFAULT_RESAMPLES,
+                          seed=42, n_jobs=None):
+    """
+    Pearson r with a percentile bootstrap CI (resampling pairs) and a
+    two-sided permutation p-value (permuting y against x)
+    Returns dict with r, ci_lower, ci_upper, p_value, n
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+    n = len(x)
+    r = float(_row_pearson(x, y)) if n >= 3 else np.nan
+    if not np.isfinite(r):
+        return {'r': r, 'ci_lower': np.nan, 'ci_upper': np.nan, 'p_value': np.nan, 'n': n}
+
+    boot_seed, perm_seed = np.random.SeedSequence(seed).spawn(2)
+
+    def boot_chunk(rng, size):
+        idx = rng.integers(0, n, (size, n))
+        return _row_pearson(x[idx], y[idx])
+
+    # With y standardized once, r for a permutation is a single dot product
+    zx = (x - x.mean()) / x.std()
+    zy = (y - y.mean()) / y.std()
+
+    def perm_chunk(rng, size):
+        permuted = rng.permuted(np.broadcast_to(zy, (size, n)), axis=1)
+        return permuted @ zx / n
+
+    boot = _run_chunks(boot_chunk, n_resamples, n, boot_seed, n_jobs)
+    ci_lower, ci_upper = _percentile_ci(boot, confidence)
+    permuted = _run_chunks(perm_chunk, n_resamples, n, perm_seed, n_jobs)
+    return {'r': r, 'ci_lower': float(ci_lower), 'ci_upper': float(ci_upper),
+            'p_value': float(_permutation_p_value(r, permuted)), 'n': n}
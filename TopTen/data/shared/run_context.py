@@ -0,0 +1,236 @@
+"""
+Run Context
+Track, dataset, output root, cache directory and worker count of one run
+
+A RunContext replaces the paths the part scripts used to hard-code, so
+several runs (different datasets, corpus slices) can go side by side on one
+machine without overwriting each other:
+- track         the analysis track: the directory holding the part scripts
+                (PART_N_ANALYSIS/Code), Real_Analyses or NematodeAnalysis;
+                a path or one of the track directory names. Default: the
+                track of the running script, else Real_Analyses
+- data_file     the mention table the scripts load (their DATA_FILE)
+- output_root   directory holding PART_N_ANALYSIS/{Charts,Tables,Profile};
+                default: the track directory
+- cache_dir     root of the mention caches (see mention_store); default:
+                .mention_cache next to the data file
+- workers       worker processes/threads of text_store.map and the
+                resampling functions; default: min(4, CPUs)
+- name          label of the run (log file names, batch slices)
+- subset        a corpus slice (see slices.py): apply_analysis_filters
+                keeps only its rows
+Fields left unset fall back to the defaults the script passes in.
+
+A process has one current context, taken from (first match):
+1. use_context(context): dataanalyz.py, the daemon and batch runs
+2. the JSON file named by $DATAANALYZ_CONTEXT, which is how plain script
+   runs and subprocesses (run_all_improvements.sh) receive it
+Relative paths in a context file are relative to the file.
+
+The shared modules live in shared/, next to the track directories; both
+tracks import them from there.
+
+Usage:
+    from run_context import current_context
+    CONTEXT = current_context(track=BASE_DIR, data_file=f'{BASE_DIR}/ALL_NEMATODES_EXTRACTED.csv')
+    DATA_FILE, OUTPUT_DIR = CONTEXT.data_file, CONTEXT.part_dir(1)
+
+    python run_context.py show [--context FILE] [--track NematodeAnalysis] [--data CSV] ...
+    python run_context.py get output_root [--context FILE]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+CONTEXT_ENV = 'DATAANALYZ_CONTEXT'
+FIELDS = ('name', 'track', 'data_file', 'output_root', 'cache_dir', 'workers', 'subset')
+PATH_FIELDS = ('data_file', 'output_root', 'cache_dir')
+# TopTen/data: the track directories and shared/
+DATA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACKS = ('Real_Analyses', 'NematodeAnalysis')
+DEFAULT_TRACK = os.path.join(DATA_ROOT, TRACKS[0])
+LOG_DIRNAME = 'Logs'
+# Mention table of the CSV track (default of the tools that stream it) and
+# publication table of the xlsx track
+MENTIONS_FILE = os.path.join(DATA_ROOT, 'Real_Analyses', 'ALL_NEMATODES_EXTRACTED.csv')
+PUBLICATIONS_FILE = os.path.join(DATA_ROOT, 'Final_Nema_Data.xlsx')
+
+def resolve_track(track, base=None):
+    """Directory of a track given as a path (relative to base) or a track directory name"""
+    for candidate in (os.path.join(base or os.getcwd(), os.path.expanduser(track)),
+                      os.path.join(DATA_ROOT, track)):
+        if os.path.isdir(candidate):
+            return os.path.abspath(candidate)
+    raise ValueError(f"Unknown track {track!r} (a directory, or one of {', '.join(TRACKS)})")
+
+class RunContext:
+    """Where a run reads from and writes to, and how many workers it uses"""
+
+    def __init__(self, data_file=None, output_root=None, cache_dir=None, workers=None,
+                 name=None, subset=None, track=None):
+        self.track = resolve_track(track) if track else None
+        self.data_file = os.path.abspath(data_file) if data_file else None
+        self.output_root = os.path.abspath(output_root) if output_root else None
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        self.workers = int(workers) if workers else None
+        if self.workers is not None and self.workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        self.name = name
+        self.subset = subset
+
+    def __repr__(self):
+        fields = ', '.join(f"{k}={v!r}" for k, v in self.to_dict().items() if v is not None)
+        return f"RunContext({fields})"
+
+    @classmethod
+    def from_file(cls, path):
+        """Context from a JSON file (relative paths are relative to the file)"""
+        with open(path, encoding='utf-8') as handle:
+            payload = json.load(handle)
+        unknown = set(payload) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"{path}: unknown run context fields {', '.join(sorted(unknown))} "
+                             f"(known: {', '.join(FIELDS)})")
+        base = os.path.dirname(os.path.abspath(path))
+        for field in PATH_FIELDS:
+            if payload.get(field):
+                payload[field] = os.path.join(base, os.path.expanduser(payload[field]))
+        if payload.get('track'):
+            payload['track'] = resolve_track(payload['track'], base)
+        return cls(**payload)
+
+    @classmethod
+    def from_args(cls, args):
+        """Context from the add_arguments options: --context, overridden by the others"""
+        context = cls.from_file(args.context) if args.context else cls()
+        return context.replace(track=args.track, data_file=args.data, output_root=args.output_root,
+                               cache_dir=args.cache_dir, workers=args.workers, name=args.name)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+
+    def replace(self, **fields):
+        """Copy with the given fields set (None leaves a field as it is)"""
+        values = self.to_dict()
+        values.update({k: v for k, v in fields.items() if v is not None})
+        return RunContext(**values)
+
+    def with_defaults(self, **defaults):
+        """Copy with the unset fields taken from defaults"""
+        values = {k: v for k, v in defaults.items() if v is not None}
+        values.update({k: v for k, v in self.to_dict().items() if v is not None})
+        return RunContext(**values)
+
+    @property
+    def track_dir(self):
+        return self.track or DEFAULT_TRACK
+
+    @property
+    def root(self):
+        return self.output_root or self.track_dir
+
+    def part_dir(self, part):
+        """PART_N_ANALYSIS under the output root (the output writer creates it)"""
+        n = ''.join(ch for ch in str(part) if ch.isdigit())
+        return os.path.join(self.root, f'PART_{n}_ANALYSIS')
+
+    @property
+    def log_dir(self):
+        return os.path.join(self.root, LOG_DIRNAME)
+
+    def worker_count(self):
+        return self.workers or min(4, os.cpu_count() or 1)
+
+# ============================================================================
+# CURRENT CONTEXT
+# ============================================================================
+
+_CURRENT = None
+
+def use_context(context):
+    """Make `context` the current context of this process; returns it"""
+    global _CURRENT
+    _CURRENT = context
+    return context
+
+def current_context(**defaults):
+    """The current context, with its unset fields taken from defaults"""
+    global _CURRENT
+    if _CURRENT is None:
+        path = os.environ.get(CONTEXT_ENV)
+        _CURRENT = RunContext.from_file(path) if path else RunContext()
+    return _CURRENT.with_defaults(**defaults) if defaults else _CURRENT
+
+def mention_table(source=None):
+    """source, else the data file of the current context, else MENTIONS_FILE"""
+    return source or current_context().data_file or MENTIONS_FILE
+
+def worker_count():
+    """Workers for parallel sections: the context's, else min(4, CPUs)"""
+    return current_context().worker_count()
+
+def cache_root(source):
+    """
+    Mention cache directory of `source` under the context's cache_dir (None
+    when the context sets none); the path hash keeps equally named sources
+    from different directories apart
+    """
+    root = current_context().cache_dir
+    if not root:
+        return None
+    source = os.path.abspath(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(root, f"{name}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}")
+
+def add_arguments(parser):
+    """Run context options of a command line"""
+    group = parser.add_argument_group('run context')
+    group.add_argument('--context', metavar='FILE',
+                       help=f'run context JSON file (default: ${CONTEXT_ENV})')
+    group.add_argument('--track', metavar='TRACK',
+                       help=f'analysis track: {" or ".join(TRACKS)}, or its directory')
+    group.add_argument('--data', metavar='FILE', help='mention table to analyse')
+    group.add_argument('--output-root', metavar='DIR', help='directory for PART_N_ANALYSIS outputs')
+    group.add_argument('--cache-dir', metavar='DIR', help='root of the mention caches')
+    group.add_argument('--workers', type=int, help='worker processes/threads')
+    group.add_argument('--name', help='label of the run')
+    return parser
+
+def context_from_args(args):
+    """Context from the command line, on top of $DATAANALYZ_CONTEXT when no --context is given"""
+    if not args.context and os.environ.get(CONTEXT_ENV):
+        args.context = os.environ[CONTEXT_ENV]
+    return RunContext.from_args(args)
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the resolved run context')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add_arguments(commands.add_parser('show', help='print the context as JSON'))
+    get = add_arguments(commands.add_parser('get', help='print one field'))
+    get.add_argument('field', choices=FIELDS + ('log_dir',))
+    args = parser.parse_args()
+
+    try:
+        context = context_from_args(args)
+    except (OSError, ValueError) as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        sys.exit(2)
+    if args.command == 'show':
+        print(json.dumps(context.with_defaults(track=context.track_dir,
+                                               output_root=context.root).to_dict(), indent=2))
+    elif args.field == 'log_dir':
+        print(context.log_dir)
+    else:
+        value = {'output_root': context.root, 'track': context.track_dir}.get(
+            args.field, getattr(context, args.field))
+        print('' if value is None else value)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Script Stages
+Figure/table registry of the part scripts and selective execution
+
+The part scripts are top-level code divided into profiled stages
+(PROFILE.stage('Load'), 'Fig1', ..., 'Flush outputs'). ScriptStages parses a
+script into those stages:
+- the statements before the 'Load' call form a 'Setup' stage
+- the banner prints right before a stage call belong to that stage
+- every other statement belongs to the stage open at that point
+
+For every stage it records the figures and tables it saves (Fig4,
+Table3, ... from the save_figure/save_table paths) and the names it reads
+before assigning them. A stage needs, for each such name, the latest
+earlier stage that assigns it plus every stage in between that modifies
+it in place (item or attribute assignment, inplace=True, append, ...), and
+recursively what those stages need.
+
+A selective run executes Setup, Load, the requested stages with the stages
+they need, and the statements of the final stage whose names are all
+defined by then (the output flush and the profile, not the summary lines
+of figures that were not made). The statements are compiled from the
+script itself, so tracebacks point at the script's own lines. Stages run
+one after another in a shared namespace, which lets checkpoints.py save
+each stage's results and skip up-to-date stages on a resumed run.
+
+Usage:
+    from script_stages import ScriptStages
+    ScriptStages.for_part('part1').run(['Fig4', 'Table3'])
+"""
+
+import os
+import ast
+import time
+
+from profiling import PROFILE
+
+# Analysis script of part N in either track
+SCRIPT_NAMES = ('part{n}_real_data.py', 'part{n}_improved_complete.py')
+SETUP_STAGE = 'Setup'
+ALWAYS_STAGES = (SETUP_STAGE, 'Load')
+SAVE_FUNCTIONS = ('save_figure', 'save_table')
+
+# Methods that modify the object they are called on
+MUTATING_METHODS = frozenset({
+    'append', 'extend', 'insert', 'update', 'pop', 'remove', 'clear', 'sort',
+    'add', 'discard', 'setdefault', 'add_node', 'add_edge', 'add_nodes_from',
+    'add_edges_from', 'remove_node', 'remove_edge', 'remove_nodes_from',
+})
+
+def script_path(part, base_dir=None):
+    """
+    Analysis script of `part` ('part1', 'PART_1', '1', ...) under base_dir
+    (default: the track of the run context)
+    """
+    if base_dir is None:
+        from run_context import current_context
+        base_dir = current_context().track_dir
+    n = ''.join(ch for ch in str(part) if ch.isdigit())
+    if not n:
+        raise ValueError(f"Not a part: {part!r} (expected part1 ... part7)")
+    for name in SCRIPT_NAMES:
+        path = os.path.join(base_dir, f'PART_{n}_ANALYSIS', 'Code', name.format(n=n))
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No analysis script for part {n} under {base_dir}")
+
+# ============================================================================
+# NAME FLOW
+# ============================================================================
+
+def _base_name(node):
+    """Variable at the root of x[...].attr[...] (None for anything else)"""
+    while isinstance(node, (ast.Subscript, ast.Attribute)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+class _NameFlow(ast.NodeVisitor):
+    """
+    Names a block of statements reads before assigning them (`reads`),
+    assigns (`binds`) and modifies in place (`mutates`), visiting nodes in
+    evaluation order
+    """
+
+    def __init__(self, bound=()):
+        self.bound = set(bound)
+        self.reads = set()
+        self.binds = set()
+        self.mutates = set()
+
+    def _bind(self, name):
+        self.bound.add(name)
+        self.binds.add(name)
+
+    def _read(self, name):
+        if name not in self.bound:
+            self.reads.add(name)
+
+    def _target(self, target):
+        if isinstance(target, (ast.Subscript, ast.Attribute)):
+            self.visit(target)
+            base = _base_name(target)
+            if base is not None:
+                self.mutates.add(base)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self._target(element)
+        elif isinstance(target, ast.Starred):
+            self._target(target.value)
+        else:
+            self.visit(target)
+
+    def _nested(self, nodes, bound=()):
+        """Free reads of a nested scope (function body, comprehension)"""
+        inner = _NameFlow(self.bound | set(bound))
+        for node in nodes:
+            inner.visit(node)
+        self.reads |= inner.reads
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._read(node.id)
+        else:
+            self._bind(node.id)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self._target(target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self._read(node.target.id)
+        self._target(node.target)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+            self._target(node.target)
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self._target(node.target)
+        for statement in node.body + node.orelse:
+            self.visit(statement)
+
+    def visit_With(self, node):
+        for item in node.items:
+            self.visit(item.context_expr)
+            if item.optional_vars is not None:
+                self._target(item.optional_vars)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self._bind(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute) and (
+                func.attr in MUTATING_METHODS
+                or any(k.arg == 'inplace' and isinstance(k.value, ast.Constant) and k.value.value
+                       for k in node.keywords)):
+            base = _base_name(func.value)
+            if base is not None:
+                self.mutates.add(base)
+        self.generic_visit(node)
+
+    def _comprehension(self, node, results):
+        inner = _NameFlow(self.bound)
+        for generator in node.generators:
+            inner.visit(generator.iter)
+            inner._target(generator.target)
+            for condition in generator.ifs:
+                inner.visit(condition)
+        for result in results:
+            inner.visit(result)
+        self.reads |= inner.reads
+
+    def visit_ListComp(self, node):
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._comprehension(node, [node.key, node.value])
+
+    def _arguments(self, args):
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        return [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs
+                + [args.vararg, args.kwarg] if a is not None]
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        params = self._arguments(node.args)
+        self._bind(node.name)
+        self._nested(node.body, params)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._nested([node.body], self._arguments(node.args))
+
+    def visit_ClassDef(self, node):
+        for base in node.bases + node.decorator_list:
+            self.visit(base)
+        self._bind(node.name)
+        self._nested(node.body)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._bind(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != '*':
+                self._bind(alias.asname or alias.name)
+
+def name_flow(statements):
+    """_NameFlow of a list of statements"""
+    flow = _NameFlow()
+    for statement in statements:
+        flow.visit(statement)
+    return flow
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def _stage_call(statement):
+    """Name given to a top-level PROFILE.stage('...') call (None otherwise)"""
+    call = statement.value if isinstance(statement, ast.Expr) else None
+    if (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute)
+            and call.func.attr == 'stage' and isinstance(call.func.value, ast.Name)
+            and call.func.value.id == 'PROFILE' and call.args
+            and isinstance(call.args[0], ast.Constant)):
+        return call.args[0].value
+    return None
+
+def _is_banner(statement):
+    """print(...) of constants only (the section banners)"""
+    call = statement.value if isinstance(statement, ast.Expr) else None
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)
+            and call.func.id == 'print'):
+        return False
+    return not any(isinstance(node, ast.Name) for arg in call.args for node in ast.walk(arg))
+
+def _saved_outputs(statements):
+    """File names passed to save_figure/save_table in the statements"""
+    names = []
+    for statement in statements:
+        for node in ast.walk(statement):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                    and node.func.id in SAVE_FUNCTIONS and len(node.args) > 1):
+                continue
+            path = node.args[1]
+            if isinstance(path, ast.JoinedStr) and path.values:
+                path = path.values[-1]
+            if isinstance(path, ast.Constant) and isinstance(path.value, str):
+                names.append(os.path.basename(path.value))
+    return names
+
+class Stage:
+    """One profiled stage of a script: its statements and what flows through it"""
+
+    def __init__(self, name, statements):
+        self.name = name
+        self.statements = statements
+        self.files = _saved_outputs(statements)
+        # Fig4_Host_Parasite_Network.png -> Fig4
+        self.outputs = [f.split('_')[0] for f in self.files]
+        flow = name_flow(statements)
+        self.reads = flow.reads
+        self.binds = flow.binds
+        self.mutates = flow.mutates
+
+def split_stages(tree):
+    """Stages of a parsed script, in script order"""
+    stages = []
+    name, current, banner = SETUP_STAGE, [], []
+    for statement in tree.body:
+        stage_name = _stage_call(statement)
+        if stage_name is not None:
+            stages.append(Stage(name, current))
+            name, current, banner = stage_name, banner + [statement], []
+        elif _is_banner(statement):
+            banner.append(statement)
+        else:
+            current += banner + [statement]
+            banner = []
+    stages.append(Stage(name, current + banner))
+    return [stage for stage in stages if stage.statements or stage.name != SETUP_STAGE]
+
+class ScriptStages:
+    """Stage registry of one part script"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, encoding='utf-8') as handle:
+            self.source = handle.read()
+        self.stages = split_stages(ast.parse(self.source, filename=path))
+        self.index = {stage.name.lower(): i for i, stage in enumerate(self.stages)}
+        for i, stage in enumerate(self.stages):
+            for key in stage.outputs + stage.files + [os.path.splitext(f)[0] for f in stage.files]:
+                self.index.setdefault(key.lower(), i)
+
+    @classmethod
+    def for_part(cls, part, base_dir=None):
+        return cls(script_path(part, base_dir))
+
+    def lookup(self, target):
+        """Index of the stage named `target` or saving output `target`"""
+        try:
+            return self.index[str(target).lower()]
+        except KeyError:
+            known = [stage.name for stage in self.stages[1:-1]]
+            known += [key for stage in self.stages for key in stage.outputs]
+            raise KeyError(f"{os.path.basename(self.path)} has no stage or output "
+                           f"{target!r} (known: {', '.join(dict.fromkeys(known))})") from None
+
+    def needs(self, i):
+        """Indices of the earlier stages stage i reads from"""
+        needed = set()
+        for name in self.stages[i].reads:
+            writers = [j for j in range(i) if name in self.stages[j].binds]
+            if not writers:
+                continue
+            first = writers[-1]
+            needed.add(first)
+            needed.update(j for j in range(first + 1, i) if name in self.stages[j].mutates)
+        return needed
+
+    def resolve(self, targets):
+        """Indices of the stages to run for `targets` (all stages when empty)"""
+        if not targets:
+            return list(range(len(self.stages)))
+        selected = {i for i, stage in enumerate(self.stages) if stage.name in ALWAYS_STAGES}
+        pending = [self.lookup(target) for target in targets]
+        while pending:
+            i = pending.pop()
+            if i in selected:
+                continue
+            selected.add(i)
+            pending.extend(self.needs(i))
+        # The final stage (flush and profile) runs in every selection
+        return sorted(selected | {len(self.stages) - 1})
+
+    def statements(self, selected):
+        """
+        (index, statements) of the selected stages; the final stage keeps
+        only the statements whose names the selection defines
+        """
+        final = len(self.stages) - 1
+        blocks = []
+        defined = set()
+        for i in selected:
+            if i != final or len(selected) == len(self.stages):
+                blocks.append((i, self.stages[i].statements))
+                defined |= self.stages[i].binds
+                continue
+            # Names no stage assigns are builtins or star imports
+            assigned = set().union(*(stage.binds for stage in self.stages))
+            statements = []
+            for statement in self.stages[i].statements:
+                flow = name_flow([statement])
+                if all(name in defined or name not in assigned for name in flow.reads):
+                    statements.append(statement)
+                    defined |= flow.binds
+            blocks.append((i, statements))
+        return blocks
+
+    def describe(self):
+        """Stage table: name, outputs and the stages each one needs"""
+        rows = []
+        for i, stage in enumerate(self.stages):
+            rows.append((stage.name, stage.outputs,
+                         [self.stages[j].name for j in sorted(self.needs(i))]))
+        return rows
+
+    def run(self, targets=(), dry_run=False, checkpoint=False, resume=False):
+        """
+        Run the stages `targets` need; returns the names of the stages run.
+        checkpoint saves each stage's results (see checkpoints.py), resume
+        also skips the stages whose checkpoint is still valid.
+        """
+        selected = self.resolve(targets)
+        names = [self.stages[i].name for i in selected]
+        print(f"Script: {self.path}")
+        print(f"Stages: {', '.join(names)}")
+        if dry_run:
+            return names
+        blocks = [(i, compile(ast.Module(body=statements, type_ignores=[]), self.path, 'exec'))
+                  for i, statements in self.statements(selected)]
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        PROFILE.reset(f"{name} (only {', '.join(targets)})" if targets else name)
+        namespace = {'__name__': '__main__', '__file__': self.path}
+        started = time.perf_counter()
+        checkpoints = None
+        ran = []
+        for i, code in blocks:
+            if checkpoints is not None and i in checkpoints.skipped:
+                checkpoints.load(i, namespace)
+                continue
+            stage_started = time.perf_counter()
+            exec(code, namespace)
+            ran.append(self.stages[i].name)
+            if checkpoints is not None:
+                checkpoints.save(i, namespace, time.perf_counter() - stage_started)
+            elif checkpoint or resume:
+                # Setup has run: OUTPUT_DIR and DATA_FILE are known
+                from checkpoints import StageCheckpoints
+                checkpoints = StageCheckpoints(self, selected, namespace, resume)
+        skipped = f", {len(names) - len(ran)} from checkpoints" if len(ran) < len(names) else ''
+        print(f"✓ Ran {len(ran)} of {len(self.stages)} stages{skipped} in "
+              f"{time.perf_counter() - started:.1f}s")
+        return ran
@@ -0,0 +1,153 @@
+"""
+Corpus Slices
+Row subsets of a mention table: per region, per decade, per genus family...
+
+A slice is a dict with a name and conditions, all of which must hold:
+    {"name": "1990s", "years": [1990, 1999]}                 inclusive year range
+    {"name": "Europe", "regions": ["Europe"]}                 a listed country lies in
+                                                              one of these regions
+    {"name": "Brazil", "countries": ["Brazil"]}               one of these countries is listed
+    {"name": "Meloidogynidae", "genera": ["Meloidogyne", "Nacobbus"]}
+    {"name": "Nematology", "where": {"journal": ["Nematology"]}}
+                                                              any column, one of these values
+Country fields are matched through the alias table of countries.py
+("USA", "United States" and "US" are one country), genera case-insensitively.
+
+The row mask of a slice is computed from the cached source columns
+(mention_store), independently of the columns an analysis loads. With a
+slice as the `subset` of the run context (run_context.py),
+apply_analysis_filters keeps only the rows of the slice, which is how the
+batch runs (batch.py) run unmodified part scripts on a slice.
+
+Slice files are JSON: {"slices": [...]} or a plain list. decade_slices and
+region_slices generate the common ones.
+
+Usage:
+    from slices import load_slices, slice_mask
+    mask = slice_mask(DATA_FILE, {"name": "1990s", "years": [1990, 1999]})
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from countries import REGIONS, COUNTRY_REGIONS, country_lists, normalize_country, coalesce_columns
+from mention_store import source_columns, load_columns, cached_row_count
+
+SLICE_KEYS = ('name', 'years', 'regions', 'countries', 'genera', 'where')
+YEAR_COLUMNS = ('pub_year', 'PubYear', 'Year')
+GENUS_COLUMNS = ('Genus',)
+# Same precedence as the country figures of part 1
+COUNTRY_COLUMNS = ('country_clean', 'country', 'Country', 'org_country')
+
+# ============================================================================
+# DEFINITIONS
+# ============================================================================
+
+def validate_slice(definition):
+    """The definition, checked: a name, known keys only, well-formed conditions"""
+    if not isinstance(definition, dict) or not definition.get('name'):
+        raise ValueError(f"A slice needs a name: {definition!r}")
+    unknown = set(definition) - set(SLICE_KEYS)
+    if unknown:
+        raise ValueError(f"Slice {definition['name']!r}: unknown keys {', '.join(sorted(unknown))} "
+                         f"(known: {', '.join(SLICE_KEYS)})")
+    years = definition.get('years')
+    if years is not None and (len(years) != 2 or years[0] > years[1]):
+        raise ValueError(f"Slice {definition['name']!r}: years must be [first, last]")
+    unknown_regions = set(definition.get('regions') or ()) - set(REGIONS) - {'Other'}
+    if unknown_regions:
+        raise ValueError(f"Slice {definition['name']!r}: unknown regions "
+                         f"{', '.join(sorted(unknown_regions))} (known: {', '.join(REGIONS)})")
+    if not isinstance(definition.get('where', {}), dict):
+        raise ValueError(f"Slice {definition['name']!r}: where must map columns to value lists")
+    return definition
+
+def load_slices(path):
+    """Validated slice definitions of a JSON file; names must be unique"""
+    with open(path, encoding='utf-8') as handle:
+        payload = json.load(handle)
+    definitions = payload.get('slices', []) if isinstance(payload, dict) else payload
+    definitions = [validate_slice(d) for d in definitions]
+    names = [d['name'] for d in definitions]
+    repeated = sorted({n for n in names if names.count(n) > 1})
+    if repeated:
+        raise ValueError(f"{path}: repeated slice names {', '.join(repeated)}")
+    return definitions
+
+def decade_slices(source):
+    """One slice per decade the source covers ("1990s": [1990, 1999], ...)"""
+    years = _source_column(source, YEAR_COLUMNS)
+    years = pd.to_numeric(years, errors='coerce').dropna()
+    if years.empty:
+        return []
+    decades = range(int(years.min()) // 10 * 10, int(years.max()) // 10 * 10 + 1, 10)
+    return [{'name': f"{d}s", 'years': [d, d + 9]} for d in decades]
+
+def region_slices():
+    """One slice per region of countries.REGIONS"""
+    return [{'name': region, 'regions': [region]} for region in REGIONS]
+
+# ============================================================================
+# ROW MASKS
+# ============================================================================
+
+def _source_column(source, candidates):
+    """First of the candidate columns the source has (None if none)"""
+    present = [c for c in candidates if c in source_columns(source)]
+    return load_columns(source, present[:1])[present[0]] if present else None
+
+def _country_mask(source, accept):
+    """Rows listing at least one country for which accept(country) is true"""
+    present = [c for c in COUNTRY_COLUMNS if c in source_columns(source)]
+    if not present:
+        return None
+    codes, lists = country_lists(coalesce_columns(load_columns(source, present), present))
+    # Code -1 (missing value) picks the trailing False
+    return np.array([any(accept(c) for c in countries) for countries in lists] + [False])[codes]
+
+def slice_mask(source, definition):
+    """Boolean array, one entry per source row: True for the rows of the slice"""
+    name = definition['name']
+    conditions = []
+
+    if definition.get('years') is not None:
+        years = _source_column(source, YEAR_COLUMNS)
+        if years is None:
+            raise ValueError(f"Slice {name!r}: {source} has no year column")
+        years = pd.to_numeric(years, errors='coerce')
+        first, last = definition['years']
+        conditions.append(years.between(first, last).to_numpy())
+
+    if definition.get('genera'):
+        genus = _source_column(source, GENUS_COLUMNS)
+        if genus is None:
+            raise ValueError(f"Slice {name!r}: {source} has no Genus column")
+        wanted = {str(g).strip().casefold() for g in definition['genera']}
+        codes, uniques = pd.factorize(genus)
+        accepted = np.array([str(u).strip().casefold() in wanted for u in uniques] + [False])
+        conditions.append(accepted[codes])
+
+    if definition.get('countries') or definition.get('regions'):
+        countries = {normalize_country(c) for c in definition.get('countries') or ()}
+        regions = set(definition.get('regions') or ())
+        mask = _country_mask(source, lambda c: c in countries
+                             or COUNTRY_REGIONS.get(c, 'Other') in regions)
+        if mask is None:
+            raise ValueError(f"Slice {name!r}: {source} has no country column")
+        conditions.append(mask)
+
+    for column, values in (definition.get('where') or {}).items():
+        if column not in source_columns(source):
+            raise ValueError(f"Slice {name!r}: {source} has no column {column!r}")
+        wanted = {str(v) for v in values}
+        codes, uniques = pd.factorize(load_columns(source, [column])[column])
+        conditions.append(np.array([str(u) in wanted for u in uniques] + [False])[codes])
+
+    if not conditions:
+        n_rows = cached_row_count(source)
+        if n_rows is None:
+            n_rows = len(load_columns(source, source_columns(source)[:1]))
+        return np.ones(n_rows, dtype=bool)
+    return np.logical_and.reduce(conditions)
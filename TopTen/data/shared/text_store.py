@@ -0,0 +1,188 @@
+"""
+Text Store
+Memory-mapped storage for the long text columns (abstract, text, factorials)
+
+All documents of a column are concatenated into one UTF-8 blob; an int64
+offsets array with n + 1 entries delimits row i as
+blob[offsets[i]:offsets[i + 1]], and a packed bitmap marks missing values.
+
+Files (next to each other, sharing one stem):
+- <stem>.blob           UTF-8 bytes of every document, back to back
+- <stem>.offsets.npy    int64 document boundaries
+- <stem>.valid.npy      packed bitmap, 1 = value present
+
+Opening a column maps the files without reading them; documents are
+decoded only when a text stage asks for them. Every process that opens the
+same column maps the same pages of the OS page cache, so worker processes
+are handed the file stem and a range of rows, never the documents
+themselves (TextColumn.map).
+"""
+
+import os
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from run_context import worker_count
+
+# Rows per worker task in TextColumn.map
+MAP_CHUNK_ROWS = 2000
+
+def _atomic_path(path):
+    return f"{path}.{os.getpid()}.tmp"
+
+def write_text_column(stem, values):
+    """Write a sequence of strings (missing values allowed) as a text column"""
+    values = pd.Series(values).reset_index(drop=True)
+    valid = values.notna().to_numpy()
+    lengths = np.zeros(len(values) + 1, dtype=np.int64)
+
+    blob_path = f"{stem}.blob"
+    with open(_atomic_path(blob_path), 'wb') as handle:
+        for i in np.flatnonzero(valid):
+            encoded = str(values.iat[i]).encode('utf-8')
+            lengths[i + 1] = len(encoded)
+            handle.write(encoded)
+    os.replace(_atomic_path(blob_path), blob_path)
+    _write_index(stem, np.cumsum(lengths), valid)
+
+def _write_index(stem, offsets, valid):
+    for suffix, array in (('offsets', offsets), ('valid', np.packbits(valid))):
+        path = f"{stem}.{suffix}.npy"
+        with open(_atomic_path(path), 'wb') as handle:
+            np.save(handle, array)
+        os.replace(_atomic_path(path), path)
+
+def append_text_column(stem, values):
+    """
+    Append documents to a stored text column: the new bytes go to the end
+    of the blob and only the offsets and bitmap are rewritten
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    offsets = np.load(f"{stem}.offsets.npy")
+    n_rows = len(offsets) - 1
+    old_valid = np.unpackbits(np.load(f"{stem}.valid.npy"), count=n_rows).astype(bool)
+    valid = values.notna().to_numpy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+
+    with open(f"{stem}.blob", 'ab') as handle:
+        for i in np.flatnonzero(valid):
+            encoded = str(values.iat[i]).encode('utf-8')
+            lengths[i] = len(encoded)
+            handle.write(encoded)
+    _write_index(stem, np.concatenate([offsets, offsets[-1] + np.cumsum(lengths)]),
+                 np.concatenate([old_valid, valid]))
+
+def text_column_exists(stem, n_rows):
+    """True if a complete text column with n_rows rows is stored at stem"""
+    offsets_path = f"{stem}.offsets.npy"
+    if not (os.path.exists(f"{stem}.blob") and os.path.exists(f"{stem}.valid.npy")
+            and os.path.exists(offsets_path)):
+        return False
+    offsets = np.load(offsets_path, mmap_mode='r')
+    return len(offsets) == n_rows + 1 and os.path.getsize(f"{stem}.blob") == offsets[-1]
+
+class TextColumn:
+    """
+    Read-only, memory-mapped text column
+    Row positions match the source table (row i of the source file)
+    """
+
+    def __init__(self, stem):
+        self.stem = stem
+        self.offsets = np.load(f"{stem}.offsets.npy", mmap_mode='r')
+        self._valid_bits = np.load(f"{stem}.valid.npy")
+        self._blob = None
+
+    # Pickled as its stem only: the receiving process maps the files itself
+    def __getstate__(self):
+        return {'stem': self.stem}
+
+    def __setstate__(self, state):
+        self.__init__(state['stem'])
+
+    @property
+    def blob(self):
+        if self._blob is None:
+            with open(f"{self.stem}.blob", 'rb') as handle:
+                size = os.fstat(handle.fileno()).st_size
+                # mmap refuses empty files
+                self._blob = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        return self._blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def notna(self):
+        """Boolean array, True where row i has a value"""
+        return np.unpackbits(self._valid_bits, count=len(self)).astype(bool)
+
+    def view(self, i):
+        """
+        Zero-copy memoryview of the UTF-8 bytes of row i (empty when
+        missing), backed by the mapped file
+        """
+        return memoryview(self.blob)[self.offsets[i]:self.offsets[i + 1]]
+
+    def get(self, i):
+        """Decoded document of row i, or None when missing"""
+        i = range(len(self))[i]
+        # Test row i's bit in place (np.packbits order: first row in the high bit)
+        if not (self._valid_bits[i >> 3] >> (7 - (i & 7))) & 1:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def iter_documents(self, rows=None):
+        """Decoded documents of `rows` (default: all) in order, None when missing"""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        valid = self.notna()[rows]
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        blob = memoryview(self.blob)
+        for present, start, end in zip(valid, starts, ends):
+            yield str(blob[start:end], 'utf-8') if present else None
+
+    @profiled(name='TextColumn.map')
+    def map(self, func, rows=None, n_jobs=None, chunk_rows=MAP_CHUNK_ROWS):
+        """
+        [func(document) for each row of `rows`] (document is None for
+        missing rows), computed in forked worker processes that each read
+        their rows from the mapped store
+
+        func must be picklable (a module-level function). Runs in-process
+        for a single worker, small inputs, or where fork is unavailable.
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        if n_jobs is None:
+            n_jobs = worker_count()
+        if (n_jobs <= 1 or len(rows) <= chunk_rows
+                or 'fork' not in multiprocessing.get_all_start_methods()):
+            return [func(document) for document in self.iter_documents(rows)]
+
+        tasks = [(self.stem, rows[start:start + chunk_rows], func)
+                 for start in range(0, len(rows), chunk_rows)]
+        with ProcessPoolExecutor(max_workers=n_jobs,
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            return [result for part in pool.map(_map_rows, tasks) for result in part]
+
+    def take(self, rows, index=None):
+        """
+        Decoded documents of the given row positions as a Series (NaN for
+        missing rows), indexed by `index` (default: the positions)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = self.notna()[rows]
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        blob = self.blob
+        documents = np.full(len(rows), np.nan, dtype=object)
+        documents[valid] = [blob[start:end].decode('utf-8')
+                            for start, end in zip(starts[valid], ends[valid])]
+        return pd.Series(documents, index=rows if index is None else index)
+
+def _map_rows(task):
+    """Worker side of TextColumn.map"""
+    stem, rows, func = task
+    return [func(document) for document in TextColumn(stem).iter_documents(rows)]